@@ -3,22 +3,138 @@ import dearpygui.dearpygui as dpg
 import numpy as np
 import threading
 import time
+from functools import partial
 
 from base.img_generator import ImageGenerator
-from base.img_processor import ImageProcessor
+from base.raw_recording import ReplaySource, REPLAY_ORIGINAL
+from base.cam_manager import CameraSource
+from base.img_processor import ImageProcessor, STAGES
+from base.frame_queue import FrameQueue, LATEST_ONLY
+from base.normalization import NORM_MINMAX
+from base.demosaic import get_backend, available_backends, DEFAULT_BACKEND
+from base.frame_trace import get_trace, UPLOADED
+from base.plot_series import PlotSeries
+from base.metrics import get_registry
+from base.autotune import autotune
+from base.quality_controller import QualityController
+from base.metrics_exporter import MetricsExporter
+from base.profiler import Profiler
 
 
 FRAME_RESOLUTION = (2048, 1536)
 FPS_GENERATOR = 100
 
+# Replay a raw recording (base/raw_recording.py) instead of generating frames; its resolution overrides FRAME_RESOLUTION.
+# REPLAY_MODE: REPLAY_ORIGINAL (recorded timing), REPLAY_FIXED (FPS_GENERATOR) or REPLAY_FAST
+REPLAY_FILE = None
+REPLAY_MODE = REPLAY_ORIGINAL
+
+# Grab from a camera (index) instead of generating frames, at FPS_GENERATOR. FAKE_CAMERA: True uses the pylon
+# stand-in (base/fake_pylon.py), None uses it only when pypylon is not installed.
+CAMERA_INDEX = None
+FAKE_CAMERA = None
+
+# Backpressure between generator and processor: LATEST_ONLY, BOUNDED_FIFO or BLOCKING
+QUEUE_POLICY = LATEST_ONLY
+QUEUE_SIZE = 1
+
+# Tiled demosaic: more than one thread splits each frame into row bands processed in parallel
+PROCESSING_THREADS = 1
+BAND_HEIGHT = 256
+
+# Worker processes over shared memory (0 = process in this process); cannot be combined with tiling or pipelining
+PROCESSING_PROCESSES = 0
+
+# Pipelined mode runs demosaic, normalize and deliver on separate threads so consecutive frames overlap
+PIPELINED = False
+
+# NORM_MINMAX stretches each frame to its min/max; NORM_LUT uses a fixed table for the sensor bit depth
+NORMALIZATION = NORM_MINMAX
+SENSOR_BIT_DEPTH = 12
+
+# ISP operation chain (base/isp_chain.py) replacing the normalization, e.g.
+# IspChain([BlackLevel(64), WhiteBalance(1.9, 1.0, 1.6), Gamma(2.2)], bit_depth=SENSOR_BIT_DEPTH).
+# Each fused pass gets its own timing series. Its dtype must be float32 to match the textures, and it cannot
+# resize, since the textures are sized by the frame resolution.
+ISP_CHAIN = None
+
+# Initial demosaic backend; can be switched at runtime from the UI
+DEMOSAIC_BACKEND = DEFAULT_BACKEND
+
+# Degrade the processing (fixed-scale normalization, faster demosaic, binning, frame skipping) to keep the p95
+# processing latency below TARGET_LATENCY_MS, and restore it when there is headroom (base/quality_controller.py).
+# Toggle in the UI with "Adaptive quality".
+ADAPTIVE_QUALITY = False
+TARGET_LATENCY_MS = 20.0
+
+# Export the metrics registry (base/metrics_exporter.py): Prometheus text format on 127.0.0.1:METRICS_PORT/metrics
+# and/or rotated JSON-lines / CSV files, one snapshot every METRICS_INTERVAL seconds
+METRICS_PORT = None
+METRICS_JSONL = None
+METRICS_CSV = None
+METRICS_INTERVAL = 1.0
+
+# "Profile" button: sample all thread stacks for PROFILE_WINDOW seconds and write the hot spot report to PROFILE_DIR
+PROFILE_WINDOW = 5.0
+PROFILE_DIR = "profiles"
+
+# Pick the demosaic backend and tiling (PROCESSING_THREADS / BAND_HEIGHT) by benchmarking them at startup
+# (base/autotune.py). Results are cached per resolution, bit depth and CPU, so only the first start measures.
+AUTO_TUNE = False
+
+# Display a 2x2-binned quarter-size preview instead of the full-resolution image (toggle in the UI)
+PREVIEW_MODE = True
+
 class MainWindow:
     def __init__(self): 
 
-        self.img_generator = ImageGenerator(framerate=FPS_GENERATOR, resolution=FRAME_RESOLUTION)
-        self.img_processor = ImageProcessor()
+        if CAMERA_INDEX is not None:
+            self.img_generator = CameraSource(CAMERA_INDEX, framerate=FPS_GENERATOR, fake=FAKE_CAMERA)
+        elif REPLAY_FILE:
+            self.img_generator = ReplaySource(REPLAY_FILE, mode=REPLAY_MODE, framerate=FPS_GENERATOR)
+        else:
+            self.img_generator = ImageGenerator(framerate=FPS_GENERATOR, resolution=FRAME_RESOLUTION, bit_depth=SENSOR_BIT_DEPTH)
+        frame_resolution = (self.img_generator.width, self.img_generator.height)
+        preview_resolution = (frame_resolution[0] // 2, frame_resolution[1] // 2)
+        # Dear PyGui raw textures only take float data
+        output_dtype = np.float32
+
+        processing_config = {"backend": DEMOSAIC_BACKEND, "num_threads": PROCESSING_THREADS, "band_height": BAND_HEIGHT}
+        if AUTO_TUNE:
+            # The output dtype is fixed by the texture format, so only the processing is tuned
+            tuned = autotune(frame_resolution, SENSOR_BIT_DEPTH, output_dtypes=(output_dtype,), normalization=NORMALIZATION,
+                             pipelined=PIPELINED, num_processes=PROCESSING_PROCESSES)
+            processing_config.update(backend=tuned["backend"], num_threads=tuned["num_threads"], band_height=tuned["band_height"])
+        self.img_processor = ImageProcessor(queue_policy=QUEUE_POLICY, queue_size=QUEUE_SIZE,
+                                            num_threads=processing_config["num_threads"], band_height=processing_config["band_height"],
+                                            pipelined=PIPELINED, num_processes=PROCESSING_PROCESSES,
+                                            normalization=NORMALIZATION, bit_depth=SENSOR_BIT_DEPTH,
+                                            backend=processing_config["backend"], preview=PREVIEW_MODE, isp_chain=ISP_CHAIN,
+                                            output_dtype=output_dtype,
+                                            # Outputs held by the display mailbox and the upload in progress
+                                            output_pool_size=4)
 
         self.img_generator.register_callback(self.img_processor.set_raw_frame)
-        self.img_processor.register_callback(self.frame_received_callback)
+        self.img_processor.register_frame_callback(self.frame_received_callback)
+
+        self.quality_controller = QualityController(self.img_processor, target_latency=TARGET_LATENCY_MS / 1000)
+        self.quality_controller.enabled = ADAPTIVE_QUALITY
+        self.displayed_texture = 'preview_texture' if PREVIEW_MODE else 'img_texture'
+
+        # Latest-frame mailbox between the processor and the render loop: the processor never waits for
+        # the display, and frames replaced before the next rendered frame are counted as skipped
+        self.display_mailbox = FrameQueue(policy=LATEST_ONLY, on_drop=lambda frame: self.img_processor.record_drop(frame, "display"))
+
+        # Components record into the shared registry; the UI reads everything it shows from there
+        self.metrics = get_registry()
+        self.display_frames_metric = self.metrics.rate("display.frames")
+        self.metrics.gauge("display.skipped", self.display_mailbox.get_dropped)
+        self.profiler = Profiler(self.metrics, output_dir=PROFILE_DIR)
+        self.exporter = None
+        if METRICS_PORT is not None or METRICS_JSONL or METRICS_CSV:
+            self.exporter = MetricsExporter(self.metrics, interval=METRICS_INTERVAL, prometheus_port=METRICS_PORT,
+                                            jsonl_path=METRICS_JSONL, csv_path=METRICS_CSV)
+            self.exporter.start()
         
         # Plot update thread
         self.plot_update_thread = None
@@ -28,6 +144,18 @@ class MainWindow:
         # Averaging settings
         self.averaging_window = 20  # Number of frames to average over
 
+        # Smoothed plot data per line series, updated with the new samples of every tick
+        series_tags = ["generator_series", "processor_series", "trace_wait_series", "trace_compute_series"]
+        series_tags += [f"{stage}_stage_series" for stage in STAGES]
+        series_tags += [f"{backend}_backend_series" for backend in available_backends()]
+        self.isp_passes = ISP_CHAIN.passes if ISP_CHAIN is not None else []
+        series_tags += [f"isp_{index}_series" for index in range(len(self.isp_passes))]
+        self.plot_series = {tag: PlotSeries(window=self.averaging_window) for tag in series_tags}
+        # Sequence number of the last sample each series has read from its source (SampleHistory cursors)
+        self.plot_cursors = {}
+        # Reset from the UI thread while the plot thread updates
+        self.plot_series_lock = threading.Lock()
+
         
         
         dpg.create_context()
@@ -38,13 +166,21 @@ class MainWindow:
             dpg.add_key_press_handler(callback=self.key_press_callback)
 
         with dpg.texture_registry():
-            self.img_texture = dpg.add_raw_texture(tag='img_texture', width=FRAME_RESOLUTION[0], height=FRAME_RESOLUTION[1], default_value=np.zeros((FRAME_RESOLUTION[0], FRAME_RESOLUTION[1], 3), dtype=np.float32), format=dpg.mvFormat_Float_rgb)
+            self.img_texture = dpg.add_raw_texture(tag='img_texture', width=frame_resolution[0], height=frame_resolution[1], default_value=np.zeros((frame_resolution[0], frame_resolution[1], 3), dtype=np.float32), format=dpg.mvFormat_Float_rgb)
+            self.preview_texture = dpg.add_raw_texture(tag='preview_texture', width=preview_resolution[0], height=preview_resolution[1], default_value=np.zeros((preview_resolution[0], preview_resolution[1], 3), dtype=np.float32), format=dpg.mvFormat_Float_rgb)
+        self.preview_texture_size = preview_resolution[0] * preview_resolution[1] * 3
 
         with dpg.window(label="Base Test", tag="MainWindow"):
 
             with dpg.group(horizontal=True):
                 self.start_button = dpg.add_button(label="Start processing", width=150, height=30, callback=self.button_callback)
                 self.reset_button = dpg.add_button(label="Reset Stats", width=120, height=30, callback=self.reset_button_callback)
+                # Only full-resolution backends match the image texture
+                full_resolution_backends = [name for name in available_backends() if not get_backend(name).half_resolution]
+                self.backend_combo = dpg.add_combo(full_resolution_backends, label="Demosaic", default_value=self.img_processor.get_backend_name(), width=150, callback=self.backend_callback)
+                self.preview_checkbox = dpg.add_checkbox(label="Binned preview", default_value=PREVIEW_MODE, callback=self.preview_callback)
+                self.quality_checkbox = dpg.add_checkbox(label="Adaptive quality", default_value=ADAPTIVE_QUALITY, callback=self.quality_callback)
+                self.profile_button = dpg.add_button(label="Profile", width=80, height=30, callback=self.profile_button_callback)
 
             # Performance metrics section
             with dpg.group():
@@ -53,6 +189,10 @@ class MainWindow:
                     dpg.add_text("Target: 120.0 FPS", tag="generator_target_text", color=(200, 200, 200))
                     dpg.add_text("Actual: ", tag="generator_actual_label")
                     dpg.add_text("0.0 FPS", tag="generator_fps_text", color=(0, 255, 255))  # Cyan color
+                    dpg.add_text("Missed deadlines: ")
+                    dpg.add_text("0", tag="generator_missed_text", color=(255, 100, 100))
+                    dpg.add_text("Jitter p99: ")
+                    dpg.add_text("-", tag="generator_jitter_text", color=(0, 255, 255))
                 
                 with dpg.group(horizontal=True):
                     dpg.add_text("Processor:")
@@ -63,6 +203,34 @@ class MainWindow:
                     dpg.add_text("Last Exec: ", tag="processor_exec_label")
                     dpg.add_text("0.00 ms", tag="processor_exec_text", color=(100, 255, 100))  # Green color
 
+                with dpg.group(horizontal=True):
+                    dpg.add_text("Processing latency p50 / p95 / p99 / max: ")
+                    dpg.add_text("-", tag="processor_percentiles_text", color=(100, 255, 100))
+
+                # End-to-end, generation to texture upload
+                with dpg.group(horizontal=True):
+                    dpg.add_text("End-to-end p50 / p99: ")
+                    dpg.add_text("-", tag="trace_latency_text", color=(255, 255, 100))
+                    dpg.add_text("Queue wait / compute p50: ")
+                    dpg.add_text("-", tag="trace_split_text", color=(255, 255, 100))
+
+                with dpg.group(horizontal=True):
+                    dpg.add_text("Display:")
+                    dpg.add_text("Displayed: ")
+                    dpg.add_text("0", tag="display_shown_text", color=(100, 255, 100))
+                    dpg.add_text("Skipped: ")
+                    dpg.add_text("0", tag="display_skipped_text", color=(255, 100, 100))
+
+                with dpg.group(horizontal=True):
+                    dpg.add_text("Dropped by stage: ")
+                    dpg.add_text("-", tag="trace_drops_text", color=(255, 100, 100))
+
+                with dpg.group(horizontal=True):
+                    dpg.add_text("Quality: ")
+                    dpg.add_text("-", tag="quality_level_text", color=(255, 165, 0))
+                    dpg.add_text("Last change: ")
+                    dpg.add_text("-", tag="quality_change_text", color=(200, 200, 200))
+
             with dpg.group():
                 with dpg.plot(label="Execution Time Plot", height=250, width=650):
                     dpg.add_plot_axis(dpg.mvXAxis, label="Time (seconds)", auto_fit=True)
@@ -71,12 +239,21 @@ class MainWindow:
                     # Add series for both generator and processor execution times
                     dpg.add_line_series([], [], label="Frame Generation", parent="execution_time_y_axis", tag="generator_series")
                     dpg.add_line_series([], [], label="Frame Processing", parent="execution_time_y_axis", tag="processor_series")
+                    dpg.add_line_series([], [], label="End-to-end: queue wait", parent="execution_time_y_axis", tag="trace_wait_series")
+                    dpg.add_line_series([], [], label="End-to-end: compute", parent="execution_time_y_axis", tag="trace_compute_series")
+                    for stage in STAGES:
+                        dpg.add_line_series([], [], label=f"Stage: {stage}", parent="execution_time_y_axis", tag=f"{stage}_stage_series")
+                    for backend in available_backends():
+                        dpg.add_line_series([], [], label=f"Demosaic: {backend}", parent="execution_time_y_axis", tag=f"{backend}_backend_series")
+                    for index, isp_pass in enumerate(self.isp_passes):
+                        dpg.add_line_series([], [], label=f"ISP: {isp_pass.name}", parent="execution_time_y_axis", tag=f"isp_{index}_series")
 
                 with dpg.plot(label="Image Plot", height=650, width=650, equal_aspects=True):
                     dpg.add_plot_axis(dpg.mvXAxis, label="X")
                     dpg.add_plot_axis(dpg.mvYAxis, label="Time (ms)", tag="img_y_axis")
 
-                    dpg.add_image_series('img_texture', bounds_min=(0, 0), bounds_max=(FRAME_RESOLUTION[0], FRAME_RESOLUTION[1]), parent="img_y_axis", tag="img_series")
+                    # The preview texture is stretched over the same bounds, so the plot coordinates stay in sensor pixels
+                    dpg.add_image_series('preview_texture' if PREVIEW_MODE else 'img_texture', bounds_min=(0, 0), bounds_max=frame_resolution, parent="img_y_axis", tag="img_series")
 
                 
 
@@ -84,13 +261,19 @@ class MainWindow:
 
     def button_callback(self):
         if self.img_generator.is_running():
+            self.quality_controller.stop()
             self.img_generator.stop()
+            # Return the frame still waiting for display to the processor's pool before the pools are closed;
+            # frames delivered while stopping are released by the closed mailbox
+            self.display_mailbox.close()
             self.img_processor.stop()
             self.stop_plot_updates()
             dpg.set_item_label(self.start_button, "Start processing")
         else:
+            self.display_mailbox.open()
             self.img_generator.start()
             self.img_processor.start()
+            self.quality_controller.start()
             self.start_plot_updates()
             dpg.set_item_label(self.start_button, "Stop processing")
     
@@ -99,34 +282,88 @@ class MainWindow:
         self.img_generator.reset_statistics()
         self.img_processor.reset_statistics()
         
-        # Reset reference time for plotting
-        self.reference_time = None
-        
-        # Clear the plots
-        dpg.set_value("generator_series", [[], []])
-        dpg.set_value("processor_series", [[], []])
+        # Clear the plots and reset the plotting reference time
+        for backend in available_backends():
+            get_backend(backend).reset_statistics()
+        with self.plot_series_lock:
+            self.reference_time = None
+            for tag, series in self.plot_series.items():
+                series.reset()
+                dpg.set_value(tag, [[], []])
         
         # Reset display values
         dpg.set_value("generator_fps_text", "0.0 FPS")
+        dpg.set_value("generator_missed_text", "0")
+        dpg.set_value("generator_jitter_text", "-")
         dpg.set_value("processor_fps_text", "0.0 FPS")
         dpg.set_value("processor_dropped_text", "0")
+        self.display_frames_metric.reset()
+        self.display_mailbox.reset_dropped()
+        dpg.set_value("display_shown_text", "0")
+        dpg.set_value("display_skipped_text", "0")
         dpg.set_value("processor_exec_text", "0.00 ms")
+        dpg.set_value("processor_percentiles_text", "-")
+        dpg.set_value("trace_latency_text", "-")
+        dpg.set_value("trace_split_text", "-")
+        dpg.set_value("trace_drops_text", "-")
         
         print("All statistics reset")
 
+    def backend_callback(self, sender, app_data):
+        self.img_processor.set_backend(app_data)
+
+    def quality_callback(self, sender, app_data):
+        self.quality_controller.set_enabled(app_data)
+
+    def profile_button_callback(self):
+        """Sample the thread stacks for PROFILE_WINDOW seconds; the report is printed and written to PROFILE_DIR"""
+        if self.profiler.start_sampling(PROFILE_WINDOW, on_done=lambda report: dpg.set_item_label(self.profile_button, "Profile")):
+            dpg.set_item_label(self.profile_button, "Profiling...")
+
     def show(self):
         dpg.show_viewport()
 
         while dpg.is_dearpygui_running():
+            self.display_latest_frame()
             dpg.render_dearpygui_frame()
 
         self.cleanup()
         dpg.destroy_context()
 
+    def preview_callback(self, sender, app_data):
+        self.img_processor.set_preview(app_data)
+        dpg.configure_item("img_series", texture_tag='preview_texture' if app_data else 'img_texture')
+
     def frame_received_callback(self, frame):
+        """Processor thread: park the frame in the mailbox; the render loop uploads it"""
         if frame is not None:
-            dpg.set_value(self.img_texture, frame)
-            #print(f"Frame received: {frame.shape}")
+            trace = get_trace(frame)
+            if trace is not None:
+                # Completed at upload time (or counted as skipped by the mailbox)
+                trace.defer()
+            self.display_mailbox.put(frame.retain())
+
+    def display_latest_frame(self):
+        """Render loop: upload the newest processed frame, at most once per rendered frame"""
+        frame = self.display_mailbox.get(timeout=0)
+        if frame is None:
+            return
+
+        # Right after toggling the preview a frame of the other size may still be in flight
+        texture = 'preview_texture' if frame.array.size == self.preview_texture_size else 'img_texture'
+        if texture != self.displayed_texture:
+            # The preview was toggled, from the UI or by the quality controller
+            dpg.configure_item("img_series", texture_tag=texture)
+            dpg.set_value(self.preview_checkbox, texture == 'preview_texture')
+            self.displayed_texture = texture
+        dpg.set_value(texture, frame.array.ravel())
+        self.display_frames_metric.record()
+
+        trace = get_trace(frame)
+        if trace is not None:
+            trace.stamp(UPLOADED)
+            self.img_processor.complete_trace(frame)
+        frame.release()
 
     def key_press_callback(self, sender, app_data):
         if (dpg.is_key_down(dpg.mvKey_LControl) and dpg.is_key_down(dpg.mvKey_M)):
@@ -147,77 +384,97 @@ class MainWindow:
             self.plot_update_thread.join()
         self.plot_update_thread = None
     
-    def calculate_moving_average(self, timestamps, values, window_size):
-        """Calculate moving average for timestamps and values"""
-        if len(timestamps) < window_size:
-            # Not enough data for averaging, return original data
-            return timestamps, values
-        
-        # Calculate moving average
-        averaged_timestamps = []
-        averaged_values = []
-        
-        for i in range(window_size - 1, len(timestamps)):
-            # Calculate average value over the window
-            window_values = values[i - window_size + 1:i + 1]
-            avg_value = sum(window_values) / window_size
-            
-            # Use the current timestamp
-            averaged_timestamps.append(timestamps[i])
-            averaged_values.append(avg_value)
-        
-        return averaged_timestamps, averaged_values
-    
+    def update_series(self, tag, times, values):
+        """Add the new (time, seconds) samples of a line series and re-plot it if anything changed"""
+        with self.plot_series_lock:
+            if self.reference_time is None:
+                return
+            series = self.plot_series[tag]
+            if series.update(times, values, self.reference_time):
+                dpg.set_value(tag, list(series.get_data()))
+
+    def update_timing_series(self, tag, get_since):
+        """Plot the averaged execution times (ms) of the (start, end) samples a source recorded since the previous tick.
+        get_since(cursor) returns (cursor, start_times, end_times), e.g. ImageProcessor.get_execution_times_since."""
+        cursor, start_timestamps, end_timestamps = get_since(self.plot_cursors.get(tag, 0))
+        self.plot_cursors[tag] = cursor
+        if not end_timestamps:
+            return
+        end_timestamps = np.asarray(end_timestamps)
+        self.update_series(tag, end_timestamps, end_timestamps - np.asarray(start_timestamps))
+
     def update_plots_thread(self):
         """Background thread to update plots with execution times"""
         while self.plot_running:
             try:
-                gen_start_timestamps, gen_end_timestamps = self.img_generator.get_execution_times()
-                proc_start_timestamps, proc_end_timestamps = self.img_processor.get_execution_times()
-
-                # Only proceed if we have data
-                if not gen_start_timestamps or not proc_start_timestamps:
-                    time.sleep(0.01)
-                    continue
-
-                # Set reference time once at the beginning
+                # Set reference time once at the beginning, when both series have data
                 if self.reference_time is None:
-                    all_start_timestamps = gen_start_timestamps + proc_start_timestamps
-                    self.reference_time = min(all_start_timestamps)
-
-                # Calculate execution times (delta times in seconds)
-                gen_delta_times = [gen_end_timestamps[i] - gen_start_timestamps[i] for i in range(len(gen_start_timestamps))]
-                proc_delta_times = [proc_end_timestamps[i] - proc_start_timestamps[i] for i in range(len(proc_start_timestamps))]
-                
-                # Convert absolute timestamps to relative time (seconds since reference)
-                gen_relative_times = [(ts - self.reference_time) for ts in gen_end_timestamps]
-                proc_relative_times = [(ts - self.reference_time) for ts in proc_end_timestamps]
-                
-                # Apply moving average to smooth the curves
-                gen_avg_times, gen_avg_values = self.calculate_moving_average(
-                    gen_relative_times, gen_delta_times, self.averaging_window
-                )
-                proc_avg_times, proc_avg_values = self.calculate_moving_average(
-                    proc_relative_times, proc_delta_times, self.averaging_window
-                )
+                    gen_start_timestamps, _ = self.img_generator.get_execution_times()
+                    proc_start_timestamps, _ = self.img_processor.get_execution_times()
+                    if not gen_start_timestamps or not proc_start_timestamps:
+                        time.sleep(0.01)
+                        continue
+                    self.reference_time = min(gen_start_timestamps + proc_start_timestamps)
 
                 # Get FPS and stats
-                generator_fps = self.img_generator.get_fps()
-                processor_fps = self.img_processor.get_fps()
-                generator_target_fps = self.img_generator.get_target_fps()
-                processor_frames_dropped = self.img_processor.get_frames_dropped()
-                processor_exec_time = self.img_processor.get_last_execution_time()
+                generator_fps = self.metrics.rate("source.frames").get_rate()
+                processor_fps = self.metrics.rate("processor.frames").get_rate()
+                generator_target_fps = self.metrics.gauge("source.target_fps").get()
+                generator_pacing = self.img_generator.get_pacing_summary()
+                processor_frames_dropped = self.metrics.gauge("processor.dropped").get()
+                processor_exec_time = self.metrics.gauge("processor.last_execution_time").get()
+                processor_latency = self.metrics.histogram("processor.latency").value()
+                trace_summary = self.img_processor.get_trace_summary()
 
                 # Update all UI displays
                 dpg.set_value("generator_target_text", f"{generator_target_fps:.1f} FPS")
                 dpg.set_value("generator_fps_text", f"{generator_fps:.1f} FPS")
+                if generator_pacing is not None:
+                    dpg.set_value("generator_missed_text", f"{generator_pacing['missed_deadlines']}")
+                    if generator_pacing["jitter"]["count"]:
+                        dpg.set_value("generator_jitter_text", f"{generator_pacing['jitter']['p99_ms']:.3f} ms")
                 dpg.set_value("processor_fps_text", f"{processor_fps:.1f} FPS")
                 dpg.set_value("processor_dropped_text", f"{processor_frames_dropped}")
+                dpg.set_value("display_shown_text", f"{self.display_frames_metric.get_total()}")
+                dpg.set_value("display_skipped_text", f"{self.metrics.gauge('display.skipped').get()}")
                 dpg.set_value("processor_exec_text", f"{processor_exec_time * 1000:.2f} ms")
-
-                # Update the plots with averaged data (relative time on x-axis and execution time in ms on y-axis)
-                dpg.set_value("generator_series", [gen_avg_times, [t * 1000 for t in gen_avg_values]])
-                dpg.set_value("processor_series", [proc_avg_times, [t * 1000 for t in proc_avg_values]])
+                if processor_latency["count"]:
+                    dpg.set_value("processor_percentiles_text", "{p50_ms:.2f} / {p95_ms:.2f} / {p99_ms:.2f} / {max_ms:.2f} ms".format(**processor_latency))
+                if trace_summary["end_to_end"]["count"]:
+                    dpg.set_value("trace_latency_text", "{p50_ms:.2f} / {p99_ms:.2f} ms".format(**trace_summary["end_to_end"]))
+                    dpg.set_value("trace_split_text", f"{trace_summary['queue_wait']['p50_ms']:.2f} / {trace_summary['compute']['p50_ms']:.2f} ms")
+                if trace_summary["dropped"]:
+                    dpg.set_value("trace_drops_text", ", ".join(f"{stage}: {count}" for stage, count in trace_summary["dropped"].items()))
+                dpg.set_value("quality_level_text", self.quality_controller.get_level_name() if self.quality_controller.enabled else "off")
+                quality_history = self.quality_controller.get_history()
+                if quality_history:
+                    change_time, level_name, reason = quality_history[-1]
+                    dpg.set_value("quality_change_text", f"{time.strftime('%H:%M:%S', time.localtime(change_time))} {level_name} ({reason})")
+                # The controller may have switched the backend
+                dpg.set_value(self.backend_combo, self.img_processor.get_backend_name())
+
+                # Update the plots with averaged data (relative time on x-axis and execution time in ms on y-axis).
+                # Only samples recorded since the previous tick are copied and processed.
+                self.update_timing_series("generator_series", self.img_generator.get_execution_times_since)
+                self.update_timing_series("processor_series", self.img_processor.get_execution_times_since)
+
+                # Queue wait vs compute of the traced frames, generation to texture upload
+                cursor, trace_end_times, _, trace_waits, trace_computes = self.img_processor.get_trace_times_since(self.plot_cursors.get("trace", 0))
+                self.plot_cursors["trace"] = cursor
+                self.update_series("trace_wait_series", trace_end_times, trace_waits)
+                self.update_series("trace_compute_series", trace_end_times, trace_computes)
+
+                # Per-stage execution times of the processor
+                for stage in STAGES:
+                    self.update_timing_series(f"{stage}_stage_series", partial(self.img_processor.get_stage_execution_times_since, stage))
+
+                # Per-backend demosaic times (only backends that have run have data)
+                for backend in available_backends():
+                    self.update_timing_series(f"{backend}_backend_series", get_backend(backend).get_execution_times_since)
+
+                # Per-pass times of the ISP chain
+                for index, isp_pass in enumerate(self.isp_passes):
+                    self.update_timing_series(f"isp_{index}_series", isp_pass.get_execution_times_since)
 
                 # Update every 10ms for smooth real-time plotting
                 time.sleep(0.01)
@@ -228,7 +485,12 @@ class MainWindow:
 
     def cleanup(self):
         self.stop_plot_updates()
+        self.profiler.stop_sampling()
+        self.quality_controller.stop()
+        if self.exporter is not None:
+            self.exporter.stop()
         if self.img_generator.is_running():
             self.img_generator.stop()
+        self.display_mailbox.close()
         if self.img_processor.is_running():
             self.img_processor.stop()
\ No newline at end of file
@@ -0,0 +1,222 @@
+import json
+import os
+import platform
+import threading
+import time
+
+import numpy as np
+
+from base.img_processor import ImageProcessor
+from base.frame_pool import FrameBuffer
+from base.frame_queue import BLOCKING
+from base.demosaic import get_backend, available_backends, DEFAULT_BACKEND
+from base.synthetic_scene import build_frame_bank
+from base.metrics import MetricsRegistry
+
+
+'''
+Startup auto-tuner for the ImageProcessor configuration.
+
+The fastest demosaic backend, tiling (thread count, band height) and output
+dtype depend on the resolution and the host CPU. autotune() benchmarks
+candidate configurations on synthetic Bayer frames at the given resolution,
+pushing frames through a real ImageProcessor as fast as it accepts them, and
+returns the fastest one that meets the quality constraint. The search is
+staged instead of exhaustive: first the backend (single-threaded), then the
+tiling for that backend, then the output dtype.
+
+Quality constraint: full-resolution backends only, and a mean absolute
+difference to the reference backend's output (normalized to [0, 1]) of at
+most max_error. Output dtypes are limited to what the consumer accepts.
+
+Results are cached in a JSON file keyed by resolution, bit depth, CPU
+signature and the constraints, so later startups apply them without measuring.
+Pass force=True to re-tune (e.g. after a software update).
+'''
+
+# Bump when the search or the processor changes enough to invalidate cached results
+TUNER_VERSION = 1
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "img_processing_tests", "autotune.json")
+
+BAND_HEIGHTS = (128, 256, 512)
+MAX_ERROR = 0.01
+
+
+def cpu_signature():
+    """Host CPU description used in the cache key"""
+    model = platform.processor() or platform.machine()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return f"{model}/{os.cpu_count()} cpus"
+
+
+def thread_counts(cpu_count=None):
+    """Tiling thread counts to try: 1, powers of two and the CPU count"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    counts = {1, cpu_count}
+    count = 2
+    while count < cpu_count:
+        counts.add(count)
+        count *= 2
+    return sorted(counts)
+
+
+def cache_key(resolution, bit_depth, output_dtypes, max_error, processor_options):
+    options = ",".join(f"{key}={value}" for key, value in sorted(processor_options.items()))
+    dtypes = ",".join(np.dtype(dtype).name for dtype in output_dtypes)
+    return f"v{TUNER_VERSION}|{resolution[0]}x{resolution[1]}|{bit_depth}bit|{cpu_signature()}|{dtypes}|{max_error}|{options}"
+
+
+def load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(path, cache):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write then rename, so a concurrent startup never reads a partial file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(cache, f, indent=2)
+        f.write("\n")
+    os.replace(temporary, path)
+
+
+class _Trial:
+    """Time one processor configuration on a frame bank"""
+
+    def __init__(self, bank, bit_depth, frames, warmup_frames, processor_options):
+        self.bank = bank
+        self.bit_depth = bit_depth
+        self.frames = frames
+        self.warmup_frames = warmup_frames
+        self.processor_options = processor_options
+
+    def run(self, config):
+        """Returns (seconds per frame, first output normalized to float32 [0, 1])"""
+        processor = ImageProcessor(queue_policy=BLOCKING, queue_size=2, bit_depth=self.bit_depth,
+                                   metrics=MetricsRegistry(), **self.processor_options, **config)
+        total = self.warmup_frames + self.frames
+        delivered = 0
+        measured_start = None
+        first_output = None
+        done = threading.Event()
+        lock = threading.Lock()
+
+        def frame_done(output):
+            nonlocal delivered, measured_start, first_output
+            with lock:
+                if first_output is None:
+                    first_output = output.array.astype(np.float32)
+                    if output.array.dtype == np.uint8:
+                        first_output /= 255.0
+                delivered += 1
+                if delivered == self.warmup_frames:
+                    measured_start = time.perf_counter()
+                if delivered == total:
+                    done.set()
+
+        processor.register_frame_callback(frame_done)
+        processor.start()
+        try:
+            # Without warmup every frame is measured, so the clock starts before the first one is pushed
+            if not self.warmup_frames:
+                measured_start = time.perf_counter()
+            for i in range(total):
+                processor.set_raw_frame(FrameBuffer(self.bank[i % len(self.bank)]))
+            done.wait(timeout=60)
+            elapsed = time.perf_counter() - measured_start if done.is_set() else None
+        finally:
+            processor.stop()
+        if elapsed is None:
+            return float("inf"), first_output
+        return elapsed / self.frames, first_output
+
+
+def autotune(resolution, bit_depth=12, output_dtypes=(np.float32,), backends=None, max_error=MAX_ERROR,
+             frames=20, warmup_frames=3, cache_path=DEFAULT_CACHE_PATH, force=False, **processor_options):
+    """Fastest ImageProcessor configuration for resolution (width, height) on this host, as keyword arguments
+    (backend, num_threads, band_height, output_dtype). Cached results are returned without measuring.
+    processor_options (e.g. normalization, pipelined) are fixed for every candidate; pipelined mode and worker
+    processes rule out tiling."""
+    if frames < 1 or warmup_frames < 0:
+        raise ValueError(f"Auto-tune needs frames >= 1 and warmup_frames >= 0 (got {frames}, {warmup_frames})")
+    key = cache_key(resolution, bit_depth, output_dtypes, max_error, processor_options)
+    cache = load_cache(cache_path) if cache_path else {}
+    if key in cache and not force:
+        config = cache[key]["config"]
+        print(f"Auto-tune: cached configuration for {resolution[0]}x{resolution[1]}: {config}")
+        return config
+
+    print(f"Auto-tune: measuring configurations for {resolution[0]}x{resolution[1]}, {bit_depth}-bit ...")
+    start_time = time.perf_counter()
+    bank, _ = build_frame_bank(4, resolution, bit_depth=bit_depth, patterns=("RG",))
+    trial = _Trial(bank, bit_depth, frames, warmup_frames, processor_options)
+    can_tile = not processor_options.get("pipelined") and not processor_options.get("num_processes")
+    output_dtypes = [np.dtype(dtype).name for dtype in output_dtypes]
+    results = []
+
+    def measure(config):
+        seconds, output = trial.run(config)
+        results.append({"config": config, "frame_time_ms": seconds * 1000})
+        return seconds, output
+
+    # 1. Backend, single-threaded, checked against the reference backend's output
+    candidates = backends or [name for name in available_backends() if not get_backend(name).half_resolution]
+    reference = None
+    best = None
+    for name in [DEFAULT_BACKEND] + [name for name in candidates if name != DEFAULT_BACKEND]:
+        config = {"backend": name, "num_threads": 1, "band_height": BAND_HEIGHTS[1], "output_dtype": output_dtypes[0]}
+        seconds, output = measure(config)
+        if reference is None:
+            reference = output
+        error = float(np.mean(np.abs(output - reference))) if output is not None else float("inf")
+        results[-1]["error"] = error
+        if name not in candidates or error > max_error:
+            continue
+        if best is None or seconds < best[0]:
+            best = (seconds, config)
+    if best is None:
+        raise ValueError(f"No backend meets the quality constraint (max_error={max_error})")
+
+    # 2. Tiling for that backend
+    if can_tile:
+        for num_threads in thread_counts()[1:]:
+            for band_height in BAND_HEIGHTS:
+                config = dict(best[1], num_threads=num_threads, band_height=band_height)
+                seconds, _ = measure(config)
+                if seconds < best[0]:
+                    best = (seconds, config)
+
+    # 3. Output dtype (e.g. uint8 when the consumer takes byte textures)
+    for dtype in output_dtypes[1:]:
+        config = dict(best[1], output_dtype=dtype)
+        seconds, _ = measure(config)
+        if seconds < best[0]:
+            best = (seconds, config)
+
+    # The trials fed the shared backends' plot series
+    for name in available_backends():
+        get_backend(name).reset_statistics()
+
+    seconds, config = best
+    print(f"Auto-tune: {config} at {seconds * 1000:.2f} ms/frame "
+          f"({len(results)} candidates in {time.perf_counter() - start_time:.1f} s)")
+    if cache_path:
+        cache = load_cache(cache_path)
+        cache[key] = {"config": config, "frame_time_ms": seconds * 1000, "cpu": cpu_signature(),
+                      "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "candidates": results}
+        save_cache(cache_path, cache)
+    return config
@@ -0,0 +1,365 @@
+import argparse
+import json
+import os
+import platform
+import signal
+import subprocess
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from base.img_generator import ImageGenerator
+from base.frame_pacer import PACING_MODES, SCHEDULE_POLICIES, ARRIVAL_MODES, PACE_HYBRID, SCHEDULE_SKIP, ARRIVAL_PERIODIC
+from base.raw_recording import RawRecorder, ReplaySource, REPLAY_MODES, REPLAY_ORIGINAL
+from base.img_processor import ImageProcessor, STAGES
+from base.frame_queue import LATEST_ONLY, POLICIES
+from base.normalization import NORM_MINMAX, NORMALIZATION_MODES
+from base.demosaic import available_backends, DEFAULT_BACKEND
+from base.metrics import MetricsRegistry
+from base.isp_chain import parse_chain
+from base.autotune import autotune
+from base.quality_controller import QualityController
+from base.metrics_exporter import MetricsExporter
+from base.profiler import Profiler, install_signal_trigger
+from base.cam_manager import CameraSource
+from base import fake_pylon
+from base.stream_manager import StreamManager, SOURCE_KINDS, SOURCE_SYNTHETIC, SOURCE_CAMERA, SOURCE_REPLAY
+
+
+'''
+Headless pipeline benchmark.
+
+Wires ImageGenerator -> ImageProcessor without any GUI, runs for a fixed
+duration and returns a JSON-serializable report with achieved fps, drop
+counts, processing latency percentiles and the end-to-end frame trace
+aggregates (queue wait vs compute), so runs can be compared across
+commits and machines. Latencies come from the components' histograms, which
+cover every frame of the run.
+'''
+
+def host_info():
+    """Machine and software description stored with every report"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "commit": commit,
+    }
+
+
+def run_benchmark(duration=10.0, resolution=(2048, 1536), fps=100, backend=DEFAULT_BACKEND, warmup=1.0,
+                  replay=None, replay_mode=REPLAY_ORIGINAL, record=None, record_frames=1000, camera=None, fake_camera=None,
+                  pacing=PACE_HYBRID, schedule=SCHEDULE_SKIP, arrival=ARRIVAL_PERIODIC, target_latency=None, export=None, profile=None, profile_dir=None,
+                  metrics=None, profiler=None, **processor_options):
+    """Run generator -> processor headless for duration seconds and return the report dict.
+    replay serves a raw recording instead of synthetic frames; camera grabs from a camera index (fake_camera:
+    synthetic frames at resolution/fps through the pylon stand-in); record writes the source frames to a file.
+    target_latency (seconds) runs a QualityController that degrades processing to meet it.
+    export (MetricsExporter keyword arguments) publishes the run's metrics while it runs.
+    profile samples the thread stacks for that many seconds of the measured run; pass a profiler (on the
+    run's metrics registry) to reuse one, e.g. with a signal trigger installed by the caller."""
+    # A registry of its own by default, so the report only covers this run
+    metrics = metrics if metrics is not None else MetricsRegistry()
+    if camera is not None:
+        if fake_camera:
+            fake_pylon.set_devices(camera + 1, resolution, fps)
+        generator = CameraSource(camera, framerate=fps, fake=fake_camera, metrics=metrics)
+        resolution = (generator.width, generator.height)
+    elif replay:
+        generator = ReplaySource(replay, mode=replay_mode, framerate=fps, pacing=pacing, metrics=metrics)
+        resolution = (generator.width, generator.height)
+    else:
+        generator = ImageGenerator(framerate=fps, resolution=resolution, pacing=pacing, schedule=schedule, arrival=arrival, metrics=metrics)
+    processor = ImageProcessor(backend=backend, metrics=metrics, **processor_options)
+    controller = QualityController(processor, target_latency, metrics=metrics) if target_latency else None
+    exporter = MetricsExporter(metrics, **export) if export else None
+    profiler = profiler if profiler is not None else Profiler(metrics, output_dir=profile_dir)
+    recorder = RawRecorder(record, (resolution[1], resolution[0]), record_frames) if record else None
+
+    frames_processed = 0
+    counter_lock = threading.Lock()
+
+    def frame_done(frame):
+        nonlocal frames_processed
+        with counter_lock:
+            frames_processed += 1
+
+    if recorder is not None:
+        generator.register_callback(recorder.record)
+        recorder.register_callback(processor.set_raw_frame)
+    else:
+        generator.register_callback(processor.set_raw_frame)
+    processor.register_callback(frame_done)
+
+    processor.start()
+    generator.start()
+    if controller is not None:
+        controller.start()
+    if exporter is not None:
+        exporter.start()
+
+    # Let caches, pools and thread pools warm up before measuring
+    time.sleep(warmup)
+    generator.reset_statistics()
+    processor.reset_statistics()
+    generated_start = generator.frame_count
+    with counter_lock:
+        frames_processed = 0
+
+    start_time = time.perf_counter()
+    if profile:
+        profiler.start_sampling(min(profile, duration))
+    time.sleep(duration)
+    elapsed = time.perf_counter() - start_time
+    profiler.stop_sampling()
+
+    if controller is not None:
+        controller.stop()
+    if exporter is not None:
+        exporter.stop()
+    generator.stop()
+    processor.stop()
+    if recorder is not None:
+        recorder.close()
+    if replay or camera is not None:
+        generator.close()
+
+    frames_generated = generator.frame_count - generated_start
+    return {
+        "config": {
+            "duration_s": duration,
+            "resolution": list(resolution),
+            "target_fps": fps,
+            "backend": backend,
+            "replay": replay,
+            "replay_mode": replay_mode if replay else None,
+            "camera": camera,
+            "fake_camera": generator.cam.fake if camera is not None else None,
+            "pacing": pacing,
+            "schedule": schedule,
+            "arrival": arrival,
+            "target_latency_ms": target_latency * 1000 if target_latency else None,
+            # Non-JSON option values (e.g. dtypes) are stored by name
+            **{key: value if isinstance(value, (int, float, bool, str)) else str(value) for key, value in processor_options.items()},
+        },
+        "host": host_info(),
+        "elapsed_s": elapsed,
+        "frames_generated": frames_generated,
+        "frames_processed": frames_processed,
+        "frames_dropped": processor.get_frames_dropped(),
+        "frames_skipped": generator.get_frames_skipped(),
+        "missed_deadlines": generator.get_missed_deadlines(),
+        "generator_fps": frames_generated / elapsed,
+        "achieved_fps": frames_processed / elapsed,
+        "processing_latency": processor.get_latency_histogram().summary(),
+        "generation_latency": generator.get_latency_histogram().summary(),
+        # Source timing: lateness behind the schedule and inter-frame jitter
+        "pacing": generator.get_pacing_summary(),
+        "stage_latency": {stage: processor.get_stage_latency_histogram(stage).summary() for stage in STAGES},
+        # Per fused pass of the ISP chain, if one replaced the normalization
+        "isp_latency": {isp_pass.name: isp_pass.get_latency_histogram().summary() for isp_pass in processor.isp_chain.passes}
+                       if processor.isp_chain is not None else None,
+        # Generation -> delivery per frame: queue wait vs compute, per-hop latency and drops per stage
+        "trace": processor.get_trace_summary(),
+        # Quality level changes of the adaptive controller (wall time, level, reason)
+        "quality_changes": controller.get_history() if controller is not None else None,
+        "final_quality_level": controller.get_level_name() if controller is not None else None,
+        # Hot spots of the stack sampling window (--profile)
+        "profile": profiler.last_report,
+        # Everything the components registered (rates, gauges, histogram summaries)
+        "metrics": metrics.snapshot(),
+    }
+
+
+def run_stream_benchmark(streams=4, duration=10.0, resolution=(2048, 1536), fps=100, source=SOURCE_SYNTHETIC,
+                         fake_camera=None, replay=None, replay_mode=REPLAY_ORIGINAL, warmup=1.0, export=None, **manager_options):
+    """Run several streams through one StreamManager and return the report dict
+    (aggregate throughput plus per-stream fps, drops and latency)"""
+    metrics = MetricsRegistry()
+    manager = StreamManager(metrics=metrics, **manager_options)
+    exporter = MetricsExporter(metrics, **export) if export else None
+    if source == SOURCE_CAMERA and fake_camera:
+        fake_pylon.set_devices(streams, resolution, fps)
+    for i in range(streams):
+        if source == SOURCE_CAMERA:
+            manager.add_camera(f"cam{i}", i, framerate=fps, fake=fake_camera)
+        elif source == SOURCE_REPLAY:
+            manager.add_replay(f"replay{i}", replay, mode=replay_mode, framerate=fps)
+        else:
+            manager.add_synthetic(f"synthetic{i}", framerate=fps, resolution=resolution)
+
+    manager.start()
+    if exporter is not None:
+        exporter.start()
+    time.sleep(warmup)
+    manager.reset_statistics()
+    start_time = time.perf_counter()
+    time.sleep(duration)
+    elapsed = time.perf_counter() - start_time
+    summary = manager.summary()
+    if exporter is not None:
+        exporter.stop()
+    manager.stop()
+    manager.close()
+
+    return {
+        "config": {
+            "duration_s": duration,
+            "streams": streams,
+            "source": source,
+            "resolution": list(resolution),
+            "target_fps": fps,
+            **{key: value if isinstance(value, (int, float, bool, str)) else str(value) for key, value in manager_options.items()},
+        },
+        "host": host_info(),
+        "elapsed_s": elapsed,
+        "workers": summary["workers"],
+        # Frames delivered per second over the whole run, all streams together
+        "aggregate_fps": summary["frames"] / elapsed,
+        "per_stream": summary["per_stream"],
+        "metrics": metrics.snapshot(),
+    }
+
+
+def parse_resolution(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless generator -> processor benchmark with JSON report")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured run time in seconds")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured warm-up time in seconds")
+    parser.add_argument("--resolution", type=parse_resolution, default=(2048, 1536), help="WIDTHxHEIGHT")
+    parser.add_argument("--fps", type=float, default=100, help="Generator target framerate")
+    parser.add_argument("--backend", choices=available_backends(), default=DEFAULT_BACKEND)
+    parser.add_argument("--threads", type=int, default=1, help="Tiled demosaic threads (1 = single-threaded)")
+    parser.add_argument("--band-height", type=int, default=256)
+    parser.add_argument("--processes", type=int, default=0, help="Worker processes over shared memory (0 = in-process)")
+    parser.add_argument("--pipelined", action="store_true")
+    parser.add_argument("--normalization", choices=NORMALIZATION_MODES, default=NORM_MINMAX)
+    parser.add_argument("--isp", help="ISP chain replacing the normalization, e.g. black_level:64,white_balance:1.9:1.0:1.6,ccm,gamma:2.2")
+    parser.add_argument("--preview", action="store_true", help="Process the 2x2-binned preview for display")
+    parser.add_argument("--queue-policy", choices=POLICIES, default=LATEST_ONLY)
+    parser.add_argument("--queue-size", type=int, default=1)
+    parser.add_argument("--pacing", choices=PACING_MODES, default=PACE_HYBRID, help="Source pacing: plain sleep or sleep-then-spin")
+    parser.add_argument("--schedule", choices=SCHEDULE_POLICIES, default=SCHEDULE_SKIP,
+                        help="Skip missed slots, or keep the exact schedule and catch up with a burst (inflates achieved fps)")
+    parser.add_argument("--arrival", choices=ARRIVAL_MODES, default=ARRIVAL_PERIODIC, help="Frame arrival pattern at the target average rate")
+    parser.add_argument("--replay", help="Replay a raw recording instead of generating frames")
+    parser.add_argument("--replay-mode", choices=REPLAY_MODES, default=REPLAY_ORIGINAL, help="Replay timing (fixed uses --fps)")
+    parser.add_argument("--camera", type=int, help="Grab from this camera index instead of generating frames")
+    parser.add_argument("--fake-camera", action="store_true", default=None,
+                        help="Use the pylon stand-in (synthetic frames at --resolution/--fps); default when pypylon is missing")
+    parser.add_argument("--streams", type=int, default=0, help="Run this many concurrent streams through a StreamManager")
+    parser.add_argument("--stream-source", choices=SOURCE_KINDS, default=SOURCE_SYNTHETIC, help="Source of every stream (replay uses --replay)")
+    parser.add_argument("--workers", type=int, default=None, help="Stream processing workers (default: CPU count)")
+    parser.add_argument("--record", help="Record the source frames to a raw recording file")
+    parser.add_argument("--record-frames", type=int, default=1000, help="Capacity of the recording in frames")
+    parser.add_argument("--target-latency-ms", type=float, help="Adapt the processing quality to keep the p95 latency below this")
+    parser.add_argument("--prometheus-port", type=int, help="Serve the metrics in Prometheus text format on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--export-jsonl", help="Append metric snapshots to this JSON-lines file (rotated)")
+    parser.add_argument("--export-csv", help="Append metric snapshots to this CSV file (rotated)")
+    parser.add_argument("--export-interval", type=float, default=1.0, help="Seconds between metric snapshots")
+    parser.add_argument("--profile", type=float, help="Sample the thread stacks for this many seconds of the run and report hot spots")
+    parser.add_argument("--profile-dir", help="Also write the profile report (text and JSON) to this directory")
+    parser.add_argument("--autotune", action="store_true", help="Use the auto-tuned backend, --threads and --band-height for this host")
+    parser.add_argument("--retune", action="store_true", help="With --autotune: measure again instead of using the cached result")
+    parser.add_argument("--output", default="benchmark_report.json", help="JSON report path")
+    args = parser.parse_args(argv)
+
+    if args.autotune and not args.streams:
+        tuned = autotune(args.resolution, normalization=args.normalization, pipelined=args.pipelined,
+                         num_processes=args.processes, force=args.retune)
+        args.backend, args.threads, args.band_height = tuned["backend"], tuned["num_threads"], tuned["band_height"]
+
+    export = None
+    if args.prometheus_port is not None or args.export_jsonl or args.export_csv:
+        export = {"prometheus_port": args.prometheus_port, "jsonl_path": args.export_jsonl,
+                  "csv_path": args.export_csv, "interval": args.export_interval}
+
+    if args.streams:
+        report = run_stream_benchmark(
+            streams=args.streams,
+            duration=args.duration,
+            resolution=args.resolution,
+            fps=args.fps,
+            source=args.stream_source,
+            fake_camera=args.fake_camera,
+            replay=args.replay,
+            replay_mode=args.replay_mode,
+            warmup=args.warmup,
+            export=export,
+            num_workers=args.workers,
+            backend=args.backend,
+            normalization=args.normalization,
+            queue_policy=args.queue_policy,
+            queue_size=args.queue_size,
+        )
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Benchmark report written to {args.output}")
+        print(f"{report['aggregate_fps']:.1f} fps over {args.streams} streams with {report['workers']} workers")
+        return 0
+
+    # One signal trigger for the whole process: `kill -USR1 <pid>` starts a sampling window
+    metrics = MetricsRegistry()
+    profiler = Profiler(metrics, output_dir=args.profile_dir)
+    trigger = install_signal_trigger(profiler) if hasattr(signal, "SIGUSR1") else None
+    try:
+        report = run_benchmark(
+            duration=args.duration,
+            resolution=args.resolution,
+            fps=args.fps,
+            backend=args.backend,
+            warmup=args.warmup,
+            replay=args.replay,
+            replay_mode=args.replay_mode,
+            record=args.record,
+            record_frames=args.record_frames,
+            camera=args.camera,
+            fake_camera=args.fake_camera,
+            pacing=args.pacing,
+            schedule=args.schedule,
+            arrival=args.arrival,
+            target_latency=args.target_latency_ms / 1000 if args.target_latency_ms else None,
+            export=export,
+            profile=args.profile,
+            profile_dir=args.profile_dir,
+            num_threads=args.threads,
+            band_height=args.band_height,
+            num_processes=args.processes,
+            pipelined=args.pipelined,
+            normalization=args.normalization,
+            isp_chain=parse_chain(args.isp) if args.isp else None,
+            preview=args.preview,
+            queue_policy=args.queue_policy,
+            queue_size=args.queue_size,
+            metrics=metrics,
+            profiler=profiler,
+        )
+    finally:
+        if trigger is not None:
+            trigger.uninstall()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+    print(f"Benchmark report written to {args.output}")
+
+    latency = report["processing_latency"]
+    if latency["count"]:
+        print(f"{report['achieved_fps']:.1f} fps, {report['frames_dropped']} dropped, "
+              f"p50 {latency['p50_ms']:.2f} ms, p99 {latency['p99_ms']:.2f} ms")
+    return 0
@@ -1,47 +1,78 @@
 import os
 import sys
 #sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from pypylon import pylon
 import threading
 import numpy as np
 #from utils.logger import Logger, set_global_log_level_by_name
-import cv2
 import time
-from line_profiler import profile
 #from numba import jit, njit
 
+# The pylon SDK is optional: without it only the fake camera backend (base/fake_pylon.py) is available
+try:
+    from pypylon import pylon
+except ImportError:
+    pylon = None
 
+from base import fake_pylon
+from base.demosaic import get_backend, DEFAULT_BACKEND
+from base.normalization import FixedScaleNormalizer, normalize_minmax, NORM_MINMAX, NORM_LUT, NORMALIZATION_MODES
+from base.metrics import get_registry
+from base.frame_pool import FramePool, wrap_external, wrap_frame
+from base.frame_queue import FrameQueue, LATEST_ONLY
+from base.frame_trace import FrameTrace, GENERATED
+from base.plot_series import SampleHistory
 
 
-def process_frame_gpu(raw_frame, pixel_format):
-    """
-    GPU-accelerated frame processing using CuPy.
-    Only used in _callback_thread.
-    """
-    
+'''
+Basler camera access, and the camera as a frame source.
 
+The grab thread only retrieves frames: each grab buffer is wrapped into a
+FrameBuffer without copying and handed on. The buffer goes back to the camera
+(GrabResult.Release) when the last holder releases the FrameBuffer, so a
+retained frame never gets overwritten by the next grab. Processing happens on
+other threads, so RetrieveResult is never blocked by a demosaic:
+  - with a callback registered (CameraSource, or register_callback) frames go
+    straight to the consumer, e.g. ImageProcessor.set_raw_frame
+  - otherwise CamManager's own processing thread demosaics the newest frame for
+    get_processed_frame, writing into a small pool of preallocated output
+    buffers. get_processed_frame hands out a retained FrameBuffer instead of a
+    copy; the buffer is reused once the caller releases it.
+
+The camera keeps a fixed number of grab buffers (MaxNumBuffer); consumers must
+not hold more than a few frames at a time or the camera starts losing frames.
+
+CamManager(fake=True) uses the pylon stand-in in base/fake_pylon.py, which
+serves synthetic frames with the same buffer handling, so the camera path runs
+without hardware. By default the fake is used only when pypylon is missing.
+'''
+
+# RetrieveResult timeout; the grab thread checks for stop requests at least this often
+GRAB_TIMEOUT_MS = 100
+
+# Processed output buffers: the newest frame, the one being processed and one held by the caller
+PROCESSED_POOL_SIZE = 3
 
-    # Determine bit depth from pixel format
-    max_value = 255.0 if "8" in pixel_format else 4095.0
-    
-    if len(raw_frame.shape) == 2:  # Raw Bayer data      
-        height, width = raw_frame.shape
-        
-        # demosaic via opencv debayering
-        result = cv2.cvtColor(raw_frame, cv2.COLOR_BayerRG2RGB)
-        cv2.normalize(result, result, 0, 1, cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-        return result.flatten()
 
-      
 ''' CamManager class 
     This class is used to manage/connect to Basler Cameras
 ''' 
 class CamManager:
-    def __init__(self):
-        self.tl_factory = pylon.TlFactory.GetInstance()
+    def __init__(self, normalization=NORM_MINMAX, bit_depth=12, black_level=0, gamma=1.0, backend=DEFAULT_BACKEND,
+                 fake=None, metrics=None, metrics_prefix="camera"):
+        if fake is None:
+            fake = pylon is None
+            if fake:
+                print("pypylon is not installed, using the fake camera backend")
+        elif not fake and pylon is None:
+            raise ImportError("pypylon is not installed (use CamManager(fake=True) for the fake camera backend)")
+        self.fake = fake
+        self.pylon = fake_pylon if fake else pylon
+
+        self.tl_factory = self.pylon.TlFactory.GetInstance()
         self.devices = self.tl_factory.EnumerateDevices()
         self.current_cam = None
         self._capture_thread = None
+        self._processing_thread = None
         self._stop_event = threading.Event()
         self._frame_count = 0
 
@@ -54,9 +85,40 @@ class CamManager:
         self._frame_lock = threading.Lock()  # Thread safety for frame access
         self._is_new_frame = False
         self._frame_ready_event = threading.Event()
-        self._norm_buf = None
-        
-        
+
+        # Preallocated buffers of the processing thread, reallocated only when the frame shape changes
+        self._rgb_buffer = None
+        self._processed_pool = None
+        self.processed_dropped = 0
+
+        # Grab thread -> processing thread hand-off when no frame callback is registered
+        self._raw_queue = FrameQueue(policy=LATEST_ONLY)
+        self.frame_done_callback = None
+
+        self.set_normalization(normalization, bit_depth=bit_depth, black_level=black_level, gamma=gamma)
+
+        # Capture uses BayerRG12 (RGGB sensor layout)
+        self.pattern = "RG"
+        self.bit_depth = bit_depth
+        self.demosaic_backend = get_backend(backend)
+
+        # Recent (grab_time, hand-off end) tuples for plotting
+        self.execution_times = SampleHistory()
+        self.execution_times_lock = threading.Lock()
+        self.last_execution_time = 0
+        self.skipped_images = 0
+        self.grab_failures = 0
+
+        # Grab rate, time between grabbed frames, hand-off and processing time, read by the GUI and exporters
+        self.metrics = metrics if metrics is not None else get_registry()
+        self.metrics_prefix = metrics_prefix
+        self.frames_metric = self.metrics.rate(f"{metrics_prefix}.frames")
+        self.frame_interval_histogram = self.metrics.histogram(f"{metrics_prefix}.frame_interval")
+        self.latency_histogram = self.metrics.histogram(f"{metrics_prefix}.frame_time")
+        self.processing_histogram = self.metrics.histogram(f"{metrics_prefix}.processing_time")
+        self.metrics.gauge(f"{metrics_prefix}.skipped_images", lambda: self.skipped_images)
+        self.metrics.gauge(f"{metrics_prefix}.grab_failures", lambda: self.grab_failures)
+        self.metrics.gauge(f"{metrics_prefix}.processed_dropped", lambda: self.processed_dropped)
 
 
     def list_cameras(self):
@@ -75,7 +137,7 @@ class CamManager:
         if self.current_cam and self.current_cam.IsOpen():
             self.current_cam.Close()
 
-        self.current_cam = pylon.InstantCamera(self.tl_factory.CreateDevice(self.devices[index]))
+        self.current_cam = self.pylon.InstantCamera(self.tl_factory.CreateDevice(self.devices[index]))
         self.current_cam.Open()
         
         
@@ -97,7 +159,17 @@ class CamManager:
         self.current_cam = None
         
 
-    def start_capture(self):
+    def register_callback(self, callback):
+        '''
+        Hand every grabbed frame (a FrameBuffer of the grab buffer) to callback instead of processing it here.
+        The frame is only valid during the call unless the consumer retains it.
+        '''
+        self.frame_done_callback = callback
+
+    def start_capture(self, framerate=None):
+        '''
+        Start grabbing; framerate (if given) sets the camera's acquisition frame rate
+        '''
         if not self.current_cam or not self.current_cam.IsOpen():
             raise RuntimeError("Camera is not connected")
         if self.current_cam.IsGrabbing():
@@ -106,15 +178,20 @@ class CamManager:
         self.set_exposure_time(100)
         self.set_gain(0)
         self.current_cam.PixelFormat.Value = "BayerRG12"
+        if framerate:
+            self.current_cam.AcquisitionFrameRateEnable.SetValue(True)
+            self.current_cam.AcquisitionFrameRate.SetValue(framerate)
        
-        self.current_cam.StartGrabbing(pylon.GrabStrategy_LatestImageOnly)
+        self.current_cam.StartGrabbing(self.pylon.GrabStrategy_LatestImageOnly)
         
         self._stop_event.clear()
         self._frame_count = 0
-        self._gpu_failure_count = 0  # Track GPU failures
-        self._max_gpu_failures = 3  # Switch to CPU after 3 failures
+        self._raw_queue.open()
         self._capture_thread = threading.Thread(target=self._callback_thread)
         self._capture_thread.start()
+        if self.frame_done_callback is None:
+            self._processing_thread = threading.Thread(target=self._processing_loop)
+            self._processing_thread.start()
         
 
     def stop_capture(self):
@@ -126,61 +203,166 @@ class CamManager:
             self._frame_ready_event.set()  # Wake up any waiting threads
             self._capture_thread.join()
             self._capture_thread = None
+        # Wakes up the processing thread and releases a frame still waiting for it
+        self._raw_queue.close()
+        if self._processing_thread:
+            self._processing_thread.join()
+            self._processing_thread = None
+        if self.current_cam and self.current_cam.IsGrabbing():
+            self.current_cam.StopGrabbing()
             
+        with self._frame_lock:
+            if self._raw_frame is not None:
+                self._raw_frame.release()
+                self._raw_frame = None
+            if self._processed_frame is not None:
+                self._processed_frame.release()
+                self._processed_frame = None
+
+
+    def _wrap_grab_result(self, grab_result):
+        '''
+        FrameBuffer around the grab buffer, without copying. The grab result is released
+        (and the buffer goes back to the camera) when the last holder releases the frame.
+        '''
+        zero_copy = getattr(grab_result, "GetArrayZeroCopy", None)
+        if zero_copy is None:
+            # Older pypylon versions only offer GetArray, which copies: the buffer can go back right away
+            array = grab_result.GetArray()
+            grab_result.Release()
+            return wrap_frame(array)
+
+        context = zero_copy()
+        array = context.__enter__()
+
+        def on_release(buffer):
+            buffer.array = None
+            try:
+                context.__exit__(None, None, None)
+            except RuntimeError as e:
+                # pypylon refuses if views of the buffer are still referenced somewhere
+                print(f"Grab buffer released while still referenced: {e}")
+            grab_result.Release()
+
+        return wrap_external(array, on_release)
 
     def _callback_thread(self):
         '''
-        Thread to handle the callback from the camera
-        Measures the time between loops and logs it in ms and FPS.
+        Thread to handle the callback from the camera.
+        Only retrieves frames and hands them on; records the grab rate and the time between frames.
         '''
-        prev_time = time.time()
+        prev_time = time.perf_counter()
         while not self._stop_event.is_set():
 
-            grabResult = self.current_cam.RetrieveResult(5000)
-            if grabResult.GrabSucceeded():
-                # Thread-safe frame processing
-                with self._frame_lock:
-                    self._raw_frame = grabResult.GetArray()
-                    
-                    # Use GPU acceleration if available, otherwise fallback to CPU
-                    
+            grabResult = self.current_cam.RetrieveResult(GRAB_TIMEOUT_MS, self.pylon.TimeoutHandling_Return)
+            if not grabResult.IsValid():
+                # Timeout: check for a stop request and wait again
+                continue
+            if not grabResult.GrabSucceeded():
+                # Incomplete or corrupted frame; the camera keeps grabbing
+                self.grab_failures += 1
+                grabResult.Release()
+                continue
                     
-                    self._processed_frame = self.process_frame(self._raw_frame)
-
+            grab_time = time.perf_counter()
+            self.skipped_images += grabResult.GetNumberOfSkippedImages()
+            frame = self._wrap_grab_result(grabResult)
+            frame.metadata["pattern"] = self.pattern
+            trace = FrameTrace()
+            trace.stamp(GENERATED, grab_time)
+            frame.metadata["trace"] = trace
                 
-                    self._is_new_frame = True
-
-                self._frame_ready_event.set()
-                self._frame_count += 1
+            self._frame_count += 1
+            self.frame_interval_histogram.record(grab_time - prev_time)
+            prev_time = grab_time
+            self.frames_metric.record()
 
-                # Measure and log timing
-                curr_time = time.time()
-                loop_time = curr_time - prev_time
-                prev_time = curr_time
-                ms = loop_time * 1000 if loop_time > 0 else 0.0
-                fps = 1.0 / loop_time if loop_time > 0 else 0.0
+            callback = self.frame_done_callback
+            if callback:
+                callback(frame)
+            else:
+                self._raw_queue.put(frame.retain())
 
+            handoff_end = time.perf_counter()
+            with self.execution_times_lock:
+                self.execution_times.append(grab_time, handoff_end)
+                self.last_execution_time = handoff_end - grab_time
+            self.latency_histogram.record(handoff_end - grab_time)
                 
+            # Drop the grab thread's reference; the buffer goes back once consumers are done with it
+            frame.release()
                 
-            else:
-                
+    def _processing_loop(self):
+        '''
+        Thread that processes the newest grabbed frame for get_processed_frame / get_raw_frame
+        '''
+        while True:
+            frame = self._raw_queue.get()
+            if frame is None:
                 break
 
-            grabResult.Release()
+            processing_start = time.perf_counter()
+            rgb_shape = self.demosaic_backend.output_shape(frame.array.shape)
+            if self._rgb_buffer is None or self._rgb_buffer.shape != rgb_shape:
+                self._rgb_buffer = np.empty(rgb_shape, dtype=np.uint16)
+                self._processed_pool = FramePool(rgb_shape, np.float32, PROCESSED_POOL_SIZE)
+            output = self._processed_pool.acquire(timeout=0)
+            if output is None:
+                # The caller holds every output buffer; skip the frame instead of allocating
+                self.processed_dropped += 1
+                frame.release()
+                continue
+            self.process_frame(frame.array, out=output.array, rgb=self._rgb_buffer)
+            self.processing_histogram.record(time.perf_counter() - processing_start)
+
+            with self._frame_lock:
+                # Keep the newest raw frame (and its grab buffer) for get_raw_frame
+                if self._raw_frame is not None:
+                    self._raw_frame.release()
+                self._raw_frame = frame
+                # The previous output goes back to the pool once callers holding it release it
+                if self._processed_frame is not None:
+                    self._processed_frame.release()
+                self._processed_frame = output
+                self._is_new_frame = True
+
+            self._frame_ready_event.set()
     
-    @profile
-    def process_frame(self, raw_frame):
+    def set_normalization(self, mode, bit_depth=12, black_level=0, gamma=1.0):
+        '''
+        Select the normalization used by process_frame:
+        NORM_MINMAX (per-frame min/max) or NORM_LUT (fixed table for the sensor bit depth)
+        '''
+        if mode not in NORMALIZATION_MODES:
+            raise ValueError(f"Unknown normalization mode: {mode}")
+        self.normalization = mode
+        self._normalizer = FixedScaleNormalizer(bit_depth, black_level, gamma, np.float32) if mode == NORM_LUT else None
+
+    def set_backend(self, name):
+        '''
+        Select the demosaic backend used by process_frame (see base.demosaic)
+        '''
+        self.demosaic_backend = get_backend(name)
+
+    def process_frame(self, raw_frame, out=None, rgb=None):
         '''
         Process the raw frame to be used in the GUI
-        Process: (1) Demosaic from BayerRG to RGB
-                (2) Normalize to 0-1 range
+        Process: (1) Demosaic from BayerRG to RGB with the selected backend
+                (2) Normalize to 0-1 range (per-frame min/max or fixed-scale LUT)
                 (3) Return the processed frame as a flattened array
+        out (float32 RGB) and rgb (uint16 RGB scratch) are written in place when given, otherwise allocated
         '''
-        self.scale = 1.0 / 4095.0         
-  
-        rgb = cv2.cvtColor(raw_frame, cv2.COLOR_BayerRG2RGB)
-        rgb = cv2.normalize(rgb, None, alpha=0, beta=1.0, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-        return rgb.ravel()
+        rgb_shape = self.demosaic_backend.output_shape(raw_frame.shape)
+        if rgb is None:
+            rgb = np.empty(rgb_shape, dtype=np.uint16)
+        if out is None:
+            out = np.empty(rgb_shape, dtype=np.float32)
+        self.demosaic_backend.run(raw_frame, rgb, self.pattern, self.bit_depth)
+        if self._normalizer is not None:
+            self._normalizer.apply(rgb, out)
+        else:
+            normalize_minmax(rgb, out)
+        return out.ravel()
        
 
     # ---- camera settings ----
@@ -225,28 +407,35 @@ class CamManager:
     
     def get_raw_frame(self):
         '''
-        Get the raw frame from the camera (thread-safe)
+        Get a copy of the newest raw frame from the camera (thread-safe)
         '''
         with self._frame_lock:            
                 if self._raw_frame is not None:
                     self._is_new_frame = False
-                    return self._raw_frame.copy()
+                    # The grab buffer goes back to the camera, so the caller gets a copy
+                    return self._raw_frame.array.copy()
                 else:
                     return None
         
     def get_processed_frame(self):
         '''
-        Get the processed frame from the camera (thread-safe)
+        Get the newest processed frame (thread-safe) as a retained FrameBuffer (float32 RGB in .array), or None.
+        The buffer is not copied: the caller must call release() when done, after which it is reused.
         '''
         with self._frame_lock:            
             if self._processed_frame is not None:
                 self._is_new_frame = False
                 self._frame_ready_event.clear()  # Reset for next frame
-                return self._processed_frame.copy()
+                return self._processed_frame.retain()
             else:
                 return None
-  
     
+    def get_fps(self):
+        '''
+        Frames grabbed per second over the last second
+        '''
+        return self.frames_metric.get_rate()
+
     def get_resolution(self):
         '''
         Get the resolution of the camera
@@ -261,3 +450,93 @@ class CamManager:
     
     def __del__(self):
         self.disconnect()
+
+
+class CameraSource:
+    '''
+    A camera as a frame source with the ImageGenerator interface (register_callback/start/stop
+    and the statistics getters), e.g. camera -> ImageProcessor.set_raw_frame
+    '''
+    def __init__(self, index=0, framerate=None, cam_manager=None, fake=None, metrics=None, metrics_prefix="source"):
+        self.cam = cam_manager if cam_manager is not None else CamManager(fake=fake, metrics=metrics, metrics_prefix=metrics_prefix)
+        if not self.cam.is_connected():
+            self.cam.connect(index)
+        self.index = index
+        self.framerate = framerate
+        self.width, self.height = self.cam.get_resolution()
+
+        self.cam.metrics.gauge(f"{self.cam.metrics_prefix}.target_fps", self.get_target_fps)
+        self.cam.metrics.gauge(f"{self.cam.metrics_prefix}.missed_deadlines", self.get_missed_deadlines)
+        self.cam.metrics.gauge(f"{self.cam.metrics_prefix}.skipped_frames", self.get_frames_skipped)
+
+    def start(self):
+        self.cam.start_capture(self.framerate)
+        print(f"Camera source started: camera {self.index}, {self.width}x{self.height}")
+
+    def stop(self):
+        self.cam.stop_capture()
+        print(f"Camera source stopped. Total frames grabbed: {self.frame_count}")
+
+    @property
+    def frame_count(self):
+        return self.cam._frame_count
+
+    def is_running(self):
+        return self.cam.is_capturing()
+
+    def register_callback(self, callback):
+        self.cam.register_callback(callback)
+
+    def get_execution_times(self):
+        """Get a copy of the (grab, hand-off end) times for plotting (thread-safe)"""
+        return self.cam.execution_times.get()
+
+    def get_execution_times_since(self, cursor):
+        """(cursor, grab times, hand-off end times) recorded after cursor, for incremental plotting (thread-safe)"""
+        return self.cam.execution_times.get_since(cursor)
+
+    def get_latency_histogram(self):
+        """Get a snapshot of the hand-off time histogram (thread-safe)"""
+        return self.cam.latency_histogram.snapshot()
+
+    def get_last_execution_time(self):
+        with self.cam.execution_times_lock:
+            return self.cam.last_execution_time
+
+    def get_fps(self):
+        return self.cam.get_fps()
+
+    def get_frames_skipped(self):
+        """Frames the camera lost or overwrote because no grab buffer was free or the application fell behind"""
+        return self.cam.skipped_images
+
+    def get_missed_deadlines(self):
+        """The camera free-runs; every lost frame counts as a missed deadline"""
+        return self.cam.skipped_images
+
+    def get_pacing_summary(self):
+        """The camera paces itself (None, as for unpaced replay)"""
+        return None
+
+    def get_target_fps(self):
+        if self.framerate:
+            return self.framerate
+        return self.cam.current_cam.AcquisitionFrameRate.GetValue() if self.cam.is_connected() else 0.0
+
+    def reset_statistics(self):
+        """Reset all performance statistics (thread-safe)"""
+        self.cam.execution_times.clear()
+        with self.cam.execution_times_lock:
+            self.cam.last_execution_time = 0
+        self.cam.latency_histogram.reset()
+        self.cam.frame_interval_histogram.reset()
+        self.cam.processing_histogram.reset()
+        self.cam.frames_metric.reset()
+        self.cam.skipped_images = 0
+        self.cam.grab_failures = 0
+        self.cam.processed_dropped = 0
+        print("Camera source statistics reset")
+
+    def close(self):
+        """Disconnect the camera (after stop)"""
+        self.cam.disconnect()
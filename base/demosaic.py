@@ -0,0 +1,196 @@
+import cv2
+import numpy as np
+import threading
+import time
+
+from base.latency_histogram import LatencyHistogram
+from base.plot_series import SampleHistory
+
+
+'''
+Demosaic backend registry.
+
+Every backend converts a single-channel uint16 Bayer frame into a uint16 RGB
+frame written into a caller-provided buffer, and records its own
+(start_time, end_time) execution times so different algorithms can be compared
+under the same live load.
+
+Bayer layouts are named after the sensor order of the top-left 2x2 quad, read
+row by row: "RG" is an RGGB sensor (R at (0, 0)), "BG" is BGGR, and so on.
+OpenCV names its Bayer codes after the second row instead, so an RGGB sensor
+decodes with cv2.COLOR_BayerBG2RGB.
+'''
+
+BAYER_PATTERNS = ("RG", "GR", "GB", "BG")
+DEFAULT_PATTERN = "RG"
+
+DEFAULT_BACKEND = "opencv_bilinear"
+
+
+def channel_offsets(pattern):
+    """(row, col) offsets of R, G1, G2 and B inside the 2x2 quad of a Bayer layout"""
+    if pattern not in BAYER_PATTERNS:
+        raise ValueError(f"Unknown Bayer pattern: {pattern} (expected one of {BAYER_PATTERNS})")
+    quad = {"RG": "RGGB", "GR": "GRBG", "GB": "GBRG", "BG": "BGGR"}[pattern]
+    positions = [(0, 0), (0, 1), (1, 0), (1, 1)]
+    r = positions[quad.index("R")]
+    b = positions[quad.index("B")]
+    g1, g2 = [positions[i] for i, c in enumerate(quad) if c == "G"]
+    return r, g1, g2, b
+
+
+class DemosaicBackend:
+    name = None
+    # Rows of context needed above/below a band for band-wise (tiled) processing
+    halo_rows = 2
+    # Half-resolution backends output one RGB pixel per 2x2 quad
+    half_resolution = False
+
+    def __init__(self):
+        self.execution_times = SampleHistory()  # Recent (start_time, end_time) tuples for plotting
+        self.latency_histogram = LatencyHistogram()
+
+    def output_shape(self, raw_shape):
+        """Shape of the RGB output for a Bayer frame shape"""
+        if self.half_resolution:
+            return (raw_shape[0] // 2, raw_shape[1] // 2, 3)
+        return (raw_shape[0], raw_shape[1], 3)
+
+    def demosaic(self, raw, dst, pattern=DEFAULT_PATTERN, bit_depth=12):
+        """Demosaic raw (uint16 HxW) into dst (uint16, output_shape) without timing"""
+        raise NotImplementedError
+
+    def run(self, raw, dst, pattern=DEFAULT_PATTERN, bit_depth=12):
+        """Demosaic and record the execution time"""
+        start_time = time.perf_counter()
+        self.demosaic(raw, dst, pattern, bit_depth)
+        self.record_execution_time(start_time, time.perf_counter())
+        return dst
+
+    def record_execution_time(self, start_time, end_time):
+        """Record one execution of this backend (also used for band-wise processing)"""
+        self.execution_times.append(start_time, end_time)
+        self.latency_histogram.record(end_time - start_time)
+
+    def get_execution_times(self):
+        """Get a copy of execution times for plotting (thread-safe)"""
+        return self.execution_times.get()
+
+    def get_execution_times_since(self, cursor):
+        """(cursor, start_times, end_times) recorded after cursor, for incremental plotting (thread-safe)"""
+        return self.execution_times.get_since(cursor)
+
+    def get_latency_histogram(self):
+        """Get a snapshot of the execution time histogram (thread-safe)"""
+        return self.latency_histogram.copy()
+
+    def reset_statistics(self):
+        self.execution_times.clear()
+        self.latency_histogram.reset()
+
+
+class OpenCVBackend(DemosaicBackend):
+    def __init__(self, name, codes, eight_bit_only=False, halo_rows=DemosaicBackend.halo_rows):
+        super().__init__()
+        self.name = name
+        self.codes = codes
+        self.eight_bit_only = eight_bit_only
+        self.halo_rows = halo_rows
+        self._scratch = {}
+
+    def demosaic(self, raw, dst, pattern=DEFAULT_PATTERN, bit_depth=12):
+        code = self.codes[pattern]
+        if not self.eight_bit_only:
+            return cv2.cvtColor(raw, code, dst=dst)
+
+        # VNG only accepts 8-bit input: demosaic the top 8 bits and scale back to the sensor range
+        shift = max(0, bit_depth - 8)
+        raw8, rgb8 = self._get_scratch(raw.shape)
+        cv2.convertScaleAbs(raw, raw8, alpha=1.0 / (1 << shift))
+        cv2.cvtColor(raw8, code, dst=rgb8)
+        cv2.multiply(rgb8, 1 << shift, dst=dst, dtype=cv2.CV_16U)
+        return dst
+
+    def _get_scratch(self, shape):
+        # One set of 8-bit scratch buffers per thread and shape (tiled mode calls this concurrently)
+        key = (threading.get_ident(), shape)
+        if key not in self._scratch:
+            self._scratch[key] = (np.empty(shape, dtype=np.uint8), np.empty((shape[0], shape[1], 3), dtype=np.uint8))
+        return self._scratch[key]
+
+
+class NumpyBilinearBackend(DemosaicBackend):
+    name = "numpy_bilinear"
+
+    def demosaic(self, raw, dst, pattern=DEFAULT_PATTERN, bit_depth=12):
+        # Mirror padding keeps the CFA phase at the borders
+        padded = np.pad(raw, 1, mode="reflect").astype(np.float32)
+        r, g1, g2, b = channel_offsets(pattern)
+
+        for channel, offsets in ((0, (r,)), (1, (g1, g2)), (2, (b,))):
+            plane = np.zeros_like(padded)
+            for dy, dx in offsets:
+                # +1: offsets are relative to the unpadded frame
+                plane[1 + dy::2, 1 + dx::2] = padded[1 + dy::2, 1 + dx::2]
+
+            center = plane[1:-1, 1:-1]
+            cross = plane[:-2, 1:-1] + plane[2:, 1:-1] + plane[1:-1, :-2] + plane[1:-1, 2:]
+            if channel == 1:
+                # Green: known samples keep their value, missing ones average their 4 direct neighbours
+                interpolated = center + cross * 0.25
+            else:
+                # Red/blue: average the 2 direct or 4 diagonal neighbours carrying the channel
+                diagonal = plane[:-2, :-2] + plane[:-2, 2:] + plane[2:, :-2] + plane[2:, 2:]
+                interpolated = center + cross * 0.5 + diagonal * 0.25
+            np.rint(interpolated, out=interpolated)
+            dst[..., channel] = interpolated
+        return dst
+
+
+class SuperpixelBackend(DemosaicBackend):
+    name = "superpixel"
+    halo_rows = 0
+    half_resolution = True
+
+    def demosaic(self, raw, dst, pattern=DEFAULT_PATTERN, bit_depth=12):
+        # Every 2x2 quad becomes one RGB pixel: R, mean of both greens, B
+        (ry, rx), (g1y, g1x), (g2y, g2x), (by, bx) = channel_offsets(pattern)
+        height, width = dst.shape[0] * 2, dst.shape[1] * 2
+        dst[..., 0] = raw[ry:height:2, rx:width:2]
+        dst[..., 1] = (raw[g1y:height:2, g1x:width:2].astype(np.uint32) + raw[g2y:height:2, g2x:width:2]) >> 1
+        dst[..., 2] = raw[by:height:2, bx:width:2]
+        return dst
+
+
+def _opencv_codes(suffix=""):
+    # OpenCV names Bayer codes after the second row of the pattern (see module docstring)
+    opencv_names = {"RG": "BG", "GR": "GB", "GB": "GR", "BG": "RG"}
+    return {pattern: getattr(cv2, f"COLOR_Bayer{opencv_names[pattern]}2RGB{suffix}") for pattern in BAYER_PATTERNS}
+
+
+_BACKENDS = {}
+
+
+def register_backend(backend):
+    """Register a backend instance under its name (replaces an existing one)"""
+    _BACKENDS[backend.name] = backend
+    return backend
+
+
+def get_backend(name):
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown demosaic backend: {name} (available: {available_backends()})")
+    return _BACKENDS[name]
+
+
+def available_backends():
+    return list(_BACKENDS)
+
+
+register_backend(OpenCVBackend("opencv_bilinear", _opencv_codes()))
+# VNG takes its gradients from 5x5 windows of a bilinear first pass and fills the outer rows
+# of its input separately, so a band needs 8 rows of context to match the full-frame result
+register_backend(OpenCVBackend("opencv_vng", _opencv_codes("_VNG"), eight_bit_only=True, halo_rows=8))
+register_backend(OpenCVBackend("opencv_ea", _opencv_codes("_EA")))
+register_backend(NumpyBilinearBackend())
+register_backend(SuperpixelBackend())
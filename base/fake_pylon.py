@@ -0,0 +1,246 @@
+import contextlib
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from base.synthetic_scene import build_frame_bank
+from base.frame_pacer import FramePacer
+
+
+'''
+Stand-in for the subset of pypylon's `pylon` module that CamManager uses, so the
+camera path can run and be benchmarked without hardware or the pylon SDK.
+
+Use the module in place of `pylon` (CamManager(fake=True) does). Fake devices
+are configured with set_devices(); each one serves frames of a synthetic Bayer
+scene bank (BayerRG12) at AcquisitionFrameRate.
+
+Like a real camera, a fake camera owns a fixed set of grab buffers
+(MaxNumBuffer). A "sensor" thread writes each frame into a free buffer, playing
+the part of the camera's DMA transfer, and queues it. RetrieveResult hands the
+buffer out inside a GrabResult, and the buffer is only reused after
+GrabResult.Release(). When every buffer is held, new frames are lost and
+reported through GetNumberOfSkippedImages(), as pylon does. With
+GrabStrategy_LatestImageOnly only the newest queued frame is kept.
+'''
+
+GrabStrategy_OneByOne = 0
+GrabStrategy_LatestImageOnly = 1
+
+TimeoutHandling_Return = 0
+TimeoutHandling_ThrowException = 1
+
+MODEL_NAME = "Fake acA2040-120um"
+MAX_NUM_BUFFER = 10
+
+
+class TimeoutException(RuntimeError):
+    pass
+
+
+class _Parameter:
+    """GenICam-style parameter: GetValue/SetValue and the Value property"""
+
+    def __init__(self, value):
+        self._value = value
+
+    def GetValue(self):
+        return self._value
+
+    def SetValue(self, value):
+        self._value = value
+
+    Value = property(GetValue, SetValue)
+
+
+class DeviceInfo:
+    def __init__(self, serial, resolution, framerate):
+        self.serial = serial
+        self.resolution = resolution
+        self.framerate = framerate
+
+    def GetModelName(self):
+        return MODEL_NAME
+
+    def GetSerialNumber(self):
+        return self.serial
+
+
+_devices = [DeviceInfo("FAKE0000", (2048, 1536), 100.0)]
+
+
+def set_devices(count=1, resolution=(2048, 1536), framerate=100.0):
+    """Configure the fake devices the transport layer enumerates"""
+    global _devices
+    _devices = [DeviceInfo(f"FAKE{i:04d}", tuple(resolution), framerate) for i in range(count)]
+
+
+class TlFactory:
+    _instance = None
+
+    @classmethod
+    def GetInstance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def EnumerateDevices(self):
+        return list(_devices)
+
+    def CreateDevice(self, device_info):
+        return device_info
+
+
+class GrabResult:
+    def __init__(self, camera=None, index=-1, block_id=0, timestamp=0, skipped=0):
+        self._camera = camera
+        self._index = index
+        # Buffers of the grab session the result belongs to (a restart allocates new ones)
+        self._buffers = camera._buffers if camera is not None else None
+        self.BlockID = block_id
+        self.TimeStamp = timestamp
+        self._skipped = skipped
+
+    def IsValid(self):
+        return self._camera is not None
+
+    def GrabSucceeded(self):
+        return self._camera is not None
+
+    def GetErrorDescription(self):
+        return "" if self.GrabSucceeded() else "Timeout"
+
+    def GetNumberOfSkippedImages(self):
+        return self._skipped
+
+    def GetArray(self):
+        """Copy of the grab buffer"""
+        return self._buffers[self._index].copy()
+
+    @contextlib.contextmanager
+    def GetArrayZeroCopy(self):
+        """View of the grab buffer, valid until Release()"""
+        yield self._buffers[self._index]
+
+    def Release(self):
+        if self._camera is not None:
+            self._camera._release_buffer(self._buffers, self._index)
+            self._camera = None
+
+
+class InstantCamera:
+    def __init__(self, device_info, bank_size=16):
+        self.device_info = device_info
+        self.bank_size = bank_size
+        width, height = device_info.resolution
+
+        self.Width = _Parameter(width)
+        self.Height = _Parameter(height)
+        self.PixelFormat = _Parameter("BayerRG12")
+        self.ExposureTime = _Parameter(1000.0)
+        self.Gain = _Parameter(0.0)
+        self.AcquisitionFrameRateEnable = _Parameter(True)
+        self.AcquisitionFrameRate = _Parameter(device_info.framerate)
+        self.MaxNumBuffer = _Parameter(MAX_NUM_BUFFER)
+
+        self._open = False
+        self._bank = None
+        self._buffers = None
+        self._free = []
+        self._ready = deque()
+        self._cond = threading.Condition()
+        self._strategy = GrabStrategy_OneByOne
+        self._skipped = 0
+        self._block_id = 0
+        self._sensor_thread = None
+        self._grabbing = False
+
+    def Open(self):
+        self._open = True
+
+    def Close(self):
+        if self._grabbing:
+            self.StopGrabbing()
+        self._open = False
+
+    def IsOpen(self):
+        return self._open
+
+    def IsGrabbing(self):
+        return self._grabbing
+
+    def StartGrabbing(self, strategy=GrabStrategy_OneByOne):
+        if not self._open:
+            raise RuntimeError("Camera is not open")
+        if self._grabbing:
+            raise RuntimeError("Camera is already grabbing")
+        resolution = (self.Width.GetValue(), self.Height.GetValue())
+        if self._bank is None or self._bank.shape[1:] != resolution[::-1]:
+            self._bank, _ = build_frame_bank(self.bank_size, resolution, bit_depth=12, patterns=("RG",))
+        count = self.MaxNumBuffer.GetValue()
+        self._buffers = np.empty((count, resolution[1], resolution[0]), dtype=np.uint16)
+        self._free = list(range(count))
+        self._ready.clear()
+        self._strategy = strategy
+        self._skipped = 0
+        self._block_id = 0
+
+        self._grabbing = True
+        self._sensor_thread = threading.Thread(target=self._sensor_loop, daemon=True, name=f"fake-sensor-{self.device_info.serial}")
+        self._sensor_thread.start()
+
+    def StopGrabbing(self):
+        with self._cond:
+            self._grabbing = False
+            self._cond.notify_all()
+        if self._sensor_thread is not None:
+            self._sensor_thread.join()
+        self._sensor_thread = None
+
+    def _sensor_loop(self):
+        pacer = FramePacer(self.AcquisitionFrameRate.GetValue())
+        pacer.start()
+        frame_index = 0
+        while self._grabbing:
+            pacer.wait()
+            with self._cond:
+                if not self._free and self._strategy == GrabStrategy_LatestImageOnly and self._ready:
+                    # Overwrite the oldest unread frame
+                    self._free.append(self._ready.popleft()[0])
+                    self._skipped += 1
+                if not self._free:
+                    # Every buffer is held by the application: the frame is lost
+                    self._skipped += 1
+                    frame_index += 1
+                    continue
+                index = self._free.pop()
+
+            # The camera's DMA transfer into the grab buffer
+            np.copyto(self._buffers[index], self._bank[frame_index % len(self._bank)])
+            frame_index += 1
+
+            with self._cond:
+                if self._strategy == GrabStrategy_LatestImageOnly:
+                    while self._ready:
+                        self._free.append(self._ready.popleft()[0])
+                        self._skipped += 1
+                self._block_id += 1
+                self._ready.append((index, self._block_id, time.perf_counter_ns()))
+                self._cond.notify_all()
+
+    def RetrieveResult(self, timeout_ms, timeout_handling=TimeoutHandling_ThrowException):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._ready or not self._grabbing, timeout_ms / 1000.0) or not self._ready:
+                if timeout_handling == TimeoutHandling_Return:
+                    return GrabResult()
+                raise TimeoutException(f"No frame within {timeout_ms} ms")
+            index, block_id, timestamp = self._ready.popleft()
+            skipped, self._skipped = self._skipped, 0
+        return GrabResult(self, index, block_id, timestamp, skipped)
+
+    def _release_buffer(self, buffers, index):
+        with self._cond:
+            if buffers is self._buffers:
+                self._free.append(index)
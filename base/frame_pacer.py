@@ -0,0 +1,189 @@
+import numpy as np
+import threading
+import time
+
+from base.latency_histogram import LatencyHistogram
+
+
+'''
+Frame pacing for frame sources.
+
+time.sleep alone overshoots its deadline by the scheduler's wake-up latency,
+which is tens of microseconds to milliseconds on Linux. That is a large part
+of the frame interval at 200-1000 fps. PACE_HYBRID sleeps until spin_threshold
+before the deadline and then spins the rest of the way. The spin loop yields
+with time.sleep(0), so it does not hold the GIL against the processing threads.
+
+Schedule policies when the source falls behind:
+  - SCHEDULE_EXACT: deadlines stay on the original grid. Late frames are sent
+    back-to-back until the source has caught up, and no frame is lost.
+  - SCHEDULE_SKIP: slots more than one interval in the past are skipped
+    (counted) and the next frame goes out in the most recent slot.
+Either way, a frame sent a full interval or more after its deadline counts as
+a missed deadline instead of being silently absorbed.
+
+Arrival modes: ARRIVAL_PERIODIC (evenly spaced), ARRIVAL_BURST (burst_size
+frames back-to-back, at the same average rate) and ARRIVAL_POISSON
+(exponentially distributed gaps with the same mean).
+
+Per frame the pacer records the lateness (send time - deadline) and the
+inter-frame jitter (|actual gap - scheduled gap|) into histograms.
+'''
+
+PACE_SLEEP = "sleep"
+PACE_HYBRID = "hybrid"
+PACING_MODES = (PACE_SLEEP, PACE_HYBRID)
+
+SCHEDULE_EXACT = "exact"
+SCHEDULE_SKIP = "skip"
+SCHEDULE_POLICIES = (SCHEDULE_EXACT, SCHEDULE_SKIP)
+
+ARRIVAL_PERIODIC = "periodic"
+ARRIVAL_BURST = "burst"
+ARRIVAL_POISSON = "poisson"
+ARRIVAL_MODES = (ARRIVAL_PERIODIC, ARRIVAL_BURST, ARRIVAL_POISSON)
+
+# Sleep until this long before the deadline, then spin (hybrid mode)
+SPIN_THRESHOLD = 0.001
+
+
+class FramePacer:
+    def __init__(self, framerate, mode=PACE_HYBRID, policy=SCHEDULE_EXACT, arrival=ARRIVAL_PERIODIC,
+                 spin_threshold=SPIN_THRESHOLD, burst_size=4, seed=None):
+        if mode not in PACING_MODES:
+            raise ValueError(f"Unknown pacing mode: {mode} (expected one of {PACING_MODES})")
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"Unknown schedule policy: {policy} (expected one of {SCHEDULE_POLICIES})")
+        if arrival not in ARRIVAL_MODES:
+            raise ValueError(f"Unknown arrival mode: {arrival} (expected one of {ARRIVAL_MODES})")
+
+        self.framerate = framerate
+        self.interval = 1.0 / framerate
+        self.mode = mode
+        self.policy = policy
+        self.arrival = arrival
+        self.spin_threshold = spin_threshold
+        self.burst_size = max(1, burst_size)
+        self._rng = np.random.default_rng(seed)
+
+        self._start_time = None
+        self._slot = 0
+        self._deadline = None
+        self._last_send = None
+        self._last_deadline = None
+
+        self.lock = threading.Lock()
+        self.lateness_histogram = LatencyHistogram()
+        self.jitter_histogram = LatencyHistogram()
+        self.frames_sent = 0
+        self.missed_deadlines = 0
+        self.skipped_frames = 0
+        self._first_send = None
+
+    def start(self):
+        """Start a new schedule; the first frame is due immediately"""
+        self._start_time = time.perf_counter()
+        self._slot = 0
+        self._deadline = self._start_time
+        self._last_send = None
+        self._last_deadline = None
+
+    def _next_deadline(self):
+        self._slot += 1
+        if self.arrival == ARRIVAL_PERIODIC:
+            return self._start_time + self._slot * self.interval
+        if self.arrival == ARRIVAL_BURST:
+            return self._start_time + (self._slot // self.burst_size) * self.burst_size * self.interval
+        return self._deadline + self._rng.exponential(self.interval)
+
+    def wait_until(self, deadline):
+        """Block until deadline (perf_counter time) without recording statistics"""
+        remaining = deadline - time.perf_counter()
+        if self.mode == PACE_SLEEP:
+            if remaining > 0:
+                time.sleep(remaining)
+            return
+
+        if remaining > self.spin_threshold:
+            time.sleep(remaining - self.spin_threshold)
+        while time.perf_counter() < deadline:
+            time.sleep(0)
+
+    def wait(self):
+        """Block until the next frame of the schedule is due and return its deadline"""
+        if self._deadline is None:
+            self.start()
+
+        skipped = 0
+        if self.policy == SCHEDULE_SKIP:
+            now = time.perf_counter()
+            while now - self._deadline >= self.interval:
+                self._deadline = self._next_deadline()
+                skipped += 1
+
+        deadline = self._deadline
+        self.wait_for(deadline, skipped)
+        self._deadline = self._next_deadline()
+        return deadline
+
+    def wait_for(self, deadline, skipped=0):
+        """Block until an externally scheduled deadline and record the frame's timing"""
+        self.wait_until(deadline)
+        send_time = time.perf_counter()
+        lateness = send_time - deadline
+
+        jitter = None
+        with self.lock:
+            if self._last_send is not None:
+                jitter = abs((send_time - self._last_send) - (deadline - self._last_deadline))
+            self._last_send = send_time
+            self._last_deadline = deadline
+            if self._first_send is None:
+                self._first_send = send_time
+            self.frames_sent += 1
+            self.skipped_frames += skipped
+            self.missed_deadlines += skipped
+            if lateness >= self.interval:
+                self.missed_deadlines += 1
+
+        self.lateness_histogram.record(lateness)
+        if jitter is not None:
+            self.jitter_histogram.record(jitter)
+        return send_time
+
+    def get_missed_deadlines(self):
+        with self.lock:
+            return self.missed_deadlines
+
+    def get_skipped_frames(self):
+        with self.lock:
+            return self.skipped_frames
+
+    def summary(self):
+        """Frame counts, achieved rate and lateness/jitter percentiles (ms)"""
+        with self.lock:
+            frames_sent, missed, skipped = self.frames_sent, self.missed_deadlines, self.skipped_frames
+            elapsed = self._last_send - self._first_send if self._first_send is not None else 0.0
+        return {
+            "mode": self.mode,
+            "policy": self.policy,
+            "arrival": self.arrival,
+            "target_fps": self.framerate,
+            "achieved_fps": (frames_sent - 1) / elapsed if elapsed > 0 else 0.0,
+            "frames_sent": frames_sent,
+            "missed_deadlines": missed,
+            "skipped_frames": skipped,
+            "lateness": self.lateness_histogram.summary(),
+            "jitter": self.jitter_histogram.summary(),
+        }
+
+    def reset_statistics(self):
+        self.lateness_histogram.reset()
+        self.jitter_histogram.reset()
+        with self.lock:
+            self.frames_sent = 0
+            self.missed_deadlines = 0
+            self.skipped_frames = 0
+            self._first_send = None
+            # The next jitter sample starts a new series
+            self._last_send = None
@@ -0,0 +1,194 @@
+import numpy as np
+import threading
+from multiprocessing import shared_memory
+
+
+'''
+Bounded pool of preallocated, reference-counted frame buffers.
+
+Producers borrow a buffer with acquire(), fill it and hand it downstream. Every
+holder that keeps the buffer past the call it received it in calls retain(),
+and every holder calls release() when done. The buffer goes back to the pool
+once its reference count drops to zero, so nothing is allocated on the hot path.
+wrap_external gives buffers owned elsewhere (e.g. camera grab buffers) the same
+retain/release protocol, returning them to their owner instead of a pool.
+
+SharedFramePool keeps its buffers as slots of one multiprocessing shared memory
+block, so other processes can attach to a buffer by (block name, slot index)
+instead of receiving a pickled copy.
+'''
+
+class FrameBuffer:
+    def __init__(self, array, pool=None, index=-1):
+        self.array = array
+        self.pool = pool
+        self.index = index
+
+        self.refcount = 0
+        self.metadata = {}
+
+    def retain(self):
+        """Take an additional reference on the buffer"""
+        if self.pool is not None:
+            self.pool._retain(self)
+        return self
+
+    def release(self):
+        """Drop a reference; the buffer returns to its pool when none are left"""
+        if self.pool is not None:
+            self.pool._release(self)
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+
+def wrap_frame(frame):
+    """Wrap a plain array into an unpooled FrameBuffer (retain/release are no-ops)"""
+    if isinstance(frame, FrameBuffer):
+        return frame
+    return FrameBuffer(frame)
+
+
+class ExternalBuffer:
+    """Owner of a single buffer that belongs to someone else (e.g. a camera driver's grab buffer).
+    Stands in for the pool: on_release is called once the last reference is dropped."""
+
+    def __init__(self, on_release):
+        self.on_release = on_release
+        self._lock = threading.Lock()
+
+    def _retain(self, buffer):
+        with self._lock:
+            if buffer.refcount <= 0:
+                raise RuntimeError("Retaining released external buffer")
+            buffer.refcount += 1
+
+    def _release(self, buffer):
+        with self._lock:
+            if buffer.refcount <= 0:
+                raise RuntimeError("External buffer released more often than retained")
+            buffer.refcount -= 1
+            if buffer.refcount:
+                return
+        self.on_release(buffer)
+
+
+def wrap_external(array, on_release):
+    """FrameBuffer (refcount 1) around an array owned elsewhere, handed back with on_release(buffer)
+    when the last holder releases it"""
+    buffer = FrameBuffer(array, ExternalBuffer(on_release))
+    buffer.refcount = 1
+    return buffer
+
+
+class FramePool:
+    def __init__(self, shape, dtype, count=4):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.count = count
+
+        self._buffers = [FrameBuffer(array, self, i) for i, array in enumerate(self._allocate())]
+        self._free = list(range(count))
+        self._cond = threading.Condition()
+
+        self.exhausted_count = 0
+
+    def _allocate(self):
+        return [np.empty(self.shape, dtype=self.dtype) for _ in range(self.count)]
+
+    def acquire(self, timeout=None):
+        """Borrow a free buffer (refcount 1). Returns None if none frees up within timeout."""
+        with self._cond:
+            if not self._free:
+                self.exhausted_count += 1
+                if timeout == 0 or not self._cond.wait_for(lambda: self._free, timeout):
+                    return None
+            buffer = self._buffers[self._free.pop()]
+            buffer.refcount = 1
+            buffer.metadata.clear()
+            return buffer
+
+    def _retain(self, buffer):
+        with self._cond:
+            if buffer.refcount <= 0:
+                raise RuntimeError(f"Retaining released buffer {buffer.index}")
+            buffer.refcount += 1
+
+    def _release(self, buffer):
+        with self._cond:
+            if buffer.refcount <= 0:
+                raise RuntimeError(f"Buffer {buffer.index} released more often than retained")
+            buffer.refcount -= 1
+            if buffer.refcount == 0:
+                self._free.append(buffer.index)
+                self._cond.notify()
+
+    def matches(self, shape, dtype):
+        """Check whether this pool hands out buffers of the given shape and dtype"""
+        return self.shape == tuple(shape) and self.dtype == np.dtype(dtype)
+
+    def available(self):
+        """Number of buffers currently free (thread-safe)"""
+        with self._cond:
+            return len(self._free)
+
+
+class SharedFramePool(FramePool):
+    def __init__(self, shape, dtype, count=4):
+        slot_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, slot_bytes * count))
+        self._closed = False
+        super().__init__(shape, dtype, count)
+
+    def _allocate(self):
+        slots = np.ndarray((self.count, *self.shape), dtype=self.dtype, buffer=self.shm.buf)
+        return list(slots)
+
+    def slot(self, buffer):
+        """Picklable descriptor other processes use to attach to a buffer (see attach_slot)"""
+        return (self.shm.name, self.count, self.shape, self.dtype.str, buffer.index)
+
+    def close(self):
+        """Unlink the shared memory block; the pool must not be used afterwards. Buffers still held
+        (e.g. by a display mailbox) stay readable; the block is unmapped at their last release."""
+        with self._cond:
+            self._closed = True
+            for buffer in self._buffers:
+                if buffer.refcount == 0:
+                    buffer.array = None
+            if not any(buffer.refcount for buffer in self._buffers):
+                self._unmap()
+        self.shm.unlink()
+
+    def _release(self, buffer):
+        super()._release(buffer)
+        with self._cond:
+            if not self._closed or buffer.refcount:
+                return
+            buffer.array = None
+            if not any(other.refcount for other in self._buffers):
+                self._unmap()
+
+    def _unmap(self):
+        # numpy does not keep the buffer export, so the views must be gone before the mapping is closed
+        self.shm.close()
+
+def attach_slot(slot, attached):
+    """Array view of a SharedFramePool slot in another process. attached caches the
+    opened blocks by name; close them with detach_all when done."""
+    name, count, shape, dtype, index = slot
+    if name not in attached:
+        shm = shared_memory.SharedMemory(name=name)
+        attached[name] = (shm, np.ndarray((count, *shape), dtype=np.dtype(dtype), buffer=shm.buf))
+    return attached[name][1][index]
+
+
+def detach_all(attached):
+    blocks = [shm for shm, _ in attached.values()]
+    attached.clear()
+    for shm in blocks:
+        try:
+            shm.close()
+        except BufferError:
+            pass
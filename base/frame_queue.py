@@ -0,0 +1,114 @@
+import threading
+from collections import deque
+
+
+'''
+Condition-based frame queue between a frame source and a consumer thread.
+
+Consumers block in get() instead of polling. What happens when the queue is
+full is decided by the backpressure policy:
+  - LATEST_ONLY:  keep only the newest frame, the pending one is dropped
+  - BOUNDED_FIFO: keep up to maxsize frames in order, new frames are dropped when full
+  - BLOCKING:     the producer waits until there is room again (nothing is dropped
+                  unless the queue is closed while waiting)
+
+The queue owns the reference of every frame put into it; dropped frames are
+released by the queue (after the optional on_drop hook has seen them), dequeued
+frames are released by the consumer.
+'''
+
+LATEST_ONLY = "latest"
+BOUNDED_FIFO = "fifo"
+BLOCKING = "blocking"
+
+POLICIES = (LATEST_ONLY, BOUNDED_FIFO, BLOCKING)
+
+
+class FrameQueue:
+    def __init__(self, policy=LATEST_ONLY, maxsize=1, on_drop=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy} (expected one of {POLICIES})")
+        if maxsize < 1:
+            raise ValueError(f"Queue size must be at least 1, got {maxsize}")
+
+        self.policy = policy
+        self.maxsize = 1 if policy == LATEST_ONLY else maxsize
+
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._dropped = 0
+        self.on_drop = on_drop
+
+    def put(self, frame, timeout=None):
+        """Enqueue a frame according to the policy. Returns False if the frame was dropped."""
+        dropped = None
+        accepted = True
+        with self._cond:
+            if self.policy == BLOCKING and not self._closed:
+                self._cond.wait_for(lambda: len(self._items) < self.maxsize or self._closed, timeout)
+
+            if self._closed:
+                dropped, accepted = frame, False
+            elif len(self._items) < self.maxsize:
+                self._items.append(frame)
+            elif self.policy == LATEST_ONLY:
+                dropped = self._items.popleft()
+                self._items.append(frame)
+            else:
+                # Bounded FIFO (or blocking producer that timed out): the new frame is dropped
+                dropped, accepted = frame, False
+
+            if dropped is not None:
+                self._dropped += 1
+            if accepted:
+                self._cond.notify_all()
+
+        if dropped is not None:
+            if self.on_drop:
+                self.on_drop(dropped)
+            dropped.release()
+        return accepted
+
+    def get(self, timeout=None):
+        """Wait for the next frame. Returns None on timeout or once the queue is closed."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            if self._closed:
+                return None
+            frame = self._items.popleft()
+            self._cond.notify_all()
+            return frame
+
+    def close(self):
+        """Wake up all waiting producers and consumers and release pending frames"""
+        with self._cond:
+            self._closed = True
+            pending = list(self._items)
+            self._items.clear()
+            self._cond.notify_all()
+        for frame in pending:
+            frame.release()
+
+    def open(self):
+        """Re-open a closed queue"""
+        with self._cond:
+            self._closed = False
+
+    def is_closed(self):
+        return self._closed
+
+    def get_dropped(self):
+        """Get the number of frames dropped by the queue (thread-safe)"""
+        with self._cond:
+            return self._dropped
+
+    def reset_dropped(self):
+        with self._cond:
+            self._dropped = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
@@ -0,0 +1,145 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+from base.latency_histogram import LatencyHistogram
+from base.plot_series import SampleHistory
+
+
+'''
+End-to-end per-frame latency tracing.
+
+Every frame carries a FrameTrace in its buffer metadata: a frame ID plus the
+perf_counter timestamp of each hop it passes, from generation to the texture
+upload. The stages also add the time they spent working on the frame, so the
+end-to-end latency splits into compute and waiting (queues, buffer
+backpressure, thread hand-offs).
+
+A FrameTracer aggregates completed traces into histograms: end-to-end, queue
+wait, compute, and one per hop covering the time since the previous hop. That
+shows where the latency builds up. It also counts dropped frames per stage and
+keeps the IDs of the most recent ones.
+'''
+
+GENERATED = "generated"
+ENQUEUED = "enqueued"
+DEQUEUED = "dequeued"
+DEMOSAICED = "demosaiced"
+NORMALIZED = "normalized"
+DELIVERED = "delivered"
+UPLOADED = "uploaded"
+
+HOPS = (GENERATED, ENQUEUED, DEQUEUED, DEMOSAICED, NORMALIZED, DELIVERED, UPLOADED)
+
+_frame_ids = itertools.count()
+
+
+class FrameTrace:
+    def __init__(self, frame_id=None):
+        self.frame_id = next(_frame_ids) if frame_id is None else frame_id
+        self.timestamps = {}
+        self.compute_time = 0.0
+        # Set by consumers that finish the frame later (e.g. at texture upload) and complete the trace themselves
+        self.deferred = False
+
+    def stamp(self, hop, timestamp=None):
+        """Record the time the frame passed a hop (now if no timestamp is given)"""
+        self.timestamps[hop] = time.perf_counter() if timestamp is None else timestamp
+
+    def defer(self):
+        """Keep the trace open past delivery; the consumer completes it"""
+        self.deferred = True
+
+    def add_compute(self, seconds):
+        """Add time a stage spent working on this frame"""
+        self.compute_time += seconds
+
+    def segments(self):
+        """(hop, seconds since the previous recorded hop) for every recorded hop after the first"""
+        stamped = [(hop, self.timestamps[hop]) for hop in HOPS if hop in self.timestamps]
+        return [(hop, timestamp - previous) for (_, previous), (hop, timestamp) in zip(stamped, stamped[1:])]
+
+    def latency(self):
+        """Seconds from the first to the last recorded hop"""
+        if not self.timestamps:
+            return 0.0
+        return max(self.timestamps.values()) - min(self.timestamps.values())
+
+
+def get_trace(frame):
+    """Trace carried by a FrameBuffer, or None"""
+    return frame.metadata.get("trace")
+
+
+class FrameTracer:
+    def __init__(self, history=500):
+        self.lock = threading.Lock()
+
+        self.latency_histogram = LatencyHistogram()
+        self.queue_wait_histogram = LatencyHistogram()
+        self.compute_histogram = LatencyHistogram()
+        # Time from the previous hop to this one
+        self.hop_histograms = {hop: LatencyHistogram() for hop in HOPS[1:]}
+
+        # Recent (end_time, latency, queue_wait, compute) tuples for plotting
+        self.recent = SampleHistory(fields=4, maxlen=history)
+
+        self.dropped = {}
+        self.recent_drops = deque(maxlen=history)  # (frame_id, stage)
+
+    def complete(self, trace):
+        """Aggregate a trace that has reached its last hop"""
+        latency = trace.latency()
+        compute = min(trace.compute_time, latency)
+        queue_wait = latency - compute
+
+        self.latency_histogram.record(latency)
+        self.queue_wait_histogram.record(queue_wait)
+        self.compute_histogram.record(compute)
+        for hop, seconds in trace.segments():
+            self.hop_histograms[hop].record(seconds)
+
+        self.recent.append(max(trace.timestamps.values()), latency, queue_wait, compute)
+
+    def drop(self, trace, stage):
+        """Count a frame dropped at a stage"""
+        with self.lock:
+            self.dropped[stage] = self.dropped.get(stage, 0) + 1
+            self.recent_drops.append((trace.frame_id if trace is not None else None, stage))
+
+    def get_recent(self):
+        """Copies of the recent end times, latencies, queue waits and compute times for plotting (thread-safe)"""
+        return self.recent.get()
+
+    def get_recent_since(self, cursor):
+        """(cursor, end_times, latencies, queue_waits, computes) of the traces completed after cursor (thread-safe)"""
+        return self.recent.get_since(cursor)
+
+    def get_dropped(self):
+        """Dropped frame counts per stage (thread-safe)"""
+        with self.lock:
+            return dict(self.dropped)
+
+    def get_recent_drops(self):
+        """(frame_id, stage) of the most recently dropped frames (thread-safe)"""
+        with self.lock:
+            return list(self.recent_drops)
+
+    def summary(self):
+        """Aggregated latency split (ms) and drop counts for reports"""
+        return {
+            "end_to_end": self.latency_histogram.summary(),
+            "queue_wait": self.queue_wait_histogram.summary(),
+            "compute": self.compute_histogram.summary(),
+            "hops": {hop: histogram.summary() for hop, histogram in self.hop_histograms.items()},
+            "dropped": self.get_dropped(),
+        }
+
+    def reset(self):
+        for histogram in (self.latency_histogram, self.queue_wait_histogram, self.compute_histogram, *self.hop_histograms.values()):
+            histogram.reset()
+        self.recent.clear()
+        with self.lock:
+            self.dropped.clear()
+            self.recent_drops.clear()
@@ -1,23 +1,26 @@
-import numpy as np
-import cv2
 import time
 import threading
-from collections import deque
 
-# Handle profiling decorator if available
-try:
-    from line_profiler import profile
-except ImportError:
-    def profile(func):
-        return func
+from base.frame_pool import FrameBuffer
+from base.synthetic_scene import build_frame_bank
+from base.frame_pacer import FramePacer, PACE_HYBRID, SCHEDULE_EXACT, ARRIVAL_PERIODIC
+from base.demosaic import BAYER_PATTERNS
+from base.metrics import get_registry
+from base.frame_trace import FrameTrace, GENERATED
+from base.plot_series import SampleHistory
 
 
 ''' 
 This module will serve as a 'virtual camera' that creates frames at a set framerate and resolution.
+
+Frames come from a bank of moving synthetic scenes rendered up front (base/synthetic_scene.py)
+and are handed out as read-only views, so generating a frame costs no copy at any framerate.
+Each frame is tagged with its Bayer layout in the metadata ("pattern").
 ''' 
 
 class ImageGenerator:
-    def __init__(self, framerate=60, resolution=(1000, 1000)):
+    def __init__(self, framerate=60, resolution=(1000, 1000), bank_size=16, bit_depth=12, patterns=BAYER_PATTERNS,
+                 pacing=PACE_HYBRID, schedule=SCHEDULE_EXACT, arrival=ARRIVAL_PERIODIC, metrics=None, metrics_prefix="source"):
         
         self.framerate = framerate
 
@@ -27,37 +30,31 @@ class ImageGenerator:
         self.running = False
         self.thread = None
 
-        self.frame = None
-
         self.frame_count = 0
 
         self.last_execution_time = 0
         self.avg_execution_time = 0
         
-        # Thread-safe storage for execution times (keep last 100 measurements)
-        self.execution_times = deque(maxlen=500)  # Store (start_time, end_time) tuples
+        # Recent (start_time, end_time) tuples for plotting; statistics come from the metrics registry
+        self.execution_times = SampleHistory()
         self.execution_times_lock = threading.Lock()
-        
-        # FPS tracking
-        self.frame_timestamps = deque(maxlen=500)  # Keep timestamps for FPS calculation
-        self.fps_timestamps_lock = threading.Lock()
-        
 
         self.frame_done_callback = None
 
-        self.generator = np.random.randint(0, 4096, (self.height, self.width, 3), dtype=np.uint16)
-        self.bayer_pattern_1 = np.empty((self.height, self.width), dtype=np.uint16)
-        self.bayer_pattern_1[0::2, 0::2] = self.generator[0::2, 0::2, 0]  # R
-        self.bayer_pattern_1[0::2, 1::2] = self.generator[0::2, 1::2, 1]  # G
-        self.bayer_pattern_1[1::2, 0::2] = self.generator[1::2, 0::2, 1]  # G
-        self.bayer_pattern_1[1::2, 1::2] = self.generator[1::2, 1::2, 2]  # B
+        # Hybrid sleep/spin pacing; late frames are counted as missed deadlines (and skipped with SCHEDULE_SKIP)
+        self.pacer = FramePacer(framerate, mode=pacing, policy=schedule, arrival=arrival)
+
+        # Frame rate, generation time histogram (every sample of the run, constant memory) and pacing counters
+        self.metrics = metrics if metrics is not None else get_registry()
+        self.metrics_prefix = metrics_prefix
+        self.frames_metric = self.metrics.rate(f"{metrics_prefix}.frames")
+        self.latency_histogram = self.metrics.histogram(f"{metrics_prefix}.frame_time")
+        self.metrics.gauge(f"{metrics_prefix}.target_fps", lambda: self.framerate)
+        self.metrics.gauge(f"{metrics_prefix}.missed_deadlines", self.get_missed_deadlines)
+        self.metrics.gauge(f"{metrics_prefix}.skipped_frames", self.get_frames_skipped)
 
-        self.generator = np.random.randint(0, 4096, (self.height, self.width, 3), dtype=np.uint16)
-        self.bayer_pattern_2 = np.empty((self.height, self.width), dtype=np.uint16)
-        self.bayer_pattern_2[0::2, 0::2] = self.generator[0::2, 0::2, 1]  # G
-        self.bayer_pattern_2[0::2, 1::2] = self.generator[0::2, 1::2, 2]  # B
-        self.bayer_pattern_2[1::2, 0::2] = self.generator[1::2, 0::2, 2]  # B
-        self.bayer_pattern_2[1::2, 1::2] = self.generator[1::2, 1::2, 0]  # R
+        self.bit_depth = bit_depth
+        self.frame_bank, self.frame_patterns = build_frame_bank(bank_size, resolution, bit_depth, patterns)
 
     def start(self):
         self.running = True
@@ -70,97 +67,88 @@ class ImageGenerator:
         if self.thread:
             self.thread.join()
         self.thread = None
-        self.frame = None
         print(f"Image generator stopped. Total frames generated: {self.frame_count}")
 
-    @profile
     def generate_frames(self):
-        frame_interval = 1.0 / self.framerate  # Time between frames in seconds
-        next_frame_time = time.perf_counter()
+        self.pacer.start()
 
         while self.running:
+            self.pacer.wait()
+
             frame_start_time = time.perf_counter()
-            source_frame = self.generator
+            bank_index = self.frame_count % len(self.frame_bank)
+            frame = FrameBuffer(self.frame_bank[bank_index])
+            frame.metadata["pattern"] = self.frame_patterns[bank_index]
 
             # Store execution time thread-safely as a tuple
             with self.execution_times_lock:
                 frame_end_time = time.perf_counter()
-                self.execution_times.append((frame_start_time, frame_end_time))
+                self.execution_times.append(frame_start_time, frame_end_time)
                 self.last_execution_time = frame_end_time - frame_start_time
+            self.latency_histogram.record(frame_end_time - frame_start_time)
 
             self.frame_count += 1
-
-            # Store timestamp for FPS calculation
-            current_time = time.time()
-            with self.fps_timestamps_lock:
-                self.frame_timestamps.append(current_time)
+            self.frames_metric.record()
 
             if self.frame_done_callback:
-                # randomly choose between bayer_pattern_1 and bayer_pattern_2
-                if np.random.rand() < 0.5:
-                    bayer_pattern = self.bayer_pattern_1
-                else:
-                    bayer_pattern = self.bayer_pattern_2
-                self.frame_done_callback(bayer_pattern)
-
-            # Calculate the next scheduled frame start time
-            next_frame_time += frame_interval
-            now = time.perf_counter()
-            sleep_time = next_frame_time - now
-
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-            else:
-                # If we are running behind, skip missed intervals
-                next_frame_time = now
-            
-
-    def get_frame(self):
-        return self.frame
+                # The trace follows the frame through every hop up to the display
+                trace = FrameTrace()
+                trace.stamp(GENERATED, frame_start_time)
+                trace.add_compute(frame_end_time - frame_start_time)
+                frame.metadata["trace"] = trace
+
+                self.frame_done_callback(frame)
 
     def is_running(self):
         return self.running
 
-    def calculate_avg_execution_time(self):
-        pass
-
     def register_callback(self, callback):
         self.frame_done_callback = callback
     
     def get_execution_times(self):
         """Get a copy of execution times for plotting (thread-safe)"""
-        with self.execution_times_lock:
-            if not self.execution_times:
-                return [], []
-            start_times, end_times = zip(*self.execution_times)
-            return list(start_times), list(end_times)
+        return self.execution_times.get()
+
+    def get_execution_times_since(self, cursor):
+        """(cursor, start_times, end_times) recorded after cursor, for incremental plotting (thread-safe)"""
+        return self.execution_times.get_since(cursor)
     
+    def get_latency_histogram(self):
+        """Get a snapshot of the execution time histogram (thread-safe)"""
+        return self.latency_histogram.snapshot()
+
     def get_last_execution_time(self):
         """Get the last execution time (thread-safe)"""
         with self.execution_times_lock:
             return self.last_execution_time
     
     def get_fps(self):
-        """Calculate FPS based on frames generated in the last 1 second (thread-safe)"""
-        current_time = time.time()
-        with self.fps_timestamps_lock:
-            # Count frames in the last 1 second
-            one_second_ago = current_time - 1.0
-            recent_frames = [ts for ts in self.frame_timestamps if ts >= one_second_ago]
-            return len(recent_frames)
+        """Frames generated per second over the last second (thread-safe)"""
+        return self.frames_metric.get_rate()
     
+    def get_frames_skipped(self):
+        """Get the number of frame slots skipped by the pacer (SCHEDULE_SKIP)"""
+        return self.pacer.get_skipped_frames()
+
+    def get_missed_deadlines(self):
+        """Get the number of frames sent a full interval or more after their deadline, plus skipped slots"""
+        return self.pacer.get_missed_deadlines()
+
+    def get_pacing_summary(self):
+        """Achieved rate, missed deadlines and lateness/jitter percentiles of the pacer"""
+        return self.pacer.summary()
+
     def get_target_fps(self):
         """Get the target framerate"""
         return self.framerate
     
     def reset_statistics(self):
         """Reset all performance statistics (thread-safe)"""
-        with self.execution_times_lock:
-            self.execution_times.clear()
-        
-        with self.fps_timestamps_lock:
-            self.frame_timestamps.clear()
+        self.execution_times.clear()
+        self.latency_histogram.reset()
+        self.frames_metric.reset()
         
+        self.pacer.reset_statistics()
         self.last_execution_time = 0
         print("Image generator statistics reset")
 
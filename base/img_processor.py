@@ -1,133 +1,642 @@
-import cv2
 import numpy as np
 import time
 import threading
-from collections import deque
 
-# Handle profiling decorator if available
-try:
-    from line_profiler import profile
-except ImportError:
-    def profile(func):
-        return func
+from base.frame_pool import FramePool, SharedFramePool, wrap_frame
+from base.frame_queue import FrameQueue, LATEST_ONLY, BLOCKING
+from base.tiled_demosaic import TiledDemosaicEngine
+from base.process_pool import ProcessWorkerPool
+from base.metrics import get_registry
+from base.frame_trace import FrameTrace, FrameTracer, get_trace, GENERATED, ENQUEUED, DEQUEUED, DEMOSAICED, NORMALIZED, DELIVERED
+from base.demosaic import get_backend, DEFAULT_BACKEND, DEFAULT_PATTERN
+from base.normalization import FixedScaleNormalizer, normalize_minmax, NORM_MINMAX, NORM_LUT, NORMALIZATION_MODES
+from base.plot_series import SampleHistory
+
+# Processing stages; each gets its own timing series. In pipelined mode each runs on its own thread.
+STAGES = ("demosaic", "normalize", "deliver")
+
+# Outputs produced per frame: the display image (full resolution or 2x2-binned preview) and,
+# in preview mode, the full-resolution image for registered full-frame consumers
+OUTPUT_DISPLAY = "display"
+OUTPUT_FULL = "full"
+
+PREVIEW_BACKEND = "superpixel"
+
 
 class ImageProcessor:
-    def __init__(self):
+    def __init__(self, queue_policy=LATEST_ONLY, queue_size=1, put_timeout=1.0, output_pool_size=2, num_threads=1, band_height=256,
+                 pipelined=False, stage_queue_size=2,
+                 normalization=NORM_MINMAX, bit_depth=12, black_level=0, gamma=1.0, output_dtype=np.float32,
+                 backend=DEFAULT_BACKEND, pattern=DEFAULT_PATTERN, preview=False, num_processes=0,
+                 isp_chain=None, frame_skip=1, metrics=None, metrics_prefix="processor"):
+        if pipelined and num_threads > 1:
+            raise ValueError("Pipelined mode and tiled processing (num_threads > 1) cannot be combined")
+        if num_processes and (pipelined or num_threads > 1):
+            raise ValueError("Worker processes (num_processes > 0) cannot be combined with pipelined or tiled processing")
+        if normalization not in NORMALIZATION_MODES:
+            raise ValueError(f"Unknown normalization mode: {normalization} (expected one of {NORMALIZATION_MODES})")
+        if isp_chain is not None and (num_processes or num_threads > 1):
+            raise ValueError("An ISP chain cannot be combined with worker processes or tiled processing")
+
         self.thread = None
+        self.threads = []
         self.running = False
 
-        self._raw_frame = None
+        # Aggregates the per-frame traces (hop timestamps, queue wait vs compute, drops per stage)
+        self.tracer = FrameTracer()
+
+        # Incoming frames; the processing thread sleeps on this queue while there is no work.
+        # Frames are dropped (and counted) here according to the backpressure policy.
+        self.frame_queue = FrameQueue(policy=queue_policy, maxsize=queue_size, on_drop=lambda frame: self.record_drop(frame, "input_queue"))
+        self.put_timeout = put_timeout
         self._processed_frame = None
 
-        self.frame_done_callback = None
+        # Pipelined mode: demosaic, normalize and deliver run concurrently on consecutive frames,
+        # linked by bounded blocking queues so a slow stage applies backpressure upstream
+        self.pipelined = pipelined
+        self.stage_queue_size = stage_queue_size
+        self._normalize_queue = FrameQueue(policy=BLOCKING, maxsize=stage_queue_size, on_drop=lambda frame: self.record_drop(frame, "normalize_queue"))
+        self._deliver_queue = FrameQueue(policy=BLOCKING, maxsize=stage_queue_size, on_drop=lambda frame: self.record_drop(frame, "deliver_queue"))
+
+        # num_processes > 0 runs demosaic + normalize in worker processes. Bayer input and output
+        # buffers live in shared memory; frames are dispatched round-robin and delivered in order.
+        self.num_processes = num_processes
+        self.worker_pool = None
+        if num_processes:
+            self.worker_pool = ProcessWorkerPool(num_processes, {
+                "normalization": normalization, "bit_depth": bit_depth, "black_level": black_level,
+                "gamma": gamma, "output_dtype": np.dtype(output_dtype).str,
+            })
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+
+        # Preallocated working buffers, (re)allocated only when the frame shape changes.
+        # Enough buffers to cover every frame in flight between the stages.
+        if num_processes:
+            # Two frames per worker (one being processed, one queued), plus results waiting to be re-ordered
+            in_flight = 2 * num_processes + 1
+        else:
+            in_flight = stage_queue_size + 2 if pipelined else 1
+        self.rgb_pool_size = in_flight
+        self.output_pool_size = max(output_pool_size, in_flight)
+        self._pools = {}
+
+        # num_threads > 1 splits each frame into row bands processed on a persistent thread pool
+        self.num_threads = num_threads
+        self.band_height = band_height
+        self.tiled_engine = TiledDemosaicEngine(num_threads, band_height) if num_threads > 1 else None
+
+        # Demosaic algorithm from the backend registry; can be switched at runtime with set_backend
+        self.backend = get_backend(backend)
+        self.pattern = pattern
+        self.bit_depth = bit_depth
+
+        # Preview mode bins each 2x2 Bayer quad into one RGB pixel for display (quarter-size image).
+        # The selected backend still runs at full resolution when a full-frame consumer is registered.
+        self.preview = preview
+        self.preview_backend = get_backend(PREVIEW_BACKEND)
+
+        # NORM_MINMAX stretches each frame to its own min/max; NORM_LUT applies a fixed table
+        # for the sensor bit depth (stable brightness, no per-frame reduction pass)
+        self.normalization = normalization
+        self.output_dtype = np.dtype(output_dtype)
+        self.black_level = black_level
+        self.gamma = gamma
+        self.normalizer = FixedScaleNormalizer(bit_depth, black_level, gamma, self.output_dtype) if normalization == NORM_LUT else None
 
-        self.scale_factor = 1.0 / 4095.0
+        # An ISP chain (base.isp_chain) replaces the normalization: fused black level / white balance /
+        # color matrix / tone / resize passes, timed per pass. Its dtype sets the output dtype.
+        self.isp_chain = isp_chain
+        if isp_chain is not None:
+            self.output_dtype = isp_chain.dtype
+
+        self.frame_done_callback = None
+        self.frame_buffer_callback = None
+        self.full_frame_callback = None
         
-        # Thread-safe storage for execution times (keep last 100 measurements)
-        self.execution_times = deque(maxlen=500)  # Store (start_time, end_time) tuples
+        # Recent (start_time, end_time) tuples for plotting; statistics come from the metrics registry,
+        # whose histograms keep every sample of the run in constant memory
+        self.execution_times = SampleHistory()
         self.execution_times_lock = threading.Lock()
         self.last_execution_time = 0
-        
-        # FPS tracking
-        self.frame_timestamps = deque(maxlen=500)  # Keep timestamps for FPS calculation
-        self.fps_timestamps_lock = threading.Lock()
-        
-        # Frame drop tracking - processor drops frames when new ones arrive before processing is done
-        self.frames_dropped = 0
-        self.frames_dropped_lock = threading.Lock()
+
+        # Per-stage (start_time, end_time) tuples
+        self.stage_times = {stage: SampleHistory() for stage in STAGES}
+
+        self.metrics = metrics if metrics is not None else get_registry()
+        self.metrics_prefix = metrics_prefix
+        self.frames_metric = self.metrics.rate(f"{metrics_prefix}.frames")
+        self.latency_histogram = self.metrics.histogram(f"{metrics_prefix}.latency")
+        self.stage_histograms = {stage: self.metrics.histogram(f"{metrics_prefix}.stage.{stage}") for stage in STAGES}
+        self.metrics.gauge(f"{metrics_prefix}.dropped", self.get_frames_dropped)
+        self.metrics.gauge(f"{metrics_prefix}.last_execution_time", self.get_last_execution_time)
+
+        # frame_skip > 1 processes only every Nth incoming frame (load shedding, see base/quality_controller.py);
+        # the others are counted as skipped, not as dropped
+        self.frame_skip = frame_skip
+        self._frame_arrivals = 0
+        self.skipped_metric = self.metrics.rate(f"{metrics_prefix}.skipped")
+        # Frames lost to worker process errors or exits (num_processes > 0)
+        self.worker_failures_metric = self.metrics.rate(f"{metrics_prefix}.worker_failures")
+
 
     def start(self):
         print("Image processor started")
         self.running = True
-        self.thread = threading.Thread(target=self.process_frames)
-        self.thread.start()
+        for queue in (self.frame_queue, self._normalize_queue, self._deliver_queue):
+            queue.open()
+
+        if self.worker_pool is not None:
+            self.worker_pool.start()
+            targets = [self._dispatch_stage, self._collect_stage]
+        elif self.pipelined:
+            targets = [self._demosaic_stage, self._normalize_stage, self._deliver_stage]
+        else:
+            targets = [self.process_frames]
+        self.threads = [threading.Thread(target=target) for target in targets]
+        for thread in self.threads:
+            thread.start()
+        self.thread = self.threads[0]
     
     def stop(self):
         self.running = False
-        if self.thread:
-            self.thread.join()
+        # Closing the queues wakes up every stage and releases the frames still pending
+        for queue in (self.frame_queue, self._normalize_queue, self._deliver_queue):
+            queue.close()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
         self.thread = None
+        if self.tiled_engine is not None:
+            self.tiled_engine.shutdown()
+
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+            # Frames the workers did not finish; the shared memory is freed and reallocated on the next start
+            with self._in_flight_lock:
+                for raw, outputs, _ in self._in_flight.values():
+                    raw.release()
+                    for _, output in outputs:
+                        output.release()
+                self._in_flight.clear()
+            for key, pool in list(self._pools.items()):
+                if isinstance(pool, SharedFramePool):
+                    pool.close()
+                    del self._pools[key]
         print("Image processor stopped")
     
-    @profile
     def process_frames(self):
         while self.running:
-            if self._raw_frame is not None:
-                start_time = time.perf_counter()
-                
-                rgb = cv2.cvtColor(self._raw_frame, cv2.COLOR_BayerRG2RGB)
-                rgb = cv2.normalize(rgb, None, alpha=0.0, beta=1.0, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_32F)
-                
-                end_time = time.perf_counter()
-                
-                # Store execution time thread-safely as a tuple
-                with self.execution_times_lock:
-                    self.execution_times.append((start_time, end_time))
-                    self.last_execution_time = end_time - start_time                
-                
-                # Store timestamp for FPS calculation
-                current_time = time.time()
-                with self.fps_timestamps_lock:
-                    self.frame_timestamps.append(current_time)
-
-                if self.frame_done_callback:
-                    self.frame_done_callback(rgb.ravel())
-                
-                # Clear the frame after processing to avoid reprocessing the same frame
-                self._raw_frame = None
-            
-    
+            frame = self.frame_queue.get()
+            if frame is None:
+                continue
+
+            start_time = time.perf_counter()
+            trace = self._trace_dequeued(frame, start_time)
+
+            outputs = []
+            for backend, target in self._output_plan():
+                rgb_shape = backend.output_shape(frame.array.shape)
+                # Only the display image is traced up to the texture upload
+                output_trace = trace if target == OUTPUT_DISPLAY else None
+
+                # Consumers may still hold earlier outputs (e.g. a display mailbox)
+                output = self._acquire(self._get_output_pool(rgb_shape))
+                if output is None:
+                    break
+                output.metadata["target"] = target
+                output.metadata["trace"] = output_trace
+
+                if self.tiled_engine is not None and not backend.half_resolution:
+                    # Tiled mode fuses demosaic and normalization; its timing is reported as the demosaic stage
+                    band_start_time = time.perf_counter()
+                    self.tiled_engine.process(frame.array, output.array, backend, self._frame_pattern(frame), self.bit_depth, normalizer=self.normalizer)
+                    band_end_time = time.perf_counter()
+                    self._record_stage_time("demosaic", band_start_time, band_end_time)
+                    backend.record_execution_time(band_start_time, band_end_time)
+                    if output_trace is not None:
+                        output_trace.stamp(DEMOSAICED, band_end_time)
+                        output_trace.stamp(NORMALIZED, band_end_time)
+                        output_trace.add_compute(band_end_time - band_start_time)
+                else:
+                    rgb = self._get_rgb_pool(rgb_shape).acquire()
+                    self._demosaic(backend, frame, rgb, output_trace)
+                    self._normalize(rgb, output, output_trace)
+                    rgb.release()
+                outputs.append(output)
+            frame.release()
+
+            end_time = time.perf_counter()
+            self._record_execution_time(start_time, end_time)
+
+            for output in outputs:
+                self._deliver(output)
+
+    def _demosaic_stage(self):
+        while self.running:
+            frame = self.frame_queue.get()
+            if frame is None:
+                continue
+            trace = self._trace_dequeued(frame, time.perf_counter())
+
+            for backend, target in self._output_plan():
+                rgb = self._acquire(self._get_rgb_pool(backend.output_shape(frame.array.shape)))
+                if rgb is None:
+                    break
+                rgb.metadata["start_time"] = time.perf_counter()
+                rgb.metadata["target"] = target
+                rgb.metadata["trace"] = trace if target == OUTPUT_DISPLAY else None
+                self._demosaic(backend, frame, rgb, get_trace(rgb))
+                self._normalize_queue.put(rgb)
+            frame.release()
+
+    def _normalize_stage(self):
+        while self.running:
+            rgb = self._normalize_queue.get()
+            if rgb is None:
+                continue
+
+            output = self._acquire(self._get_output_pool(rgb.array.shape))
+            if output is not None:
+                output.metadata["target"] = rgb.metadata["target"]
+                output.metadata["trace"] = get_trace(rgb)
+                self._normalize(rgb, output, get_trace(output))
+                if output.metadata["target"] == OUTPUT_DISPLAY:
+                    self._record_execution_time(rgb.metadata["start_time"], time.perf_counter())
+                self._deliver_queue.put(output)
+            rgb.release()
+
+    def _deliver_stage(self):
+        while self.running:
+            output = self._deliver_queue.get()
+            if output is None:
+                continue
+            self._deliver(output)
+
+    def _dispatch_stage(self):
+        """Copy each frame into a shared memory slot and hand it to the next worker process"""
+        seq = 0
+        while self.running:
+            frame = self.frame_queue.get()
+            if frame is None:
+                continue
+            start_time = time.perf_counter()
+            trace = self._trace_dequeued(frame, start_time)
+
+            raw = self._acquire(self._get_pool(frame.array.shape, frame.array.dtype, self.rgb_pool_size))
+            if raw is None:
+                frame.release()
+                break
+            np.copyto(raw.array, frame.array)
+            pattern = self._frame_pattern(frame)
+            frame.release()
+
+            outputs = []
+            for backend, target in self._output_plan():
+                output = self._acquire(self._get_output_pool(backend.output_shape(raw.array.shape)))
+                if output is None:
+                    break
+                output.metadata["target"] = target
+                output.metadata["trace"] = trace if target == OUTPUT_DISPLAY else None
+                outputs.append((backend, output))
+
+            with self._in_flight_lock:
+                self._in_flight[seq] = (raw, outputs, start_time)
+            if not self.running:
+                break
+            tasks = [(backend.name, output.pool.slot(output)) for backend, output in outputs]
+            self.worker_pool.submit(seq, raw.pool.slot(raw), tasks, pattern, self.bit_depth)
+            seq += 1
+
+    def _collect_stage(self):
+        """Receive finished frames from the workers and deliver them in dispatch order"""
+        next_seq = 0
+        finished = {}
+        while self.running:
+            result = self.worker_pool.get_result(timeout=0.1)
+            if result is None:
+                self._check_workers(next_seq, finished)
+            else:
+                seq, timings, error = result
+                finished[seq] = self._complete_job(seq, timings, error)
+
+            # Workers finish out of order; deliver strictly in dispatch order
+            while next_seq in finished:
+                for output in finished.pop(next_seq):
+                    self._deliver(output)
+                next_seq += 1
+
+        for outputs in finished.values():
+            for output in outputs:
+                output.release()
+
+    def _complete_job(self, seq, timings, error):
+        """Record the worker timings of a finished frame and return its outputs (none on error)"""
+        with self._in_flight_lock:
+            raw, outputs, start_time = self._in_flight.pop(seq)
+        raw.release()
+
+        if error is not None:
+            print(f"Processing worker failed on frame {seq}: {error}")
+            self.worker_failures_metric.record()
+            for _, output in outputs:
+                output.release()
+            return []
+
+        # perf_counter is system-wide on Linux, so worker timestamps share the parent's time base
+        for (backend, output), (demosaic_start, normalize_start, end_time) in zip(outputs, timings):
+            self._record_stage_time("demosaic", demosaic_start, normalize_start)
+            self._record_stage_time("normalize", normalize_start, end_time)
+            backend.record_execution_time(demosaic_start, normalize_start)
+
+            trace = get_trace(output)
+            if trace is not None:
+                trace.stamp(DEMOSAICED, normalize_start)
+                trace.stamp(NORMALIZED, end_time)
+                trace.add_compute(end_time - demosaic_start)
+            if output.metadata["target"] == OUTPUT_DISPLAY:
+                self._record_execution_time(start_time, end_time)
+        return [output for _, output in outputs]
+
+    def _check_workers(self, next_seq, finished):
+        """Fail the frames of worker processes that died, so in-order delivery does not stall"""
+        with self._in_flight_lock:
+            lost = [seq for seq in self._in_flight if not self.worker_pool.is_worker_alive(self.worker_pool.worker_for(seq))]
+        for seq in lost:
+            finished[seq] = self._complete_job(seq, None, "worker process exited")
+
+    def _demosaic(self, backend, frame, rgb, trace=None):
+        """Demosaic stage: Bayer frame -> uint16 RGB buffer"""
+        start_time = time.perf_counter()
+        backend.run(frame.array, rgb.array, self._frame_pattern(frame), self.bit_depth)
+        end_time = time.perf_counter()
+        self._record_stage_time("demosaic", start_time, end_time)
+        if trace is not None:
+            trace.stamp(DEMOSAICED, end_time)
+            trace.add_compute(end_time - start_time)
+
+    def _normalize(self, rgb, output, trace=None):
+        """Normalize stage: uint16 RGB buffer -> output buffer (float32 [0, 1] or uint8)"""
+        start_time = time.perf_counter()
+        if self.isp_chain is not None:
+            self.isp_chain.apply(rgb.array, output.array)
+        elif self.normalizer is not None:
+            self.normalizer.apply(rgb.array, output.array)
+        else:
+            normalize_minmax(rgb.array, output.array)
+        end_time = time.perf_counter()
+        self._record_stage_time("normalize", start_time, end_time)
+        if trace is not None:
+            trace.stamp(NORMALIZED, end_time)
+            trace.add_compute(end_time - start_time)
+
+    def _deliver(self, output):
+        """Deliver stage: hand the output to the consumer and recycle the buffer"""
+        start_time = time.perf_counter()
+        trace = get_trace(output)
+        if trace is not None:
+            trace.stamp(DELIVERED, start_time)
+
+        if output.metadata["target"] == OUTPUT_DISPLAY:
+            callback = self.frame_done_callback
+            # Buffer consumers can read the metadata (e.g. stamp the upload hop on the trace)
+            if self.frame_buffer_callback:
+                self.frame_buffer_callback(output)
+
+            self.frames_metric.record()
+        else:
+            callback = self.full_frame_callback
+
+        if callback:
+            callback(output.array.ravel())
+        output.release()
+        end_time = time.perf_counter()
+        self._record_stage_time("deliver", start_time, end_time)
+
+        if trace is not None:
+            trace.add_compute(end_time - start_time)
+            if not trace.deferred:
+                self.tracer.complete(trace)
+
+    def _frame_pattern(self, frame):
+        """Bayer layout of a frame: tagged by the source, else the processor's configured pattern"""
+        return frame.metadata.get("pattern", self.pattern)
+
+    def _trace_dequeued(self, frame, timestamp):
+        """Stamp the dequeue hop on a frame's trace and return the trace"""
+        trace = get_trace(frame)
+        if trace is not None:
+            trace.stamp(DEQUEUED, timestamp)
+        return trace
+
+
+    def _acquire(self, pool):
+        """Borrow a buffer from a pool, waiting for downstream stages to return one while running"""
+        while self.running:
+            buffer = pool.acquire(timeout=0.1)
+            if buffer is not None:
+                return buffer
+        return None
+
+    def _output_plan(self):
+        """(backend, target) pairs to produce for the next frame"""
+        backend = self.backend
+        if not self.preview:
+            return [(backend, OUTPUT_DISPLAY)]
+        plan = [(self.preview_backend, OUTPUT_DISPLAY)]
+        if self.full_frame_callback:
+            plan.append((backend, OUTPUT_FULL))
+        return plan
+
+    def _get_pool(self, shape, dtype, count):
+        """Get the pool for a buffer shape and dtype, allocating it on first use"""
+        key = (tuple(shape), np.dtype(dtype))
+        pool = self._pools.get(key)
+        if pool is None:
+            # Worker processes attach to shared memory slots instead of receiving copies
+            pool_class = SharedFramePool if self.worker_pool is not None else FramePool
+            pool = self._pools[key] = pool_class(shape, dtype, count=count)
+        return pool
+
+    def _get_rgb_pool(self, rgb_shape):
+        """Get the uint16 RGB pool for a demosaic output shape"""
+        return self._get_pool(rgb_shape, np.uint16, self.rgb_pool_size)
+
+    def _get_output_pool(self, rgb_shape):
+        """Get the output pool for an RGB frame shape"""
+        if self.isp_chain is not None:
+            rgb_shape = self.isp_chain.output_shape(rgb_shape)
+        return self._get_pool(rgb_shape, self.output_dtype, self.output_pool_size)
+
+    def _record_execution_time(self, start_time, end_time):
+        with self.execution_times_lock:
+            self.execution_times.append(start_time, end_time)
+            self.last_execution_time = end_time - start_time
+        self.latency_histogram.record(end_time - start_time)
+
+    def _record_stage_time(self, stage, start_time, end_time):
+        self.stage_times[stage].append(start_time, end_time)
+        self.stage_histograms[stage].record(end_time - start_time)
+
+    def set_backend(self, name):
+        """Switch the demosaic backend; takes effect with the next frame"""
+        self.backend = get_backend(name)
+        print(f"Image processor demosaic backend: {name}")
+
+    def get_backend_name(self):
+        return self.backend.name
+
+    def set_normalization(self, mode):
+        """Switch between NORM_MINMAX and NORM_LUT (with the configured black level and gamma); takes effect with the next frame"""
+        if mode not in NORMALIZATION_MODES:
+            raise ValueError(f"Unknown normalization mode: {mode} (expected one of {NORMALIZATION_MODES})")
+        if self.worker_pool is not None:
+            raise ValueError("The normalization of worker processes is fixed at construction")
+        if self.isp_chain is not None:
+            raise ValueError("The ISP chain replaces the normalization")
+        self.normalizer = FixedScaleNormalizer(self.bit_depth, self.black_level, self.gamma, self.output_dtype) if mode == NORM_LUT else None
+        self.normalization = mode
+        print(f"Image processor normalization: {mode}")
+
+    def get_normalization(self):
+        return self.normalization
+
+    def set_frame_skip(self, frame_skip):
+        """Process only every frame_skip-th incoming frame (1 = every frame)"""
+        self.frame_skip = max(1, int(frame_skip))
+        print(f"Image processor frame skip: {self.frame_skip}")
+
+    def get_frame_skip(self):
+        return self.frame_skip
+
+    def set_preview(self, enabled):
+        """Switch between the 2x2-binned preview and the full-resolution display image"""
+        self.preview = enabled
+        print(f"Image processor preview mode: {'on' if enabled else 'off'}")
+
+    def is_preview(self):
+        return self.preview
+
+    def get_display_shape(self, raw_shape):
+        """Shape of the display image produced for a Bayer frame shape"""
+        backend = self.preview_backend if self.preview else self.backend
+        rgb_shape = backend.output_shape(raw_shape)
+        return self.isp_chain.output_shape(rgb_shape) if self.isp_chain is not None else rgb_shape
+
     def register_callback(self, callback):
+        """Receive each display image as a flat view of its pooled output buffer. The buffer is reused
+        after the call returns; consumers that keep the image use register_frame_callback and retain it."""
         self.frame_done_callback = callback
+
+    def register_frame_callback(self, callback):
+        """Receive each display FrameBuffer (array plus metadata such as the frame trace);
+        it is only valid during the call unless the consumer retains it"""
+        self.frame_buffer_callback = callback
+
+    def register_full_frame_callback(self, callback):
+        """Receive full-resolution frames (recording, analysis) while the display uses the preview"""
+        self.full_frame_callback = callback
     
     def is_running(self):
         return self.running
 
-    def set_raw_frame(self, raw_frame):        
-        # If there's already a frame waiting to be processed, we're dropping frames
-        if self._raw_frame is not None:
-            with self.frames_dropped_lock:
-                self.frames_dropped += 1
-        
-        self._raw_frame = raw_frame
+    def set_raw_frame(self, raw_frame):
+        """Accept a Bayer frame (pooled FrameBuffer or plain array); the processor holds a reference until it is processed"""
+        self._frame_arrivals += 1
+        if self.frame_skip > 1 and self._frame_arrivals % self.frame_skip:
+            self.skipped_metric.record()
+            return
+        frame = wrap_frame(raw_frame)
+        trace = get_trace(frame)
+        if trace is None:
+            # Sources that do not trace their frames start the trace on arrival
+            trace = frame.metadata["trace"] = FrameTrace()
+            trace.stamp(GENERATED)
+        trace.stamp(ENQUEUED)
+
+        # With the blocking policy this waits for room in the queue (up to put_timeout)
+        self.frame_queue.put(frame.retain(), timeout=self.put_timeout)
     
     def get_execution_times(self):
         """Get a copy of execution times for plotting (thread-safe)"""
-        with self.execution_times_lock:
-            if not self.execution_times:
-                return [], []
-            start_times, end_times = zip(*self.execution_times)
-            return list(start_times), list(end_times)
+        return self.execution_times.get()
+
+    def get_execution_times_since(self, cursor):
+        """(cursor, start_times, end_times) recorded after cursor, for incremental plotting (thread-safe)"""
+        return self.execution_times.get_since(cursor)
     
+    def get_stage_execution_times(self, stage):
+        """Get a copy of one stage's execution times for plotting (thread-safe)"""
+        return self.stage_times[stage].get()
+
+    def get_stage_execution_times_since(self, stage, cursor):
+        """(cursor, start_times, end_times) of one stage recorded after cursor (thread-safe)"""
+        return self.stage_times[stage].get_since(cursor)
+    
+    def get_latency_histogram(self):
+        """Get a snapshot of the processing latency histogram (thread-safe)"""
+        return self.latency_histogram.snapshot()
+
+    def get_stage_latency_histogram(self, stage):
+        """Get a snapshot of one stage's latency histogram (thread-safe)"""
+        return self.stage_histograms[stage].snapshot()
+
+    def complete_trace(self, frame):
+        """Complete the deferred trace of a delivered frame (see FrameTrace.defer)"""
+        trace = get_trace(frame)
+        if trace is not None:
+            self.tracer.complete(trace)
+
+    def record_drop(self, frame, stage):
+        """Count a frame dropped at a stage, including consumer-side stages such as the display"""
+        self.tracer.drop(get_trace(frame), stage)
+
+    def get_trace_summary(self):
+        """End-to-end latency split into queue wait and compute, per-hop latencies and drops per stage"""
+        return self.tracer.summary()
+
+    def get_trace_times(self):
+        """Recent (end_times, latencies, queue_waits, computes) of traced frames for plotting (thread-safe)"""
+        return self.tracer.get_recent()
+
+    def get_trace_times_since(self, cursor):
+        """(cursor, end_times, latencies, queue_waits, computes) of the frames traced after cursor (thread-safe)"""
+        return self.tracer.get_recent_since(cursor)
+
+    def get_trace_drops(self):
+        """Dropped frame counts per stage (thread-safe)"""
+        return self.tracer.get_dropped()
+
     def get_last_execution_time(self):
         """Get the last execution time (thread-safe)"""
         with self.execution_times_lock:
             return self.last_execution_time
     
     def get_fps(self):
-        """Calculate FPS based on frames processed in the last 1 second (thread-safe)"""
-        current_time = time.time()
-        with self.fps_timestamps_lock:
-            # Count frames in the last 1 second
-            one_second_ago = current_time - 1.0
-            recent_frames = [ts for ts in self.frame_timestamps if ts >= one_second_ago]
-            return len(recent_frames)
+        """Frames delivered for display per second over the last second (thread-safe)"""
+        return self.frames_metric.get_rate()
     
     def get_frames_dropped(self):
         """Get the number of frames dropped by the processor (thread-safe)"""
-        with self.frames_dropped_lock:
-            return self.frames_dropped
+        return self.frame_queue.get_dropped()
     
     def reset_statistics(self):
         """Reset all performance statistics (thread-safe)"""
-        with self.execution_times_lock:
-            self.execution_times.clear()
-        
-        with self.fps_timestamps_lock:
-            self.frame_timestamps.clear()
+        self.execution_times.clear()
+        self.latency_histogram.reset()
+
+        for times in self.stage_times.values():
+            times.clear()
+        for histogram in self.stage_histograms.values():
+            histogram.reset()
+        if self.isp_chain is not None:
+            self.isp_chain.reset_statistics()
+        self.tracer.reset()
+        self.frames_metric.reset()
+        self.skipped_metric.reset()
+        self.worker_failures_metric.reset()
         
-        with self.frames_dropped_lock:
-            self.frames_dropped = 0
+        self.frame_queue.reset_dropped()
         
         self.last_execution_time = 0
         print("Image processor statistics reset")
@@ -0,0 +1,314 @@
+import time
+
+import cv2
+import numpy as np
+
+from base.latency_histogram import LatencyHistogram
+from base.plot_series import SampleHistory
+from base.normalization import output_range
+
+
+'''
+Declarative ISP operation chain applied after demosaicing.
+
+A chain is a list of operations in processing order, e.g.
+
+    IspChain([BlackLevel(64), WhiteBalance(1.9, 1.0, 1.6), ColorMatrix(ccm), Gamma(2.2), Resize((1024, 768))])
+
+It replaces the normalization step: it maps demosaiced uint16 sensor values to
+the output dtype (float32 [0, 1] or uint8). Run naively, every operation is a
+full-frame pass. The chain instead merges them into as few passes as possible:
+
+  - Linear operations (BlackLevel, WhiteBalance, ColorMatrix) compose into one
+    3x4 affine matrix, applied with a single cv2.transform. If that matrix only
+    scales all channels equally (e.g. black level alone), it is folded into the
+    final pass instead.
+  - Tone operations (Gamma, ToneCurve) and the conversion to the output range
+    fold into one lookup table, applied with a single gather. Without tone
+    operations the conversion is one fused scale + shift.
+  - Resize is a separate pass. Placed before the tone operations, it runs on
+    the 16-bit linear data so the lookup only touches the smaller image.
+
+Linear operations must come before tone operations. Values are clipped after
+the affine matrix (saturating uint16) and to the output range in the final
+pass, and the 16-bit intermediate preserves the 12-bit sensor precision.
+
+Intermediate buffers are preallocated per frame shape. Every pass records its
+execution times like a demosaic backend, so each one can be plotted; a fused
+pass is named after the operations it contains. A chain keeps scratch buffers,
+so one chain serves one processing thread at a time.
+'''
+
+LINEAR = "linear"
+TONE = "tone"
+SPATIAL = "spatial"
+
+INTERMEDIATE_MAX = 65535
+
+# Typical sensor-to-sRGB color correction matrix (rows sum to 1, so white stays white)
+DEFAULT_CCM = ((1.65, -0.45, -0.20),
+               (-0.25, 1.50, -0.25),
+               (-0.05, -0.55, 1.60))
+
+
+class BlackLevel:
+    kind = LINEAR
+    name = "black_level"
+
+    def __init__(self, level):
+        self.level = level
+
+    def affine(self, white_level):
+        """(3x3 matrix, offset) in sensor units: subtract the black level and stretch back to the white level"""
+        scale = white_level / (white_level - self.level)
+        return np.eye(3) * scale, np.full(3, -self.level * scale)
+
+
+class WhiteBalance:
+    kind = LINEAR
+    name = "white_balance"
+
+    def __init__(self, red=1.0, green=1.0, blue=1.0):
+        self.gains = (red, green, blue)
+
+    def affine(self, white_level):
+        return np.diag(self.gains).astype(np.float64), np.zeros(3)
+
+
+class ColorMatrix:
+    kind = LINEAR
+    name = "ccm"
+
+    def __init__(self, matrix):
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(3, 3)
+
+    def affine(self, white_level):
+        return self.matrix, np.zeros(3)
+
+
+class Gamma:
+    kind = TONE
+    name = "gamma"
+
+    def __init__(self, gamma=2.2):
+        self.gamma = gamma
+
+    def curve(self, x):
+        return x ** (1.0 / self.gamma)
+
+
+class ToneCurve:
+    kind = TONE
+    name = "tone_curve"
+
+    def __init__(self, function, name=None):
+        """function maps a float64 array of values in [0, 1] to [0, 1]"""
+        self.function = function
+        if name:
+            self.name = name
+
+    def curve(self, x):
+        return self.function(x)
+
+
+class Resize:
+    kind = SPATIAL
+    name = "resize"
+
+    def __init__(self, size=None, scale=None, interpolation=cv2.INTER_AREA):
+        if (size is None) == (scale is None):
+            raise ValueError("Resize needs either a size (width, height) or a scale")
+        self.size = tuple(size) if size is not None else None
+        self.scale = scale
+        self.interpolation = interpolation
+
+    def output_size(self, width, height):
+        if self.size is not None:
+            return self.size
+        return max(1, int(round(width * self.scale))), max(1, int(round(height * self.scale)))
+
+
+class IspPass:
+    """One full-frame pass of a chain, with the timing interface of a demosaic backend"""
+
+    def __init__(self, name):
+        self.name = name
+        self.execution_times = SampleHistory()  # Recent (start_time, end_time) tuples for plotting
+        self.latency_histogram = LatencyHistogram()
+
+    def record_execution_time(self, start_time, end_time):
+        self.execution_times.append(start_time, end_time)
+        self.latency_histogram.record(end_time - start_time)
+
+    def get_execution_times(self):
+        """Get a copy of execution times for plotting (thread-safe)"""
+        return self.execution_times.get()
+
+    def get_execution_times_since(self, cursor):
+        """(cursor, start_times, end_times) recorded after cursor (thread-safe)"""
+        return self.execution_times.get_since(cursor)
+
+    def get_latency_histogram(self):
+        return self.latency_histogram.copy()
+
+    def reset_statistics(self):
+        self.execution_times.clear()
+        self.latency_histogram.reset()
+
+
+class IspChain:
+    def __init__(self, ops, bit_depth=12, dtype=np.float32):
+        self.ops = list(ops)
+        self.bit_depth = bit_depth
+        self.white_level = (1 << bit_depth) - 1
+        self.dtype = np.dtype(dtype)
+
+        kinds = [op.kind for op in self.ops]
+        if LINEAR in kinds and TONE in kinds and max(i for i, kind in enumerate(kinds) if kind == LINEAR) > kinds.index(TONE):
+            raise ValueError("Linear operations (black level, white balance, color matrix) must come before tone operations")
+        resizes = [op for op in self.ops if op.kind == SPATIAL]
+        if len(resizes) > 1:
+            raise ValueError("An ISP chain supports one resize")
+        self.resize = resizes[0] if resizes else None
+        self.resize_before_tone = self.resize is not None and TONE in kinds and kinds.index(SPATIAL) < kinds.index(TONE)
+
+        # Compose the linear operations: v' = matrix @ v + offset, in sensor units
+        matrix, offset = np.eye(3), np.zeros(3)
+        linear_names = []
+        for op in self.ops:
+            if op.kind == LINEAR:
+                op_matrix, op_offset = op.affine(self.white_level)
+                matrix, offset = op_matrix @ matrix, op_matrix @ offset + op_offset
+                linear_names.append(op.name)
+        tones = [op for op in self.ops if op.kind == TONE]
+
+        # A uniform scale + shift folds into the last pass; anything else needs the matrix pass
+        uniform = np.allclose(matrix, np.eye(3) * matrix[0, 0]) and np.allclose(offset, offset[0])
+        self.transform = None
+        if not uniform:
+            # Sensor units -> full 16-bit range, so the saturating uint16 output keeps the precision
+            self.transform = np.hstack([matrix, offset[:, None]]) * (INTERMEDIATE_MAX / self.white_level)
+            # The final pass then reads 16-bit linear values
+            input_max, scale, shift = INTERMEDIATE_MAX, 1.0, 0.0
+        else:
+            input_max, scale, shift = self.white_level, matrix[0, 0], offset[0]
+
+        # Final per-value mapping: input value -> clip((scale * v + shift) / input_max) -> tone curves -> output range
+        _, top = output_range(self.dtype)
+        self.lut = None
+        if tones:
+            values = np.clip((np.arange(1 << 16, dtype=np.float64) * scale + shift) / input_max, 0.0, 1.0)
+            for op in tones:
+                values = np.clip(op.curve(values), 0.0, 1.0)
+            values *= top
+            if self.dtype == np.uint8:
+                values = np.rint(values)
+            self.lut = values.astype(self.dtype)
+        else:
+            self.alpha = scale * top / input_max
+            self.beta = shift * top / input_max
+
+        # Passes in execution order
+        self.passes = []
+        if self.transform is not None:
+            self.passes.append(IspPass("transform(" + "+".join(linear_names) + ")"))
+        if self.resize is not None and self.resize_before_tone:
+            self.passes.append(IspPass("resize"))
+        final_ops = ([] if self.transform is not None else linear_names) + [op.name for op in tones]
+        self.passes.append(IspPass(("lut(" if tones else "scale(") + "+".join(final_ops or ["normalize"]) + ")"))
+        if self.resize is not None and not self.resize_before_tone:
+            self.passes.append(IspPass("resize"))
+
+        self._buffers = {}
+
+    def __repr__(self):
+        return f"IspChain({', '.join(op.name for op in self.ops)} -> {len(self.passes)} passes: {', '.join(p.name for p in self.passes)})"
+
+    def output_shape(self, rgb_shape):
+        """Shape of the chain's output for a demosaiced RGB shape"""
+        if self.resize is None:
+            return tuple(rgb_shape)
+        width, height = self.resize.output_size(rgb_shape[1], rgb_shape[0])
+        return (height, width, rgb_shape[2])
+
+    def _buffer(self, key, shape, dtype):
+        """Preallocated intermediate buffer, allocated on first use for each frame shape"""
+        key = (key, tuple(shape), np.dtype(dtype))
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def _final(self, src, dst):
+        if self.lut is not None:
+            np.take(self.lut, src, out=dst)
+        elif self.dtype == np.uint8:
+            # Saturating conversion clips values below the black level to 0
+            cv2.addWeighted(src, self.alpha, src, 0.0, self.beta, dst=dst, dtype=cv2.CV_8U)
+        else:
+            cv2.addWeighted(src, self.alpha, src, 0.0, self.beta, dst=dst, dtype=cv2.CV_32F)
+            # Values below the black level must not go negative, and gains must saturate at 1.0 like the LUT
+            np.clip(dst, 0.0, 1.0, out=dst)
+
+    def _resize(self, src, dst):
+        cv2.resize(src, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=self.resize.interpolation)
+
+    def apply(self, rgb, out):
+        """Run the chain on demosaiced uint16 rgb into out (output_shape, chain dtype)"""
+        passes = iter(self.passes)
+        src = rgb
+        if self.transform is not None:
+            start_time = time.perf_counter()
+            linear = self._buffer("linear", src.shape, np.uint16)
+            cv2.transform(src, self.transform, dst=linear)
+            next(passes).record_execution_time(start_time, time.perf_counter())
+            src = linear
+
+        if self.resize is not None and self.resize_before_tone:
+            start_time = time.perf_counter()
+            small = self._buffer("resized", out.shape, src.dtype)
+            self._resize(src, small)
+            next(passes).record_execution_time(start_time, time.perf_counter())
+            src = small
+
+        resize_after = self.resize is not None and not self.resize_before_tone
+        start_time = time.perf_counter()
+        final = self._buffer("final", src.shape, self.dtype) if resize_after else out
+        self._final(src, final)
+        next(passes).record_execution_time(start_time, time.perf_counter())
+
+        if resize_after:
+            start_time = time.perf_counter()
+            self._resize(final, out)
+            next(passes).record_execution_time(start_time, time.perf_counter())
+        return out
+
+    def reset_statistics(self):
+        for isp_pass in self.passes:
+            isp_pass.reset_statistics()
+
+
+def parse_chain(text, bit_depth=12, dtype=np.float32):
+    """Build a chain from a comma-separated spec, e.g. "black_level:64,white_balance:1.9:1.0:1.6,ccm,gamma:2.2,resize:0.5"
+    (ccm without values uses DEFAULT_CCM, resize takes a scale or WIDTHxHEIGHT)"""
+    ops = []
+    for item in text.split(","):
+        name, *args = item.strip().split(":")
+        if name in ("black_level", "resize") and not args:
+            raise ValueError(f"ISP operation {name} needs a value, e.g. black_level:64 or resize:0.5 / resize:1024x768")
+        if name == "black_level":
+            ops.append(BlackLevel(float(args[0])))
+        elif name == "white_balance":
+            ops.append(WhiteBalance(*(float(arg) for arg in args)))
+        elif name == "ccm":
+            ops.append(ColorMatrix([float(arg) for arg in args] if args else DEFAULT_CCM))
+        elif name == "gamma":
+            ops.append(Gamma(float(args[0]) if args else 2.2))
+        elif name == "resize":
+            if "x" in args[0]:
+                ops.append(Resize(size=tuple(int(value) for value in args[0].lower().split("x"))))
+            else:
+                ops.append(Resize(scale=float(args[0])))
+        else:
+            raise ValueError(f"Unknown ISP operation: {name}")
+    return IspChain(ops, bit_depth=bit_depth, dtype=dtype)
@@ -0,0 +1,150 @@
+import threading
+
+
+'''
+Constant-memory, log-bucketed latency histogram (HDR-histogram style).
+
+Latencies are recorded in integer nanoseconds. Values below SUB_BUCKET_COUNT ns
+are counted exactly; above that every power-of-two range is split into
+SUB_BUCKET_COUNT / 2 linear sub-buckets, so the relative error of any reported
+value stays below 1 / SUB_BUCKET_COUNT * 2 (~1.6% with 7 bits) over the whole
+range, from nanoseconds to minutes, with a fixed number of counters.
+
+Recording is one integer computation plus a few increments under a short lock,
+so it can stay on the hot path for hour-long runs without losing tail samples.
+'''
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT // 2
+
+# Highest trackable value: 2**40 ns (~18 minutes); larger values are clamped into the top bucket
+MAX_VALUE_BITS = 40
+BUCKET_COUNT = SUB_BUCKET_COUNT + (MAX_VALUE_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKET_HALF
+
+
+def _bucket_index(value_ns):
+    if value_ns < SUB_BUCKET_COUNT:
+        return max(value_ns, 0)
+    shift = value_ns.bit_length() - SUB_BUCKET_BITS
+    index = SUB_BUCKET_COUNT + (shift - 1) * SUB_BUCKET_HALF + (value_ns >> shift) - SUB_BUCKET_HALF
+    return min(index, BUCKET_COUNT - 1)
+
+
+def _bucket_value(index):
+    """Representative (midpoint) value in ns of a bucket"""
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift, offset = divmod(index - SUB_BUCKET_COUNT, SUB_BUCKET_HALF)
+    shift += 1
+    lower = (offset + SUB_BUCKET_HALF) << shift
+    return lower + ((1 << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * BUCKET_COUNT
+        self._total = 0
+        self._sum_ns = 0
+        self._min_ns = None
+        self._max_ns = 0
+
+    def record(self, seconds):
+        """Record one latency given in seconds"""
+        value_ns = int(seconds * 1e9)
+        index = _bucket_index(value_ns)
+        with self._lock:
+            self._counts[index] += 1
+            self._total += 1
+            self._sum_ns += value_ns
+            if self._min_ns is None or value_ns < self._min_ns:
+                self._min_ns = value_ns
+            if value_ns > self._max_ns:
+                self._max_ns = value_ns
+
+    def record_interval(self, start_time, end_time):
+        self.record(end_time - start_time)
+
+    def merge(self, other):
+        """Add all samples of another histogram to this one"""
+        counts, total, sum_ns, min_ns, max_ns = other._state()
+        with self._lock:
+            for index, count in enumerate(counts):
+                if count:
+                    self._counts[index] += count
+            self._total += total
+            self._sum_ns += sum_ns
+            if min_ns is not None and (self._min_ns is None or min_ns < self._min_ns):
+                self._min_ns = min_ns
+            self._max_ns = max(self._max_ns, max_ns)
+        return self
+
+    def copy(self):
+        """Consistent snapshot that can be queried without touching the live histogram"""
+        return LatencyHistogram().merge(self)
+
+    @classmethod
+    def merged(cls, histograms):
+        """New histogram combining several components"""
+        result = cls()
+        for histogram in histograms:
+            result.merge(histogram)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * BUCKET_COUNT
+            self._total = 0
+            self._sum_ns = 0
+            self._min_ns = None
+            self._max_ns = 0
+
+    def _state(self):
+        with self._lock:
+            return list(self._counts), self._total, self._sum_ns, self._min_ns, self._max_ns
+
+    def get_count(self):
+        with self._lock:
+            return self._total
+
+    def percentiles(self, percents):
+        """Latencies in seconds at the given percentiles (0-100); None if empty"""
+        counts, total, _, min_ns, max_ns = self._state()
+        if not total:
+            return [None for _ in percents]
+
+        results = {}
+        targets = sorted((max(1, int(round(p / 100.0 * total))), p) for p in percents)
+        cumulative = 0
+        target_index = 0
+        for index, count in enumerate(counts):
+            if not count:
+                continue
+            cumulative += count
+            while target_index < len(targets) and cumulative >= targets[target_index][0]:
+                # Clamp the bucket midpoint to the exact observed extremes
+                value = min(max(_bucket_value(index), min_ns), max_ns)
+                results[targets[target_index][1]] = value / 1e9
+                target_index += 1
+            if target_index == len(targets):
+                break
+        return [results[p] for p in percents]
+
+    def percentile(self, percent):
+        return self.percentiles([percent])[0]
+
+    def summary(self):
+        """count, p50/p95/p99/max/mean in milliseconds"""
+        counts, total, sum_ns, min_ns, max_ns = self._state()
+        if not total:
+            return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None, "mean_ms": None}
+        p50, p95, p99 = self.percentiles([50, 95, 99])
+        return {
+            "count": total,
+            "p50_ms": p50 * 1000,
+            "p95_ms": p95 * 1000,
+            "p99_ms": p99 * 1000,
+            "max_ms": max_ns / 1e6,
+            "mean_ms": sum_ns / total / 1e6,
+        }
@@ -0,0 +1,250 @@
+import threading
+import time
+
+from base.latency_histogram import LatencyHistogram
+
+
+'''
+Shared, low-overhead metrics registry.
+
+Components register named metrics once and record into them from their hot
+paths; the GUI, the benchmark and exporters read them by name.
+
+  - RateCounter: events per second over a sliding window (default 1 s). The
+    window is a ring of time buckets, so recording and reading are O(1) in the
+    number of events instead of scanning a timestamp deque.
+  - Gauge: last value set, or the value of a function read on demand (e.g. a
+    queue's drop counter), so components do not have to push it.
+  - Histogram: LatencyHistogram samples (seconds).
+
+Counters and histograms are sharded per recording thread: every thread writes
+to its own shard and never contends with other threads. Readers aggregate the
+shards lazily. Rate counter shards are updated without a lock (each has a
+single writer); a read that races a bucket rollover can be off by the events
+of that one bucket, which is fine for monitoring. Threads come and go (every
+processor start, stream restart or auto-tune trial starts new ones), so the
+shards of finished threads are folded into one retired shard when a new thread
+registers or the metric is read.
+
+Names are dotted, "<component>.<metric>", e.g. "processor.frames". Components
+take a registry and a prefix so several instances (e.g. one per stream) can
+share one registry.
+'''
+
+RATE_WINDOW = 1.0
+RATE_BUCKETS = 10
+
+
+class _RateShard:
+    __slots__ = ("epochs", "counts", "total")
+
+    def __init__(self, buckets):
+        self.epochs = [-1] * buckets
+        self.counts = [0] * buckets
+        self.total = 0
+
+
+class _ShardedMetric:
+    """Per-thread shards; the shards of finished threads are merged into one retired shard"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []  # (owning thread, shard)
+        self._retired = self._new_shard()
+        self._shards_lock = threading.Lock()
+
+    def _new_shard(self):
+        raise NotImplementedError
+
+    def _retire(self, shard):
+        """Fold the shard of a finished thread into self._retired (under the shards lock)"""
+        raise NotImplementedError
+
+    def _prune(self):
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._retire(shard)
+        self._shards = live
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._new_shard()
+            with self._shards_lock:
+                self._prune()
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+        return shard
+
+    def _all_shards(self):
+        """Live shards plus the retired one"""
+        with self._shards_lock:
+            self._prune()
+            return [shard for _, shard in self._shards] + [self._retired]
+
+    def shard_count(self):
+        """Number of live thread shards"""
+        with self._shards_lock:
+            self._prune()
+            return len(self._shards)
+
+
+class RateCounter(_ShardedMetric):
+    def __init__(self, window=RATE_WINDOW, buckets=RATE_BUCKETS):
+        self.window = window
+        self.buckets = buckets
+        self.bucket_width = window / buckets
+        super().__init__()
+
+    def _new_shard(self):
+        return _RateShard(self.buckets)
+
+    def _retire(self, shard):
+        retired = self._retired
+        for slot, (epoch, count) in enumerate(zip(shard.epochs, shard.counts)):
+            if epoch == retired.epochs[slot]:
+                retired.counts[slot] += count
+            elif epoch > retired.epochs[slot]:
+                retired.epochs[slot] = epoch
+                retired.counts[slot] = count
+        retired.total += shard.total
+
+    def record(self, count=1):
+        """Count events now (on the calling thread's shard)"""
+        shard = self._shard()
+        epoch = int(time.monotonic() / self.bucket_width)
+        slot = epoch % self.buckets
+        if shard.epochs[slot] != epoch:
+            shard.epochs[slot] = epoch
+            shard.counts[slot] = 0
+        shard.counts[slot] += count
+        shard.total += count
+
+    def get_rate(self):
+        """Events per second over the last full window; the bucket in progress is left out"""
+        current = int(time.monotonic() / self.bucket_width)
+        oldest = current - self.buckets
+        events = 0
+        for shard in self._all_shards():
+            for epoch, count in zip(shard.epochs, shard.counts):
+                if oldest <= epoch < current:
+                    events += count
+        return events / self.window
+
+    def get_total(self):
+        return sum(shard.total for shard in self._all_shards())
+
+    def reset(self):
+        with self._shards_lock:
+            for shard in [shard for _, shard in self._shards] + [self._retired]:
+                shard.epochs = [-1] * self.buckets
+                shard.counts = [0] * self.buckets
+                shard.total = 0
+
+    def value(self):
+        return {"rate": self.get_rate(), "total": self.get_total()}
+
+
+class Gauge:
+    def __init__(self, function=None):
+        self.function = function
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def get(self):
+        return self.function() if self.function is not None else self._value
+
+    def reset(self):
+        self._value = 0
+
+    def value(self):
+        return self.get()
+
+
+class Histogram(_ShardedMetric):
+    def _new_shard(self):
+        return LatencyHistogram()
+
+    def _retire(self, shard):
+        self._retired.merge(shard)
+
+    def record(self, seconds):
+        """Record one sample (on the calling thread's shard)"""
+        self._shard().record(seconds)
+
+    def snapshot(self):
+        """LatencyHistogram combining all shards"""
+        return LatencyHistogram.merged(self._all_shards())
+
+    def reset(self):
+        for shard in self._all_shards():
+            shard.reset()
+
+    def value(self):
+        return self.snapshot().summary()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, name, kind, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            elif not isinstance(metric, kind):
+                raise ValueError(f"Metric {name} is already registered as a {type(metric).__name__}")
+            return metric
+
+    def rate(self, name, window=RATE_WINDOW, buckets=RATE_BUCKETS):
+        """Get or create a RateCounter"""
+        return self._get_or_create(name, RateCounter, lambda: RateCounter(window, buckets))
+
+    def gauge(self, name, function=None):
+        """Get or create a Gauge; a function given here replaces the previous one"""
+        gauge = self._get_or_create(name, Gauge, Gauge)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name):
+        """Get or create a Histogram"""
+        return self._get_or_create(name, Histogram, Histogram)
+
+    def get(self, name):
+        """Registered metric, or None"""
+        with self._lock:
+            return self._metrics.get(name)
+
+    def names(self, prefix=""):
+        with self._lock:
+            return sorted(name for name in self._metrics if name.startswith(prefix))
+
+    def snapshot(self, prefix=""):
+        """{name: value} of all metrics (under a prefix): rates as {rate, total}, gauges as their value,
+        histograms as their summary (ms)"""
+        with self._lock:
+            metrics = [(name, metric) for name, metric in self._metrics.items() if name.startswith(prefix)]
+        return {name: metric.value() for name, metric in sorted(metrics)}
+
+    def reset(self, prefix=""):
+        """Reset all metrics (under a prefix); function gauges are unaffected"""
+        with self._lock:
+            metrics = [metric for name, metric in self._metrics.items() if name.startswith(prefix)]
+        for metric in metrics:
+            metric.reset()
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """Process-wide default registry"""
+    return _registry
@@ -0,0 +1,272 @@
+import csv
+import io
+import json
+import math
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from base.metrics import get_registry
+
+
+'''
+Background exporter of the metrics registry for headless runs.
+
+Every interval the exporter takes one registry snapshot (rates, gauges,
+histogram summaries) and publishes it:
+
+  - Prometheus text format on http://127.0.0.1:<port>/metrics. Scrapes are
+    served from the latest snapshot, so scraping never touches the pipeline.
+  - JSON lines (one {"time", "metrics"} object per snapshot) and/or CSV (one
+    row per snapshot, one column per metric field). Rows are batched in memory
+    and written every `batch_size` snapshots. Files rotate at `max_bytes`,
+    keeping `backups` old files (path.1 is the newest). A CSV file also rotates
+    when new metrics appear, so every file has one header.
+
+Collection cost is bounded and measured: the time of every collection is
+recorded in the "exporter.collect_time" histogram, and the interval stretches
+so collection takes at most `budget` of one core (default 1%).
+
+Prometheus names are the dotted registry names with "." replaced by "_" and
+an "imgproc_" prefix: rates become <name>_per_second and <name>_total,
+histograms become summaries in seconds (quantile 0.5/0.95/0.99 plus _count,
+_sum and _max).
+'''
+
+PROMETHEUS_PREFIX = "imgproc_"
+
+QUANTILES = (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms"))
+
+
+def prometheus_name(name):
+    return PROMETHEUS_PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _number(value):
+    """Gauge values as Prometheus numbers; None for values that are not numeric"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value if math.isfinite(value) else None
+    return None
+
+
+def format_prometheus(snapshot):
+    """Prometheus text exposition of a registry snapshot"""
+    lines = []
+    for name, value in snapshot.items():
+        metric = prometheus_name(name)
+        if isinstance(value, dict) and "rate" in value:
+            lines.append(f"# TYPE {metric}_per_second gauge")
+            lines.append(f"{metric}_per_second {value['rate']}")
+            lines.append(f"# TYPE {metric}_total counter")
+            lines.append(f"{metric}_total {value['total']}")
+        elif isinstance(value, dict) and "count" in value:
+            metric += "_seconds"
+            count = value["count"]
+            lines.append(f"# TYPE {metric} summary")
+            if count:
+                for quantile, key in QUANTILES:
+                    lines.append(f'{metric}{{quantile="{quantile}"}} {value[key] / 1000}')
+            lines.append(f"{metric}_sum {value['mean_ms'] * count / 1000 if count else 0}")
+            lines.append(f"{metric}_count {count}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines.append(f"{metric}_max {value['max_ms'] / 1000 if count else 0}")
+        else:
+            number = _number(value)
+            if number is not None:
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {number}")
+    return "\n".join(lines) + "\n"
+
+
+def flatten(snapshot):
+    """{column: value} of a snapshot, e.g. "processor.latency.p99_ms" """
+    row = {}
+    for name, value in snapshot.items():
+        if isinstance(value, dict):
+            for key, field in value.items():
+                row[f"{name}.{key}"] = field
+        else:
+            row[name] = value
+    return row
+
+
+class RotatingFile:
+    """Append-only text file that rotates to path.1 ... path.<backups> once it exceeds max_bytes"""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def rotate(self):
+        if not os.path.exists(self.path):
+            return
+        for index in range(self.backups, 0, -1):
+            source = f"{self.path}.{index - 1}" if index > 1 else self.path
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index}")
+        if self.backups == 0:
+            os.remove(self.path)
+
+    def write(self, text):
+        if self.size() >= self.max_bytes:
+            self.rotate()
+        with open(self.path, "a") as f:
+            f.write(text)
+
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    exporter = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.exporter.get_prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the console
+        pass
+
+
+class MetricsExporter:
+    def __init__(self, registry=None, interval=1.0, prometheus_port=None, host="127.0.0.1", jsonl_path=None, csv_path=None,
+                 batch_size=10, max_bytes=10 * 1024 * 1024, backups=5, budget=0.01, prefix=""):
+        self.registry = registry if registry is not None else get_registry()
+        self.interval = interval
+        self.prometheus_port = prometheus_port
+        self.host = host
+        self.batch_size = batch_size
+        self.budget = budget
+        self.prefix = prefix
+
+        self.jsonl_file = RotatingFile(jsonl_path, max_bytes, backups) if jsonl_path else None
+        self.csv_file = RotatingFile(csv_path, max_bytes, backups) if csv_path else None
+        self._csv_columns = None
+
+        self._lock = threading.Lock()
+        self._pending = []  # (time, snapshot) not yet written to the files
+        self._prometheus_text = "\n"
+        self._stop_event = threading.Event()
+        self.thread = None
+        self.server = None
+        self.server_thread = None
+
+        self.current_interval = interval
+        self.collect_histogram = self.registry.histogram("exporter.collect_time")
+        self.snapshots_metric = self.registry.rate("exporter.snapshots")
+        self.registry.gauge("exporter.interval", lambda: self.current_interval)
+
+    def start(self):
+        self._stop_event.clear()
+        if self.prometheus_port is not None:
+            handler = type("PrometheusHandler", (_PrometheusHandler,), {"exporter": self})
+            self.server = ThreadingHTTPServer((self.host, self.prometheus_port), handler)
+            self.server.daemon_threads = True
+            self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True, name="metrics-http")
+            self.server_thread.start()
+            print(f"Metrics exporter: Prometheus endpoint on http://{self.host}:{self.server.server_address[1]}/metrics")
+        self.thread = threading.Thread(target=self._export_loop, daemon=True, name="metrics-exporter")
+        self.thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        # Final snapshot, so the files cover the end of the run
+        self.collect()
+        self.flush()
+
+    def _export_loop(self):
+        while not self._stop_event.wait(self.current_interval):
+            try:
+                collect_time = self.collect()
+                # Stretch the interval if collection would take more than the budget
+                self.current_interval = max(self.interval, collect_time / self.budget)
+                with self._lock:
+                    pending = len(self._pending)
+                if pending >= self.batch_size:
+                    self.flush()
+            except Exception as e:
+                # A failing write (e.g. full disk) must not stop the exporter
+                print(f"Metrics exporter error: {e}")
+
+    def collect(self):
+        """Take one snapshot and update the Prometheus text; returns the collection time in seconds"""
+        start_time = time.perf_counter()
+        snapshot = self.registry.snapshot(self.prefix)
+        text = format_prometheus(snapshot)
+        collect_time = time.perf_counter() - start_time
+        self.collect_histogram.record(collect_time)
+        self.snapshots_metric.record()
+        with self._lock:
+            self._prometheus_text = text
+            if self.jsonl_file is not None or self.csv_file is not None:
+                self._pending.append((time.time(), snapshot))
+        return collect_time
+
+    def flush(self):
+        """Write the batched snapshots to the files"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        if self.jsonl_file is not None:
+            self.jsonl_file.write("".join(json.dumps({"time": timestamp, "metrics": snapshot}) + "\n" for timestamp, snapshot in pending))
+        if self.csv_file is not None:
+            self._write_csv(pending)
+
+    def _write_csv(self, pending):
+        if self.csv_file.size() >= self.csv_file.max_bytes:
+            # Rotate here rather than in write(), so the new file starts with the header
+            self.csv_file.rotate()
+            self._csv_columns = None
+        # csv.writer quotes values containing commas, quotes or newlines
+        lines = io.StringIO()
+        writer = csv.writer(lines, lineterminator="\n")
+        for timestamp, snapshot in pending:
+            row = flatten(snapshot)
+            columns = sorted(row)
+            if columns != self._csv_columns:
+                # New metrics: start a new file with its own header
+                if lines.tell():
+                    self.csv_file.write(lines.getvalue())
+                    lines.seek(0)
+                    lines.truncate()
+                if self.csv_file.size():
+                    self.csv_file.rotate()
+                self._csv_columns = columns
+                writer.writerow(["time"] + columns)
+            writer.writerow([f"{timestamp:.3f}"] + ["" if row[column] is None else row[column] for column in columns])
+        self.csv_file.write(lines.getvalue())
+
+    def get_prometheus_text(self):
+        with self._lock:
+            return self._prometheus_text
+
+    def get_collect_summary(self):
+        """Collection time percentiles (ms) of this exporter"""
+        return self.collect_histogram.value()
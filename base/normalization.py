@@ -0,0 +1,89 @@
+import cv2
+import numpy as np
+
+
+'''
+Normalization of demosaiced sensor data to display range.
+
+NORM_MINMAX stretches every frame between its own min and max (cv2.NORM_MINMAX).
+That costs an extra reduction pass per frame and makes brightness flicker with
+content.
+
+NORM_LUT maps raw sensor values through a fixed lookup table computed once for
+the known bit depth, with optional black level and gamma baked in. The output
+is stable and deterministic and needs no per-frame statistics. When the table
+is affine (gamma == 1) it is applied as one fused scale + shift conversion,
+which is exactly what the table holds but avoids a per-pixel gather;
+otherwise the table itself is applied with a single gather.
+'''
+
+NORM_MINMAX = "minmax"
+NORM_LUT = "lut"
+
+NORMALIZATION_MODES = (NORM_MINMAX, NORM_LUT)
+
+
+def output_range(dtype):
+    """Display range for an output dtype: [0, 1] for float, [0, 255] for uint8"""
+    return (0.0, 255.0) if np.dtype(dtype) == np.uint8 else (0.0, 1.0)
+
+
+def build_normalization_lut(bit_depth=12, black_level=0, gamma=1.0, dtype=np.float32):
+    """Build a table mapping every uint16 value to the normalized output value.
+
+    Values at or below black_level map to 0, values at or above the white level
+    (2**bit_depth - 1) map to the top of the output range.
+    """
+    white_level = (1 << bit_depth) - 1
+    if not 0 <= black_level < white_level:
+        raise ValueError(f"Black level {black_level} outside of the {bit_depth}-bit range")
+
+    values = np.arange(1 << 16, dtype=np.float64)
+    values = np.clip((values - black_level) / (white_level - black_level), 0.0, 1.0)
+    if gamma != 1.0:
+        values = values ** (1.0 / gamma)
+
+    _, top = output_range(dtype)
+    values *= top
+    if np.dtype(dtype) == np.uint8:
+        values = np.rint(values)
+    return values.astype(dtype)
+
+
+class FixedScaleNormalizer:
+    def __init__(self, bit_depth=12, black_level=0, gamma=1.0, dtype=np.float32):
+        self.bit_depth = bit_depth
+        self.black_level = black_level
+        self.gamma = gamma
+        self.dtype = np.dtype(dtype)
+
+        self.lut = build_normalization_lut(bit_depth, black_level, gamma, self.dtype)
+
+        # Affine tables are applied as one fused conversion: (value - black_level) * scale
+        _, top = output_range(self.dtype)
+        self.scale = top / ((1 << bit_depth) - 1 - black_level)
+        self.is_affine = gamma == 1.0
+
+    def apply(self, rgb, out):
+        """Normalize uint16 sensor data into out (float32 or uint8, same shape)"""
+        if not self.is_affine:
+            np.take(self.lut, rgb, out=out)
+            return out
+
+        if self.black_level:
+            # Saturating subtract clamps values below the black level to 0 (rgb is a scratch buffer)
+            cv2.subtract(rgb, (self.black_level,) * 4, dst=rgb)
+
+        if self.dtype == np.uint8:
+            cv2.convertScaleAbs(rgb, out, alpha=self.scale)
+        else:
+            cv2.addWeighted(rgb, self.scale, rgb, 0.0, 0.0, dst=out, dtype=cv2.CV_32F)
+            # Values above the white level saturate at 1.0 like the table (uint8 saturates in the conversion)
+            np.minimum(out, 1.0, out=out)
+        return out
+
+
+def normalize_minmax(rgb, out):
+    """Per-frame min/max stretch of rgb into out (float32 or uint8)"""
+    alpha, beta = output_range(out.dtype)
+    return cv2.normalize(rgb, out, alpha=alpha, beta=beta, norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_8U if out.dtype == np.uint8 else cv2.CV_32F)
@@ -0,0 +1,148 @@
+import threading
+from collections import deque
+from itertools import islice
+
+import numpy as np
+
+
+'''
+Incremental, smoothed plot series.
+
+The plot thread polls every source many times per second, while a source only
+produces a handful of new samples between two polls. A PlotSeries keeps the
+plotted window in preallocated NumPy arrays and only looks at the samples newer
+than the last one it has seen, so a tick costs O(new samples) in vectorized
+NumPy instead of rebuilding and re-averaging Python lists of the whole history.
+
+Smoothing is a moving average over the last `window` samples computed from a
+running cumulative sum: avg[i] = (C[i] - C[i - window]) / window. The first
+samples average over what is available.
+
+Storage is twice the plotted capacity: samples are appended at the end, and the
+newest `capacity` samples are moved to the front when the arrays are full. That
+keeps the plotted window contiguous (views go straight to Dear PyGui) at an
+amortized O(1) per sample.
+
+Sources keep their recent samples in a SampleHistory. Every sample gets a
+sequence number, so the plot thread asks for the samples after its cursor
+(get_since) and copies only those, instead of the whole history every tick.
+'''
+
+CAPACITY = 500
+
+
+class SampleHistory:
+    """Recent sample tuples (e.g. (start_time, end_time)) for plotting, thread-safe"""
+
+    def __init__(self, fields=2, maxlen=CAPACITY):
+        self.fields = fields
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        # Samples appended so far, including cleared ones; the cursor of the next sample
+        self._count = 0
+
+    def append(self, *values):
+        with self._lock:
+            self._samples.append(values)
+            self._count += 1
+
+    def _columns(self, samples):
+        if not samples:
+            return tuple([] for _ in range(self.fields))
+        return tuple(list(column) for column in zip(*samples))
+
+    def get(self):
+        """Copies of all recent samples, one list per field"""
+        with self._lock:
+            samples = list(self._samples)
+        return self._columns(samples)
+
+    def get_since(self, cursor):
+        """(new cursor, one list per field) of the samples appended after cursor (0 for all)"""
+        with self._lock:
+            new = min(self._count - cursor, len(self._samples))
+            # Walk back from the newest sample, so the cost is O(new samples)
+            samples = list(islice(reversed(self._samples), new)) if new > 0 else []
+            cursor = self._count
+        samples.reverse()
+        return (cursor, *self._columns(samples))
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+
+class PlotSeries:
+    def __init__(self, capacity=CAPACITY, window=20, scale=1000.0):
+        self.capacity = capacity
+        self.window = max(1, window)
+        # Applied to the smoothed values, e.g. seconds -> ms
+        self.scale = scale
+
+        self._times = np.empty(2 * capacity, dtype=np.float64)
+        self._averages = np.empty(2 * capacity, dtype=np.float64)
+        # Running cumulative sum of the raw values, continued across ticks
+        self._cumsum = np.empty(2 * capacity, dtype=np.float64)
+        self._length = 0
+        self._count = 0
+        self._last_time = -np.inf
+
+    def update(self, times, values, reference_time=0.0):
+        """Append the samples of (times, values) newer than the last one seen.
+        Returns True if the plotted data changed."""
+        times = np.asarray(times, dtype=np.float64)
+        if not times.size:
+            return False
+        new = times > self._last_time
+        if not new.any():
+            return False
+        times = times[new]
+        values = np.asarray(values, dtype=np.float64)[new]
+        self._last_time = times.max()
+
+        # Older samples would fall off the plotted window anyway; start over from the newest ones
+        if times.size > self.capacity:
+            self.reset()
+            self._last_time = times.max()
+            times, values = times[-self.capacity:], values[-self.capacity:]
+        self._make_room(times.size)
+
+        start, end = self._length, self._length + times.size
+        previous = self._cumsum[start - 1] if start else 0.0
+        np.cumsum(values, out=self._cumsum[start:end])
+        self._cumsum[start:end] += previous
+
+        # Cumulative sum `window` samples back; zero (and a shorter window) while the series is warming up
+        counts = np.minimum(self._count + np.arange(1, times.size + 1), self.window)
+        lagged_positions = np.arange(start, end) - counts
+        lagged = np.where(lagged_positions >= 0, self._cumsum[np.maximum(lagged_positions, 0)], 0.0)
+        np.subtract(self._cumsum[start:end], lagged, out=self._averages[start:end])
+        self._averages[start:end] *= self.scale / counts
+
+        np.subtract(times, reference_time, out=self._times[start:end])
+        self._length = end
+        self._count += times.size
+        return True
+
+    def _make_room(self, size):
+        if self._length + size <= self._times.size:
+            return
+        # Keep enough history for the plotted window and for the moving average of the next samples
+        keep = min(self._length, max(self.capacity - size, self.window))
+        for array in (self._times, self._averages, self._cumsum):
+            array[:keep] = array[self._length - keep:self._length]
+        self._length = keep
+
+    def get_data(self):
+        """(times, smoothed values) of the plotted window; views, valid until the next update"""
+        start = max(0, self._length - self.capacity)
+        return self._times[start:self._length], self._averages[start:self._length]
+
+    def reset(self):
+        self._length = 0
+        self._count = 0
+        self._last_time = -np.inf
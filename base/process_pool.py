@@ -0,0 +1,129 @@
+import multiprocessing as mp
+import numpy as np
+import queue
+import time
+
+from base.frame_pool import attach_slot, detach_all
+from base.demosaic import get_backend
+from base.normalization import FixedScaleNormalizer, normalize_minmax, NORM_LUT
+
+
+'''
+Multi-process processing workers.
+
+Each worker is a separate process running the demosaic + normalize chain, so
+Python-side work is not serialized by the GIL of the capturing process. Bayer
+input and output images live in SharedFramePool slots; only slot descriptors,
+the backend name and timings cross the process boundary, never pixel data.
+
+Jobs are dispatched round-robin by sequence number (worker = seq % workers).
+Workers report results on one shared queue in completion order; the caller
+re-orders them by sequence number.
+
+Workers are started with the "spawn" method: forking a process that already
+runs capture and processing threads would copy their held locks. Backends are
+looked up by name in each worker's own registry, so only backends registered at
+import time of base.demosaic are available there.
+
+Spawned workers import the main module of the program again. A script that
+starts an ImageProcessor with num_processes > 0 must therefore do so under
+`if __name__ == "__main__":`; otherwise every worker starts the pipeline again
+at import (multiprocessing stops it with a RuntimeError about bootstrapping).
+'''
+
+START_METHOD = "spawn"
+
+
+def _worker_main(jobs, results, settings):
+    import cv2
+    # One process per core already; OpenCV's own thread pool would oversubscribe
+    cv2.setNumThreads(1)
+
+    normalizer = None
+    if settings["normalization"] == NORM_LUT:
+        normalizer = FixedScaleNormalizer(settings["bit_depth"], settings["black_level"], settings["gamma"], settings["output_dtype"])
+
+    attached = {}
+    scratch = {}
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        seq, raw_slot, tasks, pattern, bit_depth = job
+        try:
+            raw = attach_slot(raw_slot, attached)
+            timings = []
+            for backend_name, output_slot in tasks:
+                backend = get_backend(backend_name)
+                output = attach_slot(output_slot, attached)
+                rgb_shape = backend.output_shape(raw.shape)
+                if rgb_shape not in scratch:
+                    scratch[rgb_shape] = np.empty(rgb_shape, dtype=np.uint16)
+                rgb = scratch[rgb_shape]
+
+                demosaic_start = time.perf_counter()
+                backend.demosaic(raw, rgb, pattern, bit_depth)
+                normalize_start = time.perf_counter()
+                if normalizer is not None:
+                    normalizer.apply(rgb, output)
+                else:
+                    normalize_minmax(rgb, output)
+                timings.append((demosaic_start, normalize_start, time.perf_counter()))
+            results.put((seq, timings, None))
+        except Exception as e:
+            results.put((seq, None, f"{type(e).__name__}: {e}"))
+
+    detach_all(attached)
+
+
+class ProcessWorkerPool:
+    def __init__(self, num_workers, settings):
+        self.num_workers = num_workers
+        self.settings = settings
+
+        self._processes = []
+        self._jobs = []
+        self._results = None
+
+    def start(self):
+        context = mp.get_context(START_METHOD)
+        self._jobs = [context.Queue() for _ in range(self.num_workers)]
+        self._results = context.Queue()
+        self._processes = [context.Process(target=_worker_main, args=(jobs, self._results, self.settings), daemon=True, name=f"processing-worker-{i}")
+                           for i, jobs in enumerate(self._jobs)]
+        for process in self._processes:
+            process.start()
+        print(f"Started {self.num_workers} processing worker processes")
+
+    def stop(self):
+        for jobs in self._jobs:
+            jobs.put(None)
+        for process in self._processes:
+            process.join(timeout=5.0)
+            if process.is_alive():
+                process.terminate()
+        for jobs in self._jobs:
+            jobs.close()
+        if self._results is not None:
+            self._results.close()
+        self._processes = []
+        self._jobs = []
+        self._results = None
+
+    def worker_for(self, seq):
+        return seq % self.num_workers
+
+    def submit(self, seq, raw_slot, tasks, pattern, bit_depth):
+        """Queue one frame: tasks is a list of (backend_name, output_slot)"""
+        self._jobs[self.worker_for(seq)].put((seq, raw_slot, tasks, pattern, bit_depth))
+
+    def get_result(self, timeout=None):
+        """Next finished (seq, timings, error) in completion order, or None on timeout.
+        timings holds one (demosaic_start, normalize_start, end) tuple per task."""
+        try:
+            return self._results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def is_worker_alive(self, worker):
+        return self._processes[worker].is_alive()
@@ -0,0 +1,245 @@
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+from base.metrics import get_registry
+
+
+'''
+Runtime profiling that can be switched on and off while the pipeline runs.
+
+Two layers:
+  - Stage timers, always on: the components record their stage and latency
+    histograms into the metrics registry anyway (processor.stage.*,
+    processor.latency, source.frame_time, ...). stage_report() reads them.
+  - Stack sampling, on demand: start_sampling() runs a thread that reads the
+    stack of every other thread (sys._current_frames) at a fixed interval
+    for a fixed window, then stops by itself. Nothing is instrumented, so the
+    pipeline runs at full speed while sampling is off, and at the cost of
+    one stack walk per interval while it is on.
+
+The report lists the hot spots per function: "self" samples (the function
+was executing) and "total" samples (the function was on the stack), plus the
+samples per thread. Time spent inside C code (OpenCV, numpy) is attributed to
+the Python line that called it. Threads that wait (queues, sleeps) show up in
+wait functions; filter by thread to see the busy ones.
+
+Switch sampling on from the GUI ("Profile" button), through the API, or with
+a signal for a headless process (install_signal_trigger, SIGUSR1 by default).
+'''
+
+SAMPLE_INTERVAL = 0.005
+SAMPLE_WINDOW = 5.0
+
+# Source paths in reports are shown relative to the project root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Profiler:
+    def __init__(self, metrics=None, interval=SAMPLE_INTERVAL, output_dir=None):
+        self.metrics = metrics if metrics is not None else get_registry()
+        self.interval = interval
+        self.output_dir = output_dir
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.thread = None
+        self._reset_samples()
+        self.last_report = None
+
+    def _reset_samples(self):
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.thread_counts = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.sampled_time = 0.0
+        self.sampling_cost = 0.0
+
+    # ---- stack sampling ----
+
+    def start_sampling(self, duration=SAMPLE_WINDOW, on_done=None):
+        """Sample all thread stacks for duration seconds in the background; on_done(report) is called at the end.
+        Returns False if a sampling window is already running."""
+        with self._lock:
+            if self.thread is not None and self.thread.is_alive():
+                return False
+            self._reset_samples()
+            self._stop_event.clear()
+            self.thread = threading.Thread(target=self._sample_loop, args=(duration, on_done), daemon=True, name="profiler")
+            self.thread.start()
+        print(f"Profiler: sampling thread stacks for {duration:.1f} s")
+        return True
+
+    def stop_sampling(self):
+        """End the running window early (its report is still produced)"""
+        self._stop_event.set()
+        thread = self.thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def is_sampling(self):
+        thread = self.thread
+        return thread is not None and thread.is_alive()
+
+    def _sample_loop(self, duration, on_done):
+        own_id = threading.get_ident()
+        self.started_at = time.time()
+        start_time = time.perf_counter()
+        end_time = start_time + duration
+        while not self._stop_event.is_set() and time.perf_counter() < end_time:
+            sample_start = time.perf_counter()
+            self._sample(own_id)
+            self.sampling_cost += time.perf_counter() - sample_start
+            self._stop_event.wait(self.interval)
+        self.sampled_time = time.perf_counter() - start_time
+
+        report = self.get_report()
+        self.last_report = report
+        print(self.format_report(report))
+        if self.output_dir:
+            self.dump(report)
+        if on_done:
+            on_done(report)
+
+    def _sample(self, own_id):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        with self._lock:
+            self.samples += 1
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                self.thread_counts[names.get(thread_id, str(thread_id))] += 1
+                top = True
+                seen = set()
+                while frame is not None:
+                    code = frame.f_code
+                    function = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if top:
+                        self.self_counts[function] += 1
+                        top = False
+                    if function not in seen:
+                        # Recursive functions count once per sample
+                        seen.add(function)
+                        self.total_counts[function] += 1
+                    frame = frame.f_back
+
+    # ---- reports ----
+
+    def stage_report(self):
+        """Always-on stage timers: summaries (ms) of the registry's latency histograms"""
+        snapshot = self.metrics.snapshot()
+        return {name: value for name, value in snapshot.items() if isinstance(value, dict) and "p50_ms" in value}
+
+    def get_report(self, top=25):
+        """Hot spots of the last sampling window plus the current stage timers"""
+        with self._lock:
+            samples = self.samples
+            # One sample per thread per round; percentages are shares of all thread samples
+            thread_samples = sum(self.thread_counts.values())
+            hot = [(function, count, self.total_counts[function]) for function, count in self.self_counts.most_common(top)]
+            cumulative = self.total_counts.most_common(top)
+            threads = dict(self.thread_counts.most_common())
+
+        def describe(function):
+            filename, line, name = function
+            if filename.startswith(PROJECT_ROOT):
+                filename = os.path.relpath(filename, PROJECT_ROOT)
+            return f"{name} ({filename}:{line})"
+
+        return {
+            "started_at": self.started_at,
+            "duration_s": self.sampled_time,
+            "interval_ms": self.interval * 1000,
+            "samples": samples,
+            # Time the sampler itself spent walking stacks, as a share of the window
+            "sampling_overhead": self.sampling_cost / self.sampled_time if self.sampled_time else 0.0,
+            "threads": threads,
+            "thread_samples": thread_samples,
+            "self": [{"function": describe(function), "self": count, "total": total,
+                      "self_pct": 100.0 * count / thread_samples if thread_samples else 0.0,
+                      "total_pct": 100.0 * total / thread_samples if thread_samples else 0.0} for function, count, total in hot],
+            "cumulative": [{"function": describe(function), "total": count,
+                            "total_pct": 100.0 * count / thread_samples if thread_samples else 0.0} for function, count in cumulative],
+            "stages": self.stage_report(),
+        }
+
+    def format_report(self, report=None):
+        report = report if report is not None else self.get_report()
+        lines = [f"Profile: {report['samples']} samples over {report['duration_s']:.1f} s "
+                 f"(sampler overhead {report['sampling_overhead']:.1%})",
+                 "  self%  total%  function"]
+        for entry in report["self"]:
+            lines.append(f"  {entry['self_pct']:5.1f}  {entry['total_pct']:6.1f}  {entry['function']}")
+        lines.append("  samples per thread: " + ", ".join(f"{name}: {count}" for name, count in report["threads"].items()))
+        lines.append("  stage timers (p50 / p99 ms):")
+        for name, summary in report["stages"].items():
+            if summary["count"]:
+                lines.append(f"    {name}: {summary['p50_ms']:.2f} / {summary['p99_ms']:.2f} ({summary['count']} samples)")
+        return "\n".join(lines)
+
+    def dump(self, report=None, path=None):
+        """Write the report as text and JSON (profile_<time>.txt/.json in output_dir by default); returns the text path"""
+        report = report if report is not None else self.get_report()
+        if path is None:
+            stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(report["started_at"] or time.time()))
+            path = os.path.join(self.output_dir or ".", f"profile_{stamp}.txt")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            f.write(self.format_report(report) + "\n")
+        with open(os.path.splitext(path)[0] + ".json", "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Profile written to {path}")
+        return path
+
+
+class SignalTrigger:
+    """Installed signal trigger (see install_signal_trigger); uninstall() restores the previous handler"""
+
+    def __init__(self, profiler, duration, signum):
+        self.profiler = profiler
+        self.duration = duration
+        self.signum = signum
+        self._requested = threading.Event()
+        self._stop_event = threading.Event()
+        # Raises on other threads than the main one, before anything else is started
+        self.previous_handler = signal.signal(signum, self._handle)
+        self.thread = threading.Thread(target=self._trigger_loop, daemon=True, name="profiler-trigger")
+        self.thread.start()
+
+    def _handle(self, received, frame):
+        # The handler runs on the main thread, possibly while it holds the profiler's lock (get_report),
+        # so it only wakes the trigger thread instead of starting the window itself
+        self._requested.set()
+
+    def _trigger_loop(self):
+        while True:
+            self._requested.wait()
+            if self._stop_event.is_set():
+                break
+            self._requested.clear()
+            self.profiler.start_sampling(self.duration)
+
+    def uninstall(self):
+        """Restore the previous handler and end the trigger thread; main thread only"""
+        # None means the previous handler was not installed from Python
+        signal.signal(self.signum, self.previous_handler if self.previous_handler is not None else signal.SIG_DFL)
+        self._stop_event.set()
+        self._requested.set()
+        self.thread.join()
+
+
+def install_signal_trigger(profiler, duration=SAMPLE_WINDOW, signum=getattr(signal, "SIGUSR1", None)):
+    """Start a sampling window when the process receives signum (e.g. `kill -USR1 <pid>`); main thread only.
+    Returns the SignalTrigger; call its uninstall() when done."""
+    if signum is None:
+        raise ValueError("This platform has no SIGUSR1; pass another signal")
+    return SignalTrigger(profiler, duration, signum)
@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from base.normalization import NORM_LUT
+from base.metrics import get_registry
+
+
+'''
+Adaptive quality controller for an ImageProcessor.
+
+When the processor falls behind, frames are dropped at its input queue with no
+other warning. The controller samples the processing latency (p95 of the
+frames finished in each interval) and the input drop rate, and compares them
+with a target latency. Under load it steps down a ladder of cheaper modes:
+
+  full -> fixed_scale -> fast_demosaic -> binned -> skip_2 -> skip_4
+
+  - fixed_scale: NORM_LUT instead of per-frame min/max (no reduction pass)
+  - fast_demosaic: FAST_BACKEND instead of the configured backend
+  - binned: 2x2-binned quarter-size display image (processor preview mode)
+  - skip_N: process only every Nth incoming frame
+
+Each level keeps the reductions of the levels above it. One overloaded sample
+steps down (after a short settling time following the previous change). Stepping
+back up needs hysteresis: `upgrade_samples` consecutive samples with latency
+below `headroom` times the target and no drops. An upgrade that has to be undone
+soon after doubles the number of samples the next upgrade needs, so the
+controller does not oscillate between two levels. Every change is logged, kept
+in get_history() and published as the "<prefix>.quality_level" gauge.
+
+Steps the processor cannot take (normalization with worker processes or with
+an ISP chain, which replaces it) are left out of the ladder.
+'''
+
+FAST_BACKEND = "opencv_bilinear"
+
+LEVEL_FULL = "full"
+LEVEL_FIXED_SCALE = "fixed_scale"
+LEVEL_FAST_DEMOSAIC = "fast_demosaic"
+LEVEL_BINNED = "binned"
+LEVEL_SKIP_2 = "skip_2"
+LEVEL_SKIP_4 = "skip_4"
+
+# Settings per level, cheapest last; each level includes the reductions of the ones before it
+QUALITY_LEVELS = (
+    (LEVEL_FULL, {}),
+    (LEVEL_FIXED_SCALE, {"normalization": NORM_LUT}),
+    (LEVEL_FAST_DEMOSAIC, {"normalization": NORM_LUT, "backend": FAST_BACKEND}),
+    (LEVEL_BINNED, {"normalization": NORM_LUT, "backend": FAST_BACKEND, "preview": True}),
+    (LEVEL_SKIP_2, {"normalization": NORM_LUT, "backend": FAST_BACKEND, "preview": True, "frame_skip": 2}),
+    (LEVEL_SKIP_4, {"normalization": NORM_LUT, "backend": FAST_BACKEND, "preview": True, "frame_skip": 4}),
+)
+
+
+class QualityController:
+    def __init__(self, processor, target_latency=0.020, max_drop_rate=0.05, interval=0.5, headroom=0.6,
+                 upgrade_samples=6, settle_samples=2, metrics=None, metrics_prefix="processor"):
+        self.processor = processor
+        self.target_latency = target_latency
+        self.max_drop_rate = max_drop_rate
+        self.interval = interval
+        self.headroom = headroom
+        self.upgrade_samples = upgrade_samples
+        self.settle_samples = settle_samples
+
+        # The configured mode is the top of the ladder; steps that change nothing or cannot be applied are left out
+        self.baseline = {
+            "normalization": processor.get_normalization(),
+            "backend": processor.get_backend_name(),
+            "preview": processor.is_preview(),
+            "frame_skip": processor.get_frame_skip(),
+        }
+        self.levels = []
+        for name, settings in QUALITY_LEVELS:
+            settings = dict(self.baseline, **settings)
+            if processor.worker_pool is not None or processor.isp_chain is not None:
+                settings["normalization"] = self.baseline["normalization"]
+            if self.levels and settings == self.levels[-1][1]:
+                continue
+            self.levels.append((name, settings))
+        self.level = 0
+
+        self.history = deque(maxlen=100)  # (time, level name, reason)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        self.enabled = True
+
+        self._last_sample_time = None
+        self._last_dropped = 0
+        self._last_frames = 0
+        self._good_samples = 0
+        self._settle = 0
+        self._samples = 0
+        self._last_upgrade_sample = None
+        self._backoff = 1
+        self.last_latency = 0.0
+        self.last_drop_rate = 0.0
+
+        self.metrics = metrics if metrics is not None else get_registry()
+        self.metrics.gauge(f"{metrics_prefix}.quality_level", lambda: self.level)
+        self.changes_metric = self.metrics.rate(f"{metrics_prefix}.quality_changes")
+
+    def start(self):
+        self.running = True
+        self._last_sample_time = time.perf_counter()
+        self._last_dropped = self.processor.get_frames_dropped()
+        self._last_frames = self.processor.frames_metric.get_total()
+        self.thread = threading.Thread(target=self._control_loop, daemon=True, name="quality-controller")
+        self.thread.start()
+        print(f"Quality controller started: target latency {self.target_latency * 1000:.1f} ms, "
+              f"levels {[name for name, _ in self.levels]}")
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def set_enabled(self, enabled):
+        """Pause or resume adaptation; disabling restores full quality"""
+        with self.lock:
+            self.enabled = enabled
+            if not enabled:
+                self._set_level(0, "controller disabled")
+
+    def _control_loop(self):
+        while self.running:
+            time.sleep(self.interval)
+            if self.enabled:
+                self.update()
+
+    def _sample(self):
+        """(p95 processing latency of the frames finished since the last sample, input drops per incoming frame)"""
+        now = time.perf_counter()
+        start_times, end_times = self.processor.get_execution_times()
+        latencies = [end - start for start, end in zip(start_times, end_times) if end > self._last_sample_time]
+        latency = float(np.percentile(latencies, 95)) if latencies else 0.0
+
+        dropped = self.processor.get_frames_dropped()
+        frames = self.processor.frames_metric.get_total()
+        new_drops = max(0, dropped - self._last_dropped)
+        new_frames = max(0, frames - self._last_frames)
+        drop_rate = new_drops / (new_drops + new_frames) if new_drops + new_frames else 0.0
+
+        self._last_sample_time = now
+        self._last_dropped = dropped
+        self._last_frames = frames
+        return latency, drop_rate
+
+    def update(self):
+        """Take one sample and step the quality level if needed (called by the control thread)"""
+        # The decision and the processor settings change together, so a concurrent set_enabled(False)
+        # cannot leave the processor on settings of another level
+        with self.lock:
+            if self.enabled:
+                self._update()
+
+    def _update(self):
+        latency, drop_rate = self._sample()
+        self._samples += 1
+        self.last_latency = latency
+        self.last_drop_rate = drop_rate
+        if self._settle:
+            # Let the previous change show up in the measurements first
+            self._settle -= 1
+            return
+
+        overloaded = latency > self.target_latency or drop_rate > self.max_drop_rate
+        if overloaded:
+            self._good_samples = 0
+            if self.level < len(self.levels) - 1:
+                if self._last_upgrade_sample is not None:
+                    # The last upgrade did not hold
+                    self._backoff = min(self._backoff * 2, 16)
+                    self._last_upgrade_sample = None
+                self._set_level(self.level + 1, f"p95 {latency * 1000:.1f} ms, drops {drop_rate:.0%}")
+        elif latency < self.target_latency * self.headroom and drop_rate == 0:
+            self._good_samples += 1
+            if self._last_upgrade_sample is not None and self._samples - self._last_upgrade_sample > 2 * self.upgrade_samples:
+                # The last upgrade held
+                self._backoff = 1
+                self._last_upgrade_sample = None
+            if self._good_samples >= self.upgrade_samples * self._backoff and self.level > 0:
+                self._last_upgrade_sample = self._samples
+                self._set_level(self.level - 1, f"headroom: p95 {latency * 1000:.1f} ms")
+        else:
+            self._good_samples = 0
+
+    def _set_level(self, level, reason):
+        """Switch the level and apply its processor settings; the caller holds self.lock"""
+        if level == self.level:
+            return
+        previous = self.levels[self.level][1]
+        name, settings = self.levels[level]
+        self.level = level
+        self._good_samples = 0
+        self._settle = self.settle_samples
+        self.history.append((time.time(), name, reason))
+
+        if settings["normalization"] != previous["normalization"]:
+            self.processor.set_normalization(settings["normalization"])
+        if settings["backend"] != previous["backend"]:
+            self.processor.set_backend(settings["backend"])
+        if settings["preview"] != previous["preview"]:
+            self.processor.set_preview(settings["preview"])
+        if settings["frame_skip"] != previous["frame_skip"]:
+            self.processor.set_frame_skip(settings["frame_skip"])
+        self.changes_metric.record()
+        print(f"Quality controller: {name} ({reason})")
+
+    def get_level_name(self):
+        return self.levels[self.level][0]
+
+    def get_history(self):
+        """Recent (wall time, level name, reason) changes, oldest first (thread-safe)"""
+        with self.lock:
+            return list(self.history)
@@ -0,0 +1,359 @@
+import mmap
+import numpy as np
+import os
+import struct
+import threading
+import time
+
+from base.frame_pool import wrap_external, wrap_frame
+from base.frame_trace import FrameTrace, get_trace, GENERATED
+from base.metrics import get_registry
+from base.demosaic import DEFAULT_PATTERN
+from base.frame_pacer import FramePacer, PACE_HYBRID
+from base.plot_series import SampleHistory
+
+
+'''
+Raw Bayer stream recording to a preallocated memory-mapped file, and replay.
+
+File layout (little endian):
+  - header, padded to one page: magic, version, height, width, dtype, Bayer
+    pattern, capacity and the number of recorded frames
+  - index: timestamp (float64), source frame number (int64) and Bayer pattern
+    (2 chars) of every frame slot; the header pattern applies to untagged frames
+  - frame data, page aligned: capacity * height * width samples
+
+The file is allocated to its full size up front, so recording only copies
+into the mapping and never grows the file. The frame count in the header is
+updated after each frame's data and index entry, so a recording cut short by a
+crash is still readable up to its last complete frame.
+
+ReplaySource has the same register_callback/start/stop interface as
+ImageGenerator and serves frames zero-copy as read-only views of the mapping,
+at their original timing, at a fixed framerate or as fast as possible. Frames
+are reference counted like pooled buffers: closing the recording only unmaps
+the file once the last frame still held downstream is released.
+'''
+
+MAGIC = b"RAWREC01"
+VERSION = 2
+HEADER_FORMAT = "<8sIII4s2sxxQQ"
+HEADER_SIZE = mmap.PAGESIZE
+INDEX_DTYPE = np.dtype([("timestamp", "<f8"), ("frame_number", "<i8"), ("pattern", "S2")])
+
+REPLAY_ORIGINAL = "original"
+REPLAY_FIXED = "fixed"
+REPLAY_FAST = "fast"
+REPLAY_MODES = (REPLAY_ORIGINAL, REPLAY_FIXED, REPLAY_FAST)
+
+
+def _layout(shape, dtype, capacity):
+    """(index offset, data offset, frame bytes, file size) of a recording"""
+    frame_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    index_offset = HEADER_SIZE
+    data_offset = index_offset + capacity * INDEX_DTYPE.itemsize
+    data_offset += -data_offset % mmap.PAGESIZE
+    return index_offset, data_offset, frame_bytes, data_offset + capacity * frame_bytes
+
+
+class RawRecorder:
+    def __init__(self, path, shape, capacity, dtype=np.uint16, pattern=DEFAULT_PATTERN):
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.pattern = pattern
+        self.capacity = capacity
+
+        index_offset, data_offset, _, file_size = _layout(self.shape, self.dtype, capacity)
+        with open(path, "wb+") as f:
+            f.truncate(file_size)
+            # Reserve the blocks now so a full disk fails here rather than mid-recording
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, file_size)
+            self._mmap = mmap.mmap(f.fileno(), file_size)
+
+        self._index = np.ndarray((capacity,), dtype=INDEX_DTYPE, buffer=self._mmap, offset=index_offset)
+        self._frames = np.ndarray((capacity, *self.shape), dtype=self.dtype, buffer=self._mmap, offset=data_offset)
+        self.frame_count = 0
+        self._write_header()
+
+        self.lock = threading.Lock()
+        self.frame_done_callback = None
+        self.frames_not_recorded = 0
+
+    def _write_header(self):
+        struct.pack_into(HEADER_FORMAT, self._mmap, 0, MAGIC, VERSION, self.shape[0], self.shape[1],
+                         self.dtype.str.encode(), self.pattern.encode(), self.capacity, self.frame_count)
+
+    def record(self, frame, timestamp=None):
+        """Append a Bayer frame (FrameBuffer or array). Returns False once the file is full.
+        Frames are passed on to the registered callback either way."""
+        buffer = wrap_frame(frame)
+        trace = get_trace(buffer)
+        with self.lock:
+            recorded = self.frame_count < self.capacity and self._frames is not None
+            if recorded:
+                index = self.frame_count
+                np.copyto(self._frames[index], buffer.array)
+                self._index[index] = (time.time() if timestamp is None else timestamp, trace.frame_id if trace is not None else index,
+                                      buffer.metadata.get("pattern", self.pattern).encode())
+                self.frame_count += 1
+                self._write_header()
+            else:
+                self.frames_not_recorded += 1
+
+        if self.frame_done_callback:
+            self.frame_done_callback(frame)
+        return recorded
+
+    def register_callback(self, callback):
+        """Pass recorded frames on downstream, e.g. generator -> recorder -> processor"""
+        self.frame_done_callback = callback
+
+    def is_full(self):
+        with self.lock:
+            return self.frame_count >= self.capacity
+
+    def close(self):
+        with self.lock:
+            if self._frames is None:
+                return
+            self._index = None
+            self._frames = None
+            self._mmap.flush()
+            self._mmap.close()
+        print(f"Recorded {self.frame_count} frames to {self.path}")
+
+
+class RawRecording:
+    """Read-only view of a recording; frames are zero-copy views of the mapping"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, height, width, dtype, pattern, capacity, frame_count = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a raw recording (version {VERSION})")
+
+        self.shape = (height, width)
+        self.dtype = np.dtype(dtype.rstrip(b"\0").decode())
+        self.pattern = pattern.decode()
+        self.capacity = capacity
+        self.frame_count = frame_count
+
+        index_offset, data_offset, _, _ = _layout(self.shape, self.dtype, capacity)
+        self.index = np.ndarray((frame_count,), dtype=INDEX_DTYPE, buffer=self._mmap, offset=index_offset)
+        self._frames = np.ndarray((frame_count, *self.shape), dtype=self.dtype, buffer=self._mmap, offset=data_offset)
+
+        # Frames handed out and not yet released; the mapping is closed once none are left
+        self._lock = threading.Lock()
+        self._held = 0
+        self._closed = False
+
+    def __len__(self):
+        return self.frame_count
+
+    def frame(self, index):
+        """FrameBuffer (refcount 1) viewing a recorded frame; release it when done. Held frames stay
+        readable after close(), the mapping is unmapped at their last release."""
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"{self.path} is closed")
+            self._held += 1
+            buffer = wrap_external(self._frames[index], self._release)
+        buffer.metadata["pattern"] = self.pattern_of(index)
+        return buffer
+
+    def _release(self, buffer):
+        buffer.array = None
+        with self._lock:
+            self._held -= 1
+            if self._closed and not self._held:
+                self._mmap.close()
+
+    def pattern_of(self, index):
+        """Bayer layout the frame was recorded with"""
+        return self.index[index]["pattern"].decode() or self.pattern
+
+    def timestamps(self):
+        return self.index["timestamp"]
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self.index = None
+            self._frames = None
+            # numpy does not keep the buffer export, so the frames must be released before the mapping is closed
+            if not self._held:
+                self._mmap.close()
+
+
+class ReplaySource:
+    def __init__(self, path, mode=REPLAY_ORIGINAL, framerate=None, loop=True, pacing=PACE_HYBRID, metrics=None, metrics_prefix="source"):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Unknown replay mode: {mode} (expected one of {REPLAY_MODES})")
+        if mode == REPLAY_FIXED and not framerate:
+            raise ValueError("Fixed-rate replay needs a framerate")
+
+        self.recording = RawRecording(path)
+        if not len(self.recording):
+            raise ValueError(f"{path} contains no frames")
+        self.mode = mode
+        self.loop = loop
+
+        # Original timing is reported as the recording's average rate; fast replay is unpaced (0)
+        duration = float(self.recording.timestamps()[-1] - self.recording.timestamps()[0])
+        if mode == REPLAY_FIXED:
+            self.framerate = framerate
+        elif mode == REPLAY_FAST:
+            self.framerate = 0.0
+        elif len(self.recording) > 1 and duration > 0:
+            self.framerate = (len(self.recording) - 1) / duration
+        else:
+            self.framerate = 0.0
+
+        self.height, self.width = self.recording.shape
+
+        # Deadlines come from the replay schedule; the pacer waits precisely and records lateness/jitter
+        self.pacer = FramePacer(self.framerate, mode=pacing) if self.framerate else None
+
+        self.running = False
+        self.thread = None
+        self.frame_count = 0
+        self.frames_skipped = 0
+        self.last_execution_time = 0
+
+        # Recent (start_time, end_time) tuples for plotting; statistics come from the metrics registry
+        self.execution_times = SampleHistory()
+        self.execution_times_lock = threading.Lock()
+
+        self.metrics = metrics if metrics is not None else get_registry()
+        self.metrics_prefix = metrics_prefix
+        self.frames_metric = self.metrics.rate(f"{metrics_prefix}.frames")
+        self.latency_histogram = self.metrics.histogram(f"{metrics_prefix}.frame_time")
+        self.metrics.gauge(f"{metrics_prefix}.target_fps", lambda: self.framerate)
+        self.metrics.gauge(f"{metrics_prefix}.missed_deadlines", self.get_missed_deadlines)
+        self.metrics.gauge(f"{metrics_prefix}.skipped_frames", self.get_frames_skipped)
+
+        self.frame_done_callback = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.replay_frames)
+        self.thread.start()
+        print(f"Replay started: {self.recording.path}, {len(self.recording)} frames, {self.width}x{self.height}, mode {self.mode}")
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        self.thread = None
+        print(f"Replay stopped. Total frames replayed: {self.frame_count}")
+
+    def _schedule(self):
+        """Offset of every frame from the start of one pass, in seconds"""
+        count = len(self.recording)
+        if self.mode == REPLAY_ORIGINAL:
+            timestamps = self.recording.timestamps()
+            return timestamps - timestamps[0], float(timestamps[-1] - timestamps[0]) + (1.0 / self.framerate if self.framerate else 0.0)
+        if self.mode == REPLAY_FIXED:
+            return np.arange(count) / self.framerate, count / self.framerate
+        return np.zeros(count), 0.0
+
+    def replay_frames(self):
+        offsets, pass_duration = self._schedule()
+        pass_start = time.perf_counter()
+
+        index = 0
+        while self.running:
+            if index == len(self.recording):
+                if not self.loop:
+                    self.running = False
+                    break
+                index = 0
+                pass_start += pass_duration
+
+            # Wait for the frame's slot; when behind, frames go out immediately (and count as missed)
+            if self.pacer is not None:
+                self.pacer.wait_for(pass_start + offsets[index])
+
+            frame_start_time = time.perf_counter()
+            frame = self.recording.frame(index)
+            trace = FrameTrace()
+            trace.stamp(GENERATED, frame_start_time)
+            frame.metadata["trace"] = trace
+            frame_end_time = time.perf_counter()
+
+            with self.execution_times_lock:
+                self.execution_times.append(frame_start_time, frame_end_time)
+                self.last_execution_time = frame_end_time - frame_start_time
+            self.latency_histogram.record(frame_end_time - frame_start_time)
+
+            self.frame_count += 1
+            self.frames_metric.record()
+
+            if self.frame_done_callback:
+                self.frame_done_callback(frame)
+            # Drop the replay thread's reference; the frame stays mapped until consumers are done with it
+            frame.release()
+            index += 1
+
+    def is_running(self):
+        return self.running
+
+    def register_callback(self, callback):
+        self.frame_done_callback = callback
+
+    def get_execution_times(self):
+        """Get a copy of execution times for plotting (thread-safe)"""
+        return self.execution_times.get()
+
+    def get_execution_times_since(self, cursor):
+        """(cursor, start_times, end_times) recorded after cursor, for incremental plotting (thread-safe)"""
+        return self.execution_times.get_since(cursor)
+
+    def get_latency_histogram(self):
+        """Get a snapshot of the execution time histogram (thread-safe)"""
+        return self.latency_histogram.snapshot()
+
+    def get_last_execution_time(self):
+        with self.execution_times_lock:
+            return self.last_execution_time
+
+    def get_fps(self):
+        """Frames replayed per second over the last second (thread-safe)"""
+        return self.frames_metric.get_rate()
+
+    def get_frames_skipped(self):
+        """Replay never skips frames; kept for interface parity with ImageGenerator"""
+        return self.frames_skipped
+
+    def get_missed_deadlines(self):
+        return self.pacer.get_missed_deadlines() if self.pacer is not None else 0
+
+    def get_pacing_summary(self):
+        """Lateness/jitter of the replay schedule (None for unpaced replay)"""
+        return self.pacer.summary() if self.pacer is not None else None
+
+    def get_target_fps(self):
+        return self.framerate
+
+    def reset_statistics(self):
+        """Reset all performance statistics (thread-safe)"""
+        self.execution_times.clear()
+        self.latency_histogram.reset()
+        self.frames_metric.reset()
+
+        if self.pacer is not None:
+            self.pacer.reset_statistics()
+        self.last_execution_time = 0
+        print("Replay statistics reset")
+
+    def close(self):
+        """Unmap the recording (after stop); frames still held downstream stay readable until released"""
+        self.recording.close()
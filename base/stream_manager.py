@@ -0,0 +1,321 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from base.img_generator import ImageGenerator
+from base.raw_recording import ReplaySource, REPLAY_ORIGINAL
+from base.cam_manager import CameraSource
+from base.frame_pool import FramePool, wrap_frame
+from base.frame_queue import FrameQueue, LATEST_ONLY
+from base.frame_trace import FrameTrace, get_trace, GENERATED, ENQUEUED, DEQUEUED, DEMOSAICED, NORMALIZED, DELIVERED
+from base.demosaic import get_backend, DEFAULT_BACKEND, DEFAULT_PATTERN
+from base.normalization import FixedScaleNormalizer, normalize_minmax, NORM_MINMAX, NORM_LUT
+from base.metrics import get_registry
+
+
+'''
+Concurrent capture and processing of several streams.
+
+Every stream has a source (synthetic generator, raw replay or camera), which
+runs its own capture thread, and a bounded FrameQueue with its own
+backpressure policy. One pool of processing threads, sized to the machine,
+serves all streams: demosaic and normalization release the GIL, so the threads
+run in parallel.
+
+Scheduling is round-robin over the streams that have a frame waiting, so a
+fast or high-resolution stream cannot starve the others. A stream can have up
+to max_in_flight frames in processing at once (default: the worker count), so
+a single stream can use the whole machine when the others are idle. Every
+frame gets a sequence number when it is dequeued, and finished frames are
+delivered in that order: a worker that finishes early parks its output until
+the frames before it have been delivered.
+
+Per-stream metrics go to the registry under "stream.<name>." (frames,
+latency from capture to delivery, processing time, queue drops, source fps);
+"streams.frames" counts the aggregate throughput.
+'''
+
+SOURCE_SYNTHETIC = "synthetic"
+SOURCE_REPLAY = "replay"
+SOURCE_CAMERA = "camera"
+SOURCE_KINDS = (SOURCE_SYNTHETIC, SOURCE_REPLAY, SOURCE_CAMERA)
+
+
+def default_worker_count():
+    return max(1, os.cpu_count() or 1)
+
+
+class _Stream:
+    def __init__(self, name, source, queue_policy, queue_size, metrics):
+        self.name = name
+        self.source = source
+        self.queue = FrameQueue(policy=queue_policy, maxsize=queue_size)
+        self.frame_callback = None
+        self.output_pool = None
+
+        # Frames taken by workers and not yet delivered (guarded by the manager's condition)
+        self.in_flight = 0
+        self.next_sequence = 0
+        # In-order delivery: sequence number -> finished output (None if it was dropped)
+        self.deliver_lock = threading.Lock()
+        self.next_delivery = 0
+        self.finished = {}
+
+        prefix = f"stream.{name}"
+        self.frames_metric = metrics.rate(f"{prefix}.frames")
+        self.latency_histogram = metrics.histogram(f"{prefix}.latency")
+        self.processing_histogram = metrics.histogram(f"{prefix}.processing_time")
+        # Frames dropped because the consumer still held every output buffer
+        self.output_dropped_metric = metrics.rate(f"{prefix}.output_dropped")
+        metrics.gauge(f"{prefix}.dropped", self.queue.get_dropped)
+        metrics.gauge(f"{prefix}.source_fps", source.get_fps)
+
+
+class StreamManager:
+    def __init__(self, num_workers=None, queue_policy=LATEST_ONLY, queue_size=2, output_pool_size=2, max_in_flight=None,
+                 backend=DEFAULT_BACKEND, normalization=NORM_MINMAX, bit_depth=12, black_level=0, gamma=1.0,
+                 output_dtype=np.float32, metrics=None):
+        self.num_workers = num_workers or default_worker_count()
+        self.max_in_flight = max_in_flight or self.num_workers
+        self.queue_policy = queue_policy
+        self.queue_size = queue_size
+        self.output_pool_size = output_pool_size
+
+        self.backend = get_backend(backend)
+        self.bit_depth = bit_depth
+        self.output_dtype = np.dtype(output_dtype)
+        self.normalizer = FixedScaleNormalizer(bit_depth, black_level, gamma, self.output_dtype) if normalization == NORM_LUT else None
+
+        self.metrics = metrics if metrics is not None else get_registry()
+        self.frames_metric = self.metrics.rate("streams.frames")
+
+        self.streams = []
+        self._cond = threading.Condition()
+        self._next_stream = 0
+        self.running = False
+        self.workers = []
+
+    # ---- streams ----
+
+    def add_stream(self, name, source):
+        """Add a frame source (register_callback/start/stop interface). Sources created here should record
+        their own metrics under "stream.<name>.source" so streams do not share counters."""
+        if any(stream.name == name for stream in self.streams):
+            raise ValueError(f"Stream {name} already exists")
+        if self.running:
+            raise RuntimeError("Streams can only be added while stopped")
+        stream = _Stream(name, source, self.queue_policy, self.queue_size, self.metrics)
+        source.register_callback(lambda frame: self._enqueue(stream, frame))
+        self.streams.append(stream)
+        return stream
+
+    def add_synthetic(self, name, framerate=100, resolution=(2048, 1536), **options):
+        source = ImageGenerator(framerate=framerate, resolution=resolution, bit_depth=self.bit_depth,
+                                metrics=self.metrics, metrics_prefix=f"stream.{name}.source", **options)
+        return self.add_stream(name, source)
+
+    def add_replay(self, name, path, mode=REPLAY_ORIGINAL, framerate=None, **options):
+        source = ReplaySource(path, mode=mode, framerate=framerate, metrics=self.metrics, metrics_prefix=f"stream.{name}.source", **options)
+        return self.add_stream(name, source)
+
+    def add_camera(self, name, index, framerate=None, fake=None):
+        source = CameraSource(index, framerate=framerate, fake=fake, metrics=self.metrics, metrics_prefix=f"stream.{name}.source")
+        return self.add_stream(name, source)
+
+    def register_frame_callback(self, name, callback):
+        """Receive the processed output FrameBuffers of one stream (valid during the call unless retained)"""
+        self._get_stream(name).frame_callback = callback
+
+    def _get_stream(self, name):
+        for stream in self.streams:
+            if stream.name == name:
+                return stream
+        raise KeyError(f"Unknown stream: {name}")
+
+    # ---- lifecycle ----
+
+    def start(self):
+        self.running = True
+        for stream in self.streams:
+            stream.queue.open()
+            stream.next_sequence = stream.next_delivery = 0
+        self.workers = [threading.Thread(target=self._worker_loop, name=f"stream-worker-{i}", daemon=True) for i in range(self.num_workers)]
+        for worker in self.workers:
+            worker.start()
+        for stream in self.streams:
+            stream.source.start()
+        print(f"Stream manager started: {len(self.streams)} streams, {self.num_workers} workers, "
+              f"up to {self.max_in_flight} frames in flight per stream")
+
+    def stop(self):
+        for stream in self.streams:
+            stream.source.stop()
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        for stream in self.streams:
+            stream.queue.close()
+        print("Stream manager stopped")
+
+    def close(self):
+        """Release the sources' resources (recordings, cameras) after stop"""
+        for stream in self.streams:
+            close = getattr(stream.source, "close", None)
+            if close:
+                close()
+
+    # ---- capture side ----
+
+    def _enqueue(self, stream, frame):
+        """Source thread: queue a frame for processing and wake up a worker"""
+        frame = wrap_frame(frame)
+        trace = get_trace(frame)
+        if trace is None:
+            trace = frame.metadata["trace"] = FrameTrace()
+            trace.stamp(GENERATED)
+        trace.stamp(ENQUEUED)
+        if stream.queue.put(frame.retain()):
+            with self._cond:
+                self._cond.notify()
+
+    # ---- processing side ----
+
+    def _next_frame(self):
+        """Round-robin over the streams with a waiting frame and room in flight.
+        Returns (stream, sequence number, frame), or None once stopped."""
+        with self._cond:
+            while self.running:
+                count = len(self.streams)
+                for offset in range(count):
+                    stream = self.streams[(self._next_stream + offset) % count]
+                    if stream.in_flight >= self.max_in_flight or not len(stream.queue):
+                        continue
+                    frame = stream.queue.get(timeout=0)
+                    if frame is None:
+                        continue
+                    sequence = stream.next_sequence
+                    stream.next_sequence += 1
+                    stream.in_flight += 1
+                    self._next_stream = (self._next_stream + offset + 1) % count
+                    return stream, sequence, frame
+                self._cond.wait()
+            return None
+
+    def _worker_loop(self):
+        rgb_buffers = {}
+        while True:
+            job = self._next_frame()
+            if job is None:
+                break
+            stream, sequence, frame = job
+            output = None
+            try:
+                output = self._process(stream, frame, rgb_buffers)
+            finally:
+                frame.release()
+                delivered = self._deliver(stream, sequence, output)
+                # Frames parked for delivery stay in flight, so they are bounded by max_in_flight too
+                with self._cond:
+                    stream.in_flight -= delivered
+                    # The stream may have more frames waiting
+                    self._cond.notify_all()
+
+    def _get_output_pool(self, stream, rgb_shape):
+        with self._cond:
+            if stream.output_pool is None or not stream.output_pool.matches(rgb_shape, self.output_dtype):
+                # Room for the frames in flight (including the ones parked for in-order delivery) and the consumer's
+                stream.output_pool = FramePool(rgb_shape, self.output_dtype, self.output_pool_size + self.max_in_flight)
+            return stream.output_pool
+
+    def _process(self, stream, frame, rgb_buffers):
+        """Demosaic and normalize one frame; returns the output, or None if no output buffer was free"""
+        start_time = time.perf_counter()
+        trace = get_trace(frame)
+        trace.stamp(DEQUEUED, start_time)
+
+        rgb_shape = self.backend.output_shape(frame.array.shape)
+        # A free output only lacks if the consumer holds more than output_pool_size of them
+        output = self._get_output_pool(stream, rgb_shape).acquire(timeout=0)
+        if output is None:
+            stream.output_dropped_metric.record()
+            return None
+
+        if rgb_shape not in rgb_buffers:
+            rgb_buffers[rgb_shape] = np.empty(rgb_shape, dtype=np.uint16)
+        rgb = rgb_buffers[rgb_shape]
+        self.backend.demosaic(frame.array, rgb, frame.metadata.get("pattern", DEFAULT_PATTERN), self.bit_depth)
+        trace.stamp(DEMOSAICED)
+        if self.normalizer is not None:
+            self.normalizer.apply(rgb, output.array)
+        else:
+            normalize_minmax(rgb, output.array)
+        end_time = time.perf_counter()
+        trace.stamp(NORMALIZED, end_time)
+        trace.add_compute(end_time - start_time)
+
+        output.metadata["stream"] = stream.name
+        output.metadata["trace"] = trace
+        stream.processing_histogram.record(end_time - start_time)
+        return output
+
+    def _deliver(self, stream, sequence, output):
+        """Park a finished frame and deliver every frame that is next in sequence, in order.
+        Returns the number of frames handled (including dropped ones)."""
+        delivered = 0
+        with stream.deliver_lock:
+            stream.finished[sequence] = output
+            while stream.next_delivery in stream.finished:
+                output = stream.finished.pop(stream.next_delivery)
+                stream.next_delivery += 1
+                delivered += 1
+                if output is None:
+                    continue
+                trace = output.metadata["trace"]
+                if stream.frame_callback:
+                    stream.frame_callback(output)
+                trace.stamp(DELIVERED)
+                output.release()
+
+                stream.latency_histogram.record(trace.latency())
+                stream.frames_metric.record()
+                self.frames_metric.record()
+        return delivered
+
+    # ---- statistics ----
+
+    def summary(self):
+        """Aggregate throughput and per-stream fps, drops and latency (ms)"""
+        streams = {}
+        for stream in self.streams:
+            streams[stream.name] = {
+                "fps": stream.frames_metric.get_rate(),
+                "frames": stream.frames_metric.get_total(),
+                "source_fps": stream.source.get_fps(),
+                "dropped": stream.queue.get_dropped(),
+                "output_dropped": stream.output_dropped_metric.get_total(),
+                "latency": stream.latency_histogram.value(),
+                "processing_time": stream.processing_histogram.value(),
+            }
+        return {
+            "streams": len(self.streams),
+            "workers": self.num_workers,
+            "max_in_flight": self.max_in_flight,
+            "fps": self.frames_metric.get_rate(),
+            "frames": self.frames_metric.get_total(),
+            "per_stream": streams,
+        }
+
+    def reset_statistics(self):
+        self.frames_metric.reset()
+        for stream in self.streams:
+            stream.frames_metric.reset()
+            stream.latency_histogram.reset()
+            stream.processing_histogram.reset()
+            stream.output_dropped_metric.reset()
+            stream.queue.reset_dropped()
+            stream.source.reset_statistics()
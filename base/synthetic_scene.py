@@ -0,0 +1,71 @@
+import numpy as np
+
+from base.demosaic import BAYER_PATTERNS, channel_offsets
+
+
+'''
+Synthetic Bayer scene bank.
+
+Builds a contiguous bank of frames up front, so serving a frame costs nothing
+at any framerate. The scene is rendered directly at the CFA sample positions
+(no full RGB image per frame) and moves from frame to frame:
+  - a diagonal colour gradient drifting across the frame
+  - vertical bars sliding sideways (hard edges for the demosaic to interpolate)
+  - a bright disk orbiting the centre
+  - per-sample Gaussian noise
+Frames cycle through the requested Bayer layouts; the layout of every frame is
+returned alongside the bank so sources can tag it as frame metadata.
+
+The bank should be larger than the last-level cache (the default 16 frames at
+2048x1536 are ~100 MB), so the processor reads from memory as it would with a
+live sensor instead of re-reading a cached frame.
+'''
+
+BAR_COUNT = 16
+NOISE_SIGMA = 0.01
+
+
+def _scene_channel(channel, ys, xs, phase):
+    """Scene value in [0, 1] of one RGB channel at normalized coordinates ys, xs"""
+    gradient = (xs + 0.5 * ys + phase) % 1.0
+    if channel == 1:
+        gradient = 1.0 - 0.5 * gradient
+    elif channel == 2:
+        gradient = (ys + phase) % 1.0
+
+    bars = (((xs + 2.0 * phase) * BAR_COUNT) % 1.0 < 0.5).astype(np.float32)
+
+    angle = 2.0 * np.pi * phase
+    cx, cy = 0.5 + 0.25 * np.cos(angle), 0.5 + 0.25 * np.sin(angle)
+    disk = (((xs - cx) ** 2 + (ys - cy) ** 2) < 0.01).astype(np.float32)
+
+    return 0.6 * gradient + 0.25 * bars + 0.15 * disk
+
+
+def build_frame_bank(count, resolution, bit_depth=12, patterns=BAYER_PATTERNS, noise_sigma=NOISE_SIGMA, seed=0):
+    """Render count Bayer frames of resolution (width, height) into one contiguous
+    uint16 array. Returns (bank, patterns), frame i having layout patterns[i % len(patterns)]."""
+    width, height = resolution
+    white_level = (1 << bit_depth) - 1
+    rng = np.random.default_rng(seed)
+
+    bank = np.empty((count, height, width), dtype=np.uint16)
+    frame_patterns = [patterns[i % len(patterns)] for i in range(count)]
+
+    # Normalized coordinates of the four sites of the 2x2 quad
+    ys = np.arange(height, dtype=np.float32)[:, None] / height
+    xs = np.arange(width, dtype=np.float32)[None, :] / width
+
+    for i in range(count):
+        phase = i / count
+        r, g1, g2, b = channel_offsets(frame_patterns[i])
+        for channel, (dy, dx) in ((0, r), (1, g1), (1, g2), (2, b)):
+            site_ys, site_xs = ys[dy::2], xs[:, dx::2]
+            value = _scene_channel(channel, site_ys, site_xs, phase)
+            value = value + rng.standard_normal(value.shape, dtype=np.float32) * noise_sigma
+            np.clip(value * white_level, 0, white_level, out=value)
+            bank[i, dy::2, dx::2] = np.rint(value)
+
+    # Frames are handed out zero-copy; consumers must not write into them
+    bank.flags.writeable = False
+    return bank, frame_patterns
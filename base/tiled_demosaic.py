@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from base.demosaic import DEFAULT_PATTERN
+from base.normalization import output_range
+
+
+'''
+Tiled, multi-threaded demosaic + min/max normalization.
+
+Each Bayer frame is split into horizontal bands whose boundaries are aligned to
+even rows (so every band starts on the same CFA phase). A band is demosaiced
+together with the backend's halo_rows extra rows above and below, which gives
+every interior row the same neighbourhood it has in a full-frame call; the halo
+rows are discarded. Backends with wider support (e.g. VNG) declare a wider
+halo. Normalization needs the global min/max, so it runs as a second parallel
+pass once the per-band extrema have been reduced.
+
+OpenCV releases the GIL inside cvtColor/minMaxLoc/addWeighted, so the bands run
+truly in parallel on a persistent thread pool. The result is bit-identical to
+the full-frame path, e.g. for the OpenCV bilinear backend
+    cv2.normalize(cv2.cvtColor(raw, code), None, 0.0, 1.0, cv2.NORM_MINMAX, dtype=cv2.CV_32F)
+
+With a fixed-scale normalizer there is no global reduction, so each band is
+demosaiced and normalized in a single parallel pass.
+'''
+
+SIMD_ALIGN_ELEMENTS = 64
+
+
+class TiledDemosaicEngine:
+    def __init__(self, num_threads=None, band_height=256):
+        self.num_threads = num_threads or os.cpu_count() or 1
+        # Bands must start on even rows to keep the Bayer phase
+        self.band_height = max(2, band_height + (band_height % 2))
+
+        # Started on first use and stopped by shutdown(), so a stopped processor holds no threads
+        self._executor = None
+
+        self._bands = []
+        self._band_buffers = []
+        self._layout_key = None
+
+    def _prepare(self, shape, halo_rows):
+        """Compute the band layout and allocate one demosaic scratch buffer per band"""
+        # An odd halo would shift the CFA phase of the band
+        halo_rows += halo_rows % 2
+        if self._layout_key == (shape, halo_rows):
+            return
+        height, width = shape
+        self._bands = []
+        self._band_buffers = []
+        for y0 in range(0, height, self.band_height):
+            y1 = min(y0 + self.band_height, height)
+            top = max(0, y0 - halo_rows)
+            bottom = min(height, y1 + halo_rows)
+            self._bands.append((y0, y1, top, bottom))
+            self._band_buffers.append(np.empty((bottom - top, width, 3), dtype=np.uint16))
+        self._layout_key = (shape, halo_rows)
+
+    def _demosaic_band(self, raw, index, backend, pattern, bit_depth):
+        y0, y1, top, bottom = self._bands[index]
+        scratch = self._band_buffers[index]
+        backend.demosaic(raw[top:bottom], scratch, pattern, bit_depth)
+
+        # Extrema of the rows this band owns (halo rows belong to the neighbours)
+        rows = scratch[y0 - top:y1 - top]
+        min_val, max_val, _, _ = cv2.minMaxLoc(rows.reshape(rows.shape[0], -1))
+        return min_val, max_val
+
+    def _process_band_fixed(self, raw, out, index, backend, pattern, bit_depth, normalizer):
+        y0, y1, top, bottom = self._bands[index]
+        scratch = self._band_buffers[index]
+        backend.demosaic(raw[top:bottom], scratch, pattern, bit_depth)
+        normalizer.apply(scratch[y0 - top:y1 - top], out[y0:y1])
+
+    def _normalize_band(self, out, index, scale, shift):
+        y0, y1, top, _ = self._bands[index]
+        src = self._band_buffers[index][y0 - top:y1 - top].reshape(-1)
+        dst = out[y0:y1].reshape(-1)
+
+        if dst.dtype == np.uint8:
+            # cv2.normalize converts to uint8 in single precision, and so does convertScaleAbs
+            # (values are never negative here), so halfway values round the same way in every band
+            cv2.convertScaleAbs(src, dst, alpha=scale, beta=shift)
+            return
+
+        # addWeighted with a zero second weight runs the same fused src * scale + shift
+        # SIMD conversion cv2.normalize uses. Its scalar tail rounds differently, so the
+        # vector-aligned bulk goes through OpenCV and the few leftover values are
+        # converted in double precision, which rounds like the fused path.
+        bulk = len(src) - len(src) % SIMD_ALIGN_ELEMENTS
+        if bulk:
+            cv2.addWeighted(src[:bulk], scale, src[:bulk], 0.0, shift, dst=dst[:bulk], dtype=cv2.CV_32F)
+        if bulk < len(src):
+            dst[bulk:] = src[bulk:] * scale + shift
+
+    def process(self, raw, out, backend, pattern=DEFAULT_PATTERN, bit_depth=12, normalizer=None):
+        """Demosaic raw into out (HxWx3) with a full-resolution backend and normalize it,
+        min/max-based unless a fixed-scale normalizer is given"""
+        if backend.half_resolution:
+            raise ValueError(f"Backend {backend.name} cannot be processed in bands")
+        self._prepare(raw.shape[:2], backend.halo_rows)
+        band_indices = range(len(self._bands))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix="demosaic")
+
+        if normalizer is not None:
+            list(self._executor.map(lambda i: self._process_band_fixed(raw, out, i, backend, pattern, bit_depth, normalizer), band_indices))
+            return out
+
+        extrema = list(self._executor.map(lambda i: self._demosaic_band(raw, i, backend, pattern, bit_depth), band_indices))
+        src_min = min(e[0] for e in extrema)
+        src_max = max(e[1] for e in extrema)
+
+        # Same scale/shift derivation (and float32 rounding) as cv2.normalize with NORM_MINMAX
+        dst_min, dst_max = output_range(out.dtype)
+        scale = (dst_max - dst_min) * (1.0 / (src_max - src_min) if src_max - src_min > np.finfo(np.float64).eps else 0.0)
+        scale = float(np.float32(scale))
+        shift = float(np.float32(dst_min) - np.float32(src_min * scale))
+
+        list(self._executor.map(lambda i: self._normalize_band(out, i, scale, shift), band_indices))
+        return out
+
+    def shutdown(self):
+        """Stop the worker threads; the next process() call starts new ones"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
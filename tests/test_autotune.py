@@ -0,0 +1,39 @@
+import math
+
+import pytest
+
+from base.autotune import _Trial, autotune
+from base.demosaic import DEFAULT_BACKEND
+from base.synthetic_scene import build_frame_bank
+
+
+RESOLUTION = (64, 32)
+
+
+def _trial(warmup_frames):
+    bank, _ = build_frame_bank(2, RESOLUTION, bit_depth=12, patterns=("RG",))
+    return _Trial(bank, 12, frames=3, warmup_frames=warmup_frames, processor_options={})
+
+
+@pytest.mark.parametrize("warmup_frames", [0, 2])
+def test_trial_measures_with_and_without_warmup(warmup_frames):
+    config = {"backend": DEFAULT_BACKEND, "num_threads": 1, "band_height": 256, "output_dtype": "float32"}
+    seconds, output = _trial(warmup_frames).run(config)
+    assert math.isfinite(seconds) and seconds > 0
+    assert output.shape == (RESOLUTION[1], RESOLUTION[0], 3)
+    assert 0.0 <= output.min() and output.max() <= 1.0
+
+
+def test_autotune_without_warmup(tmp_path):
+    config = autotune(RESOLUTION, backends=[DEFAULT_BACKEND], frames=2, warmup_frames=0,
+                      cache_path=str(tmp_path / "autotune.json"))
+    assert config["backend"] == DEFAULT_BACKEND
+    # A second call is served from the cache
+    assert autotune(RESOLUTION, backends=[DEFAULT_BACKEND], frames=2, warmup_frames=0,
+                    cache_path=str(tmp_path / "autotune.json")) == config
+
+
+@pytest.mark.parametrize("frames, warmup_frames", [(0, 3), (2, -1)])
+def test_autotune_rejects_invalid_frame_counts(frames, warmup_frames):
+    with pytest.raises(ValueError):
+        autotune(RESOLUTION, frames=frames, warmup_frames=warmup_frames, cache_path=None)
@@ -0,0 +1,188 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from base import fake_pylon
+from base.cam_manager import CamManager, PROCESSED_POOL_SIZE
+from base.metrics import MetricsRegistry
+
+
+RESOLUTION = (64, 48)
+FPS = 500
+
+
+@pytest.fixture
+def fake_devices(monkeypatch):
+    # set_devices replaces the module's device list; monkeypatch puts the original back
+    monkeypatch.setattr(fake_pylon, "_devices", fake_pylon._devices)
+    fake_pylon.set_devices(1, RESOLUTION, FPS)
+
+
+def _camera(buffers=fake_pylon.MAX_NUM_BUFFER):
+    camera = fake_pylon.InstantCamera(fake_pylon.TlFactory.GetInstance().EnumerateDevices()[0])
+    camera.MaxNumBuffer.SetValue(buffers)
+    camera.Open()
+    return camera
+
+
+def _manager(buffers=fake_pylon.MAX_NUM_BUFFER):
+    manager = CamManager(fake=True, metrics=MetricsRegistry())
+    manager.connect(0)
+    manager.current_cam.MaxNumBuffer.SetValue(buffers)
+    return manager
+
+
+def _free_buffers(camera):
+    with camera._cond:
+        return len(camera._free) + len(camera._ready)
+
+
+def _buffer_index(camera, frame):
+    return next(i for i in range(len(camera._buffers)) if np.shares_memory(frame.array, camera._buffers[i]))
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_buffer_returns_after_the_last_release(fake_devices):
+    manager = _manager(buffers=4)
+    camera = manager.current_cam
+    camera.StartGrabbing(fake_pylon.GrabStrategy_OneByOne)
+    grab_result = camera.RetrieveResult(1000)
+    # No further frames, so the buffer count only changes through the frame below
+    camera.StopGrabbing()
+    free = _free_buffers(camera)
+    assert free == 3
+
+    frame = manager._wrap_grab_result(grab_result)
+    index = _buffer_index(camera, frame)
+    frame.retain()
+    frame.release()
+    assert _free_buffers(camera) == free
+    assert index not in camera._free
+    frame.release()
+    assert _free_buffers(camera) == free + 1
+    assert index in camera._free
+    assert frame.array is None
+    manager.disconnect()
+
+
+def test_retained_frame_keeps_its_buffer(fake_devices):
+    manager = _manager(buffers=3)
+    held = []
+    frames = threading.Semaphore(0)
+
+    def on_frame(frame):
+        if not held:
+            held.append((frame.retain(), frame.array.copy()))
+        frames.release()
+
+    manager.register_callback(on_frame)
+    manager.start_capture(FPS)
+    try:
+        # Far more frames than grab buffers go through while the first one is held
+        for _ in range(20):
+            assert frames.acquire(timeout=10)
+    finally:
+        manager.stop_capture()
+    frame, pixels = held[0]
+    index = _buffer_index(manager.current_cam, frame)
+    assert index not in manager.current_cam._free
+    assert np.array_equal(frame.array, pixels)
+    frame.release()
+    assert index in manager.current_cam._free
+    manager.disconnect()
+
+
+def test_late_release_does_not_exhaust_the_buffers(fake_devices):
+    manager = _manager(buffers=4)
+    held = []
+    lock = threading.Lock()
+    count = [0]
+
+    def on_frame(frame):
+        with lock:
+            count[0] += 1
+            held.append(frame.retain())
+            # The consumer lags two frames behind before releasing
+            if len(held) > 2:
+                held.pop(0).release()
+
+    manager.register_callback(on_frame)
+    manager.start_capture(FPS)
+    try:
+        assert _wait_for(lambda: count[0] >= 50)
+    finally:
+        manager.stop_capture()
+    assert manager.skipped_images < count[0]
+    # Frames released after the capture stopped still hand their buffers back
+    for frame in held:
+        frame.release()
+    assert _free_buffers(manager.current_cam) == 4
+    manager.disconnect()
+
+
+def test_frames_resume_once_held_buffers_are_released(fake_devices):
+    camera = _camera(buffers=2)
+    camera.StartGrabbing(fake_pylon.GrabStrategy_OneByOne)
+    try:
+        results = [camera.RetrieveResult(1000) for _ in range(2)]
+        # Every buffer is held: new frames are lost, not queued
+        with pytest.raises(fake_pylon.TimeoutException):
+            camera.RetrieveResult(50)
+        for result in results:
+            result.Release()
+        result = camera.RetrieveResult(1000)
+        assert result.GrabSucceeded()
+        assert result.GetNumberOfSkippedImages() > 0
+        result.Release()
+    finally:
+        camera.Close()
+
+
+def _processed_count(manager):
+    return manager.processing_histogram.snapshot().get_count()
+
+
+def test_processed_frame_is_a_held_reference_into_the_pool(fake_devices):
+    manager = _manager()
+    manager.start_capture(FPS)
+    try:
+        assert _wait_for(lambda: manager._processed_frame is not None)
+        frame = manager.get_processed_frame()
+        assert frame.pool.count == PROCESSED_POOL_SIZE
+        assert frame.array.shape == (RESOLUTION[1], RESOLUTION[0], 3) and frame.array.dtype == np.float32
+        pixels = frame.array.copy()
+        count = _processed_count(manager)
+        assert _wait_for(lambda: _processed_count(manager) >= count + 20)
+        # Newer frames went to other buffers; the held one is untouched
+        assert np.array_equal(frame.array, pixels)
+        frame.release()
+    finally:
+        manager.stop_capture()
+        manager.disconnect()
+
+
+def test_processed_pool_does_not_run_dry_while_a_frame_is_held(fake_devices):
+    manager = _manager()
+    manager.start_capture(FPS)
+    try:
+        assert _wait_for(lambda: manager._processed_frame is not None)
+        held = manager.get_processed_frame()
+        count = _processed_count(manager)
+        assert _wait_for(lambda: _processed_count(manager) >= count + 50)
+        assert manager.processed_dropped == 0
+        # The caller still gets the newest frame, in a different buffer
+        newest = manager.get_processed_frame()
+        assert newest is not held
+        newest.release()
+        held.release()
+    finally:
+        manager.stop_capture()
+        manager.disconnect()
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from base import frame_pacer as frame_pacer_module
+from base.frame_pacer import (FramePacer, PACE_SLEEP, PACE_HYBRID, SCHEDULE_EXACT, SCHEDULE_SKIP,
+                              ARRIVAL_BURST, ARRIVAL_POISSON)
+
+
+FPS = 100
+INTERVAL = 1.0 / FPS
+
+
+class FakeClock:
+    """perf_counter/sleep stand-in: sleeping advances the clock, sleep(0) by a spin step"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds if seconds > 0 else 1e-5
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(frame_pacer_module, "time", clock)
+    return clock
+
+
+def _offsets(pacer, clock, count, work=0.0):
+    """Deadlines of count frames relative to the first, with work seconds spent after each frame"""
+    deadlines = []
+    for _ in range(count):
+        deadlines.append(pacer.wait())
+        clock.now += work
+    return np.array(deadlines) - deadlines[0]
+
+
+def test_periodic_frames_are_sent_on_time(clock):
+    pacer = FramePacer(FPS, mode=PACE_SLEEP)
+    np.testing.assert_allclose(_offsets(pacer, clock, 5), np.arange(5) * INTERVAL)
+    summary = pacer.summary()
+    assert summary["frames_sent"] == 5
+    assert summary["missed_deadlines"] == 0
+    assert summary["achieved_fps"] == pytest.approx(FPS)
+    assert pacer.lateness_histogram.percentile(100) < 1e-6
+
+
+def test_hybrid_mode_sleeps_then_spins(clock):
+    pacer = FramePacer(FPS, mode=PACE_HYBRID, spin_threshold=0.001)
+    pacer.wait()
+    clock.sleeps.clear()
+    deadline = pacer.wait()
+    # One sleep up to the spin threshold, then yielding spins until the deadline
+    assert clock.sleeps[0] == pytest.approx(INTERVAL - 0.001)
+    assert set(clock.sleeps[1:]) == {0}
+    assert 0 <= clock.now - deadline < 2e-5
+
+
+def test_exact_policy_sends_late_frames_back_to_back(clock):
+    pacer = FramePacer(FPS, mode=PACE_SLEEP, policy=SCHEDULE_EXACT)
+    pacer.wait()
+    clock.now += 3.5 * INTERVAL
+    # Every grid slot is still served; the ones a full interval late count as missed
+    np.testing.assert_allclose(_offsets(pacer, clock, 4), np.arange(4) * INTERVAL)
+    assert pacer.get_missed_deadlines() == 2
+    assert pacer.get_skipped_frames() == 0
+    assert pacer.summary()["frames_sent"] == 5
+
+
+def test_skip_policy_drops_stale_slots(clock):
+    pacer = FramePacer(FPS, mode=PACE_SLEEP, policy=SCHEDULE_SKIP)
+    start = pacer.wait()
+    clock.now += 3.5 * INTERVAL
+    # Slots 1 and 2 are more than an interval in the past: the next frame goes out in slot 3
+    assert pacer.wait() - start == pytest.approx(3 * INTERVAL)
+    assert pacer.get_skipped_frames() == 2
+    assert pacer.get_missed_deadlines() == 2
+    assert pacer.wait() - start == pytest.approx(4 * INTERVAL)
+    assert pacer.get_skipped_frames() == 2
+
+
+def test_burst_arrival_keeps_the_average_rate(clock):
+    pacer = FramePacer(FPS, mode=PACE_SLEEP, arrival=ARRIVAL_BURST, burst_size=4)
+    offsets = _offsets(pacer, clock, 12)
+    np.testing.assert_allclose(offsets, np.repeat([0.0, 4 * INTERVAL, 8 * INTERVAL], 4))
+    assert pacer.get_missed_deadlines() == 0
+
+
+def test_poisson_arrival_is_seeded_with_the_mean_interval(clock):
+    offsets = _offsets(FramePacer(FPS, mode=PACE_SLEEP, arrival=ARRIVAL_POISSON, seed=7), clock, 2000)
+    gaps = np.diff(offsets)
+    assert np.all(gaps >= 0)
+    assert gaps.mean() == pytest.approx(INTERVAL, rel=0.1)
+    # Exponential gaps: the spread is about the mean
+    assert gaps.std() == pytest.approx(INTERVAL, rel=0.15)
+
+    again = _offsets(FramePacer(FPS, mode=PACE_SLEEP, arrival=ARRIVAL_POISSON, seed=7), clock, 2000)
+    np.testing.assert_allclose(again, offsets)
+
+
+def test_external_deadlines_count_misses_and_jitter(clock):
+    pacer = FramePacer(FPS, mode=PACE_SLEEP)
+    start = clock.now
+    pacer.wait_for(start)
+    clock.now = start + 2.5 * INTERVAL
+    pacer.wait_for(start + INTERVAL)  # 1.5 intervals late
+    pacer.wait_for(start + 3 * INTERVAL)  # on time
+    assert pacer.get_missed_deadlines() == 1
+    assert pacer.jitter_histogram.get_count() == 2
+    assert pacer.jitter_histogram.percentile(100) == pytest.approx(1.5 * INTERVAL, rel=0.02)
+
+    pacer.reset_statistics()
+    assert pacer.summary()["frames_sent"] == 0
+    assert pacer.get_missed_deadlines() == 0
+
+
+def test_rejects_unknown_modes():
+    for kwargs in ({"mode": "busy"}, {"policy": "drop"}, {"arrival": "random"}):
+        with pytest.raises(ValueError):
+            FramePacer(FPS, **kwargs)
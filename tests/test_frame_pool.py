@@ -0,0 +1,111 @@
+import threading
+
+import numpy as np
+import pytest
+
+from base.frame_pool import FramePool, SharedFramePool, wrap_frame, wrap_external
+
+
+def test_acquire_until_exhausted():
+    pool = FramePool((4, 4), np.uint16, count=2)
+    first = pool.acquire(timeout=0)
+    second = pool.acquire(timeout=0)
+    assert first is not second
+    assert first.refcount == 1 and second.refcount == 1
+    assert pool.acquire(timeout=0) is None
+    assert pool.exhausted_count == 1
+    assert pool.available() == 0
+
+
+def test_buffer_returns_after_last_release():
+    pool = FramePool((4, 4), np.uint16, count=1)
+    buffer = pool.acquire()
+    buffer.retain()
+    buffer.release()
+    assert pool.available() == 0
+    buffer.release()
+    assert pool.available() == 1
+    assert pool.acquire(timeout=0) is buffer
+
+
+def test_acquire_clears_metadata():
+    pool = FramePool((4, 4), np.uint16, count=1)
+    buffer = pool.acquire()
+    buffer.metadata["pattern"] = "GR"
+    buffer.release()
+    assert pool.acquire().metadata == {}
+
+
+def test_over_release_and_late_retain_raise():
+    pool = FramePool((4, 4), np.uint16, count=1)
+    buffer = pool.acquire()
+    buffer.release()
+    with pytest.raises(RuntimeError):
+        buffer.release()
+    with pytest.raises(RuntimeError):
+        buffer.retain()
+
+
+def test_acquire_waits_for_release():
+    pool = FramePool((4, 4), np.uint16, count=1)
+    buffer = pool.acquire()
+    timer = threading.Timer(0.05, buffer.release)
+    timer.start()
+    try:
+        assert pool.acquire(timeout=5) is buffer
+    finally:
+        timer.join()
+
+
+def test_buffers_are_preallocated():
+    pool = FramePool((3, 5, 3), np.float32, count=2)
+    buffer = pool.acquire()
+    assert buffer.shape == (3, 5, 3)
+    assert buffer.array.dtype == np.float32
+    assert pool.matches((3, 5, 3), np.float32)
+    assert not pool.matches((3, 5, 3), np.uint8)
+
+
+def test_unpooled_buffers_ignore_refcounting():
+    array = np.zeros((2, 2))
+    buffer = wrap_frame(array)
+    assert buffer.array is array
+    assert wrap_frame(buffer) is buffer
+    buffer.retain()
+    buffer.release()
+    buffer.release()
+
+
+def test_external_buffer_returns_to_owner_once():
+    returned = []
+    buffer = wrap_external(np.zeros((2, 2)), returned.append)
+    buffer.retain()
+    buffer.release()
+    assert returned == []
+    buffer.release()
+    assert returned == [buffer]
+    with pytest.raises(RuntimeError):
+        buffer.release()
+
+
+def test_shared_pool_close_keeps_held_buffers_readable():
+    pool = SharedFramePool((4, 4), np.uint16, count=2)
+    held = pool.acquire()
+    held.array[:] = 7
+    free = pool.acquire()
+    free.release()
+
+    pool.close()
+    assert free.array is None
+    np.testing.assert_array_equal(held.array, 7)
+    held.release()
+
+
+def test_shared_pool_unmaps_after_last_release():
+    pool = SharedFramePool((4, 4), np.uint16, count=1)
+    held = pool.acquire()
+    pool.close()
+    assert pool.shm.buf is not None
+    held.release()
+    assert held.array is None
+    assert pool.shm.buf is None
@@ -0,0 +1,86 @@
+import threading
+
+import numpy as np
+import pytest
+
+from base.frame_pool import FramePool
+from base.frame_queue import FrameQueue, LATEST_ONLY, BOUNDED_FIFO, BLOCKING
+
+
+@pytest.fixture
+def pool():
+    return FramePool((2, 2), np.uint16, count=4)
+
+
+def test_latest_only_keeps_newest_and_releases_dropped(pool):
+    dropped = []
+    queue = FrameQueue(LATEST_ONLY, on_drop=dropped.append)
+    first, second = pool.acquire(), pool.acquire()
+    assert queue.put(first)
+    assert queue.put(second)
+    assert dropped == [first]
+    assert queue.get_dropped() == 1
+    assert first.refcount == 0
+    assert queue.get(timeout=0) is second
+
+
+def test_bounded_fifo_drops_new_frames_when_full(pool):
+    queue = FrameQueue(BOUNDED_FIFO, maxsize=2)
+    frames = [pool.acquire() for _ in range(3)]
+    assert queue.put(frames[0]) and queue.put(frames[1])
+    assert not queue.put(frames[2])
+    assert frames[2].refcount == 0
+    assert queue.get_dropped() == 1
+    assert [queue.get(timeout=0), queue.get(timeout=0)] == frames[:2]
+
+
+def test_blocking_producer_waits_for_room(pool):
+    queue = FrameQueue(BLOCKING, maxsize=1)
+    first, second = pool.acquire(), pool.acquire()
+    queue.put(first)
+    timer = threading.Timer(0.05, queue.get)
+    timer.start()
+    try:
+        assert queue.put(second, timeout=5)
+    finally:
+        timer.join()
+    assert queue.get_dropped() == 0
+    assert queue.get(timeout=0) is second
+
+
+def test_blocking_producer_times_out(pool):
+    queue = FrameQueue(BLOCKING, maxsize=1)
+    queue.put(pool.acquire())
+    assert not queue.put(pool.acquire(), timeout=0.01)
+    assert queue.get_dropped() == 1
+
+
+def test_get_times_out_on_empty_queue():
+    assert FrameQueue().get(timeout=0.01) is None
+
+
+def test_close_wakes_consumer_and_releases_pending(pool):
+    waiting = FrameQueue()
+    results = []
+    consumer = threading.Thread(target=lambda: results.append(waiting.get()))
+    consumer.start()
+    waiting.close()
+    consumer.join(timeout=5)
+    assert results == [None]
+
+    queue = FrameQueue(BOUNDED_FIFO, maxsize=2)
+    frame = pool.acquire()
+    queue.put(frame)
+    queue.close()
+    assert frame.refcount == 0
+    assert len(queue) == 0
+    assert not queue.put(pool.acquire())
+    queue.open()
+    assert not queue.is_closed()
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        FrameQueue("lifo")
+    with pytest.raises(ValueError):
+        FrameQueue(BOUNDED_FIFO, maxsize=0)
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from base.frame_pool import wrap_frame
+from base.frame_queue import FrameQueue, BLOCKING, BOUNDED_FIFO, LATEST_ONLY
+from base.frame_trace import FrameTrace, FrameTracer, get_trace, HOPS, GENERATED, ENQUEUED, DEQUEUED, DEMOSAICED, NORMALIZED, DELIVERED
+from base.img_processor import ImageProcessor
+from base.metrics import MetricsRegistry
+
+
+def _traced_frame(frame_id, seed=0):
+    frame = wrap_frame(np.random.default_rng(seed).integers(0, 4096, (48, 64), dtype=np.uint16))
+    trace = frame.metadata["trace"] = FrameTrace(frame_id)
+    trace.stamp(GENERATED)
+    return frame
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+@pytest.mark.parametrize("options", [{}, {"pipelined": True}, {"num_threads": 2, "band_height": 16}])
+def test_hops_are_stamped_in_order(options):
+    processor = ImageProcessor(queue_policy=BLOCKING, metrics=MetricsRegistry(), **options)
+    traces = []
+    processor.register_frame_callback(lambda output: traces.append(get_trace(output)))
+    processor.start()
+    try:
+        for i in range(3):
+            processor.set_raw_frame(_traced_frame(i, seed=i))
+        assert _wait_for(lambda: processor.get_trace_summary()["end_to_end"]["count"] == 3)
+    finally:
+        processor.stop()
+
+    assert [trace.frame_id for trace in traces] == [0, 1, 2]
+    for trace in traces:
+        assert list(trace.timestamps) == [GENERATED, ENQUEUED, DEQUEUED, DEMOSAICED, NORMALIZED, DELIVERED]
+        times = [trace.timestamps[hop] for hop in HOPS if hop in trace.timestamps]
+        assert times == sorted(times)
+        assert 0 < trace.compute_time <= trace.latency()
+
+
+@pytest.mark.parametrize("policy, dropped_ids", [(LATEST_ONLY, [0, 1]), (BOUNDED_FIFO, [1, 2])])
+def test_queue_drops_are_blamed_on_its_stage(policy, dropped_ids):
+    tracer = FrameTracer()
+    queue = FrameQueue(policy=policy, maxsize=1, on_drop=lambda frame: tracer.drop(get_trace(frame), "some_stage"))
+    for i in range(3):
+        queue.put(_traced_frame(i))
+    assert tracer.get_recent_drops() == [(frame_id, "some_stage") for frame_id in dropped_ids]
+    assert tracer.get_dropped() == {"some_stage": 2}
+    queue.close()
+
+
+def test_pipelined_drops_are_blamed_on_the_queue_that_dropped_them():
+    processor = ImageProcessor(queue_policy=BLOCKING, queue_size=1, put_timeout=0.05, pipelined=True, stage_queue_size=1,
+                               metrics=MetricsRegistry())
+    gate = threading.Event()
+    # A stalled consumer: the deliver stage blocks on the first frame
+    processor.register_callback(lambda image: gate.wait())
+    processor.start()
+    try:
+        # Frame 0 in the callback, 1 in the deliver queue, 2 held by the normalize stage,
+        # 3 in the normalize queue, 4 held by the demosaic stage, 5 in the input queue
+        for i in range(6):
+            processor.set_raw_frame(_traced_frame(i, seed=i))
+        assert _wait_for(lambda: len(processor.frame_queue) == 1 and len(processor._normalize_queue) == 1
+                         and len(processor._deliver_queue) == 1)
+        # No room at the input: the source times out and the frames are dropped there
+        for i in range(6, 8):
+            processor.set_raw_frame(_traced_frame(i, seed=i))
+        assert processor.get_trace_drops() == {"input_queue": 2}
+    finally:
+        # Closing the stage queues drops the frames the stages were blocked on; the consumer resumes after that
+        threading.Timer(0.2, gate.set).start()
+        processor.stop()
+    drops = processor.tracer.get_recent_drops()
+    assert drops[:2] == [(6, "input_queue"), (7, "input_queue")]
+    assert sorted(drops[2:]) == [(2, "deliver_queue"), (4, "normalize_queue")]
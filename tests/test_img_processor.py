@@ -0,0 +1,66 @@
+import threading
+
+import numpy as np
+
+from base.img_processor import ImageProcessor, OUTPUT_DISPLAY, OUTPUT_FULL
+from base.frame_queue import BLOCKING
+from base.metrics import MetricsRegistry
+
+
+HEIGHT, WIDTH = 48, 64
+
+
+def _raw_frame(seed=0):
+    return np.random.default_rng(seed).integers(0, 4096, (HEIGHT, WIDTH), dtype=np.uint16)
+
+
+def _run_one(processor, raw):
+    """Process one frame; returns (display buffer array copies with their targets, full-resolution images)"""
+    displays = []
+    full = []
+    done = threading.Event()
+
+    def on_display(output):
+        displays.append((output.metadata["target"], output.array.copy()))
+        if not processor.full_frame_callback or full:
+            done.set()
+
+    def on_full(image):
+        full.append(image.copy())
+        if displays:
+            done.set()
+
+    processor.register_frame_callback(on_display)
+    if processor.preview:
+        processor.register_full_frame_callback(on_full)
+    processor.start()
+    try:
+        processor.set_raw_frame(raw)
+        assert done.wait(timeout=10)
+    finally:
+        processor.stop()
+    return displays, full
+
+
+def test_preview_display_is_binned_and_full_frame_matches_normal_mode():
+    raw = _raw_frame()
+    [(_, reference)], _ = _run_one(ImageProcessor(queue_policy=BLOCKING, metrics=MetricsRegistry()), raw)
+    assert reference.shape == (HEIGHT, WIDTH, 3)
+
+    processor = ImageProcessor(queue_policy=BLOCKING, preview=True, metrics=MetricsRegistry())
+    displays, full = _run_one(processor, raw)
+    [(target, preview)] = displays
+    assert target == OUTPUT_DISPLAY
+    assert preview.shape == (HEIGHT // 2, WIDTH // 2, 3)
+    assert processor.get_display_shape((HEIGHT, WIDTH)) == preview.shape
+    # The full-resolution consumer gets the image the processor produces without preview
+    [image] = full
+    np.testing.assert_array_equal(image, reference.ravel())
+
+
+def test_preview_without_full_frame_consumer_skips_the_full_resolution_pass():
+    processor = ImageProcessor(queue_policy=BLOCKING, preview=True, metrics=MetricsRegistry())
+    plan = processor._output_plan()
+    assert [target for _, target in plan] == [OUTPUT_DISPLAY]
+    processor.register_full_frame_callback(lambda image: None)
+    assert [target for _, target in processor._output_plan()] == [OUTPUT_DISPLAY, OUTPUT_FULL]
@@ -0,0 +1,136 @@
+import cv2
+import numpy as np
+import pytest
+
+from base.isp_chain import IspChain, BlackLevel, WhiteBalance, ColorMatrix, Gamma, ToneCurve, Resize, DEFAULT_CCM, parse_chain
+
+
+BIT_DEPTH = 12
+WHITE = (1 << BIT_DEPTH) - 1
+SHAPE = (24, 32, 3)
+
+
+def _rgb(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, WHITE + 1, SHAPE, dtype=np.uint16)
+
+
+def _reference(ops, rgb, dtype):
+    """Op-by-op float64 reference: linear ops in sensor units, clipped once to the sensor range, then the tone curves"""
+    values = rgb.astype(np.float64)
+    linear_done = False
+    for op in ops:
+        if op.kind == "linear":
+            matrix, offset = op.affine(WHITE)
+            values = values @ matrix.T + offset
+            continue
+        if not linear_done:
+            values = np.clip(values, 0, WHITE) / WHITE
+            linear_done = True
+        if op.kind == "tone":
+            values = np.clip(op.curve(values), 0.0, 1.0)
+        else:
+            width, height = op.output_size(values.shape[1], values.shape[0])
+            values = cv2.resize(values, (width, height), interpolation=op.interpolation)
+    if not linear_done:
+        values = np.clip(values, 0, WHITE) / WHITE
+    if np.dtype(dtype) == np.uint8:
+        return np.rint(values * 255).astype(np.uint8)
+    return values.astype(np.float32)
+
+
+def _run(ops, rgb, dtype):
+    chain = IspChain(ops, bit_depth=BIT_DEPTH, dtype=dtype)
+    out = np.empty(chain.output_shape(rgb.shape), dtype=dtype)
+    chain.apply(rgb, out)
+    return chain, out
+
+
+def _check(ops, dtype, float_tolerance=1e-3):
+    rgb = _rgb()
+    chain, out = _run(ops, rgb, dtype)
+    expected = _reference(ops, rgb, dtype)
+    assert out.shape == expected.shape and out.dtype == np.dtype(dtype)
+    if np.dtype(dtype) == np.uint8:
+        assert np.abs(out.astype(np.int16) - expected).max() <= 1
+    else:
+        np.testing.assert_allclose(out, expected, atol=float_tolerance)
+        assert out.min() >= 0.0 and out.max() <= 1.0
+    return chain
+
+
+CHAINS = {
+    "empty": [],
+    "black_level": [BlackLevel(64)],
+    "uniform_gain": [WhiteBalance(1.5, 1.5, 1.5)],
+    "black_level_gain": [BlackLevel(64), WhiteBalance(1.3, 1.3, 1.3)],
+    "full": [BlackLevel(64), WhiteBalance(1.9, 1.0, 1.6), ColorMatrix(DEFAULT_CCM), Gamma(2.2)],
+    "gamma_only": [Gamma(2.2)],
+    "tone_curves": [WhiteBalance(1.2, 1.0, 0.8), Gamma(2.2), ToneCurve(lambda x: x * x, name="square")],
+}
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+@pytest.mark.parametrize("name", sorted(CHAINS))
+def test_fused_chain_matches_op_by_op_reference(name, dtype):
+    _check(CHAINS[name], dtype)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+def test_uniform_gain_saturates_at_white(dtype):
+    rgb = np.full(SHAPE, WHITE, dtype=np.uint16)
+    _, out = _run([WhiteBalance(2.0, 2.0, 2.0)], rgb, dtype)
+    assert np.all(out == (1.0 if dtype == np.float32 else 255))
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+def test_lut_and_scale_paths_agree(dtype):
+    # An identity tone curve forces the LUT path for the same mapping
+    rgb = _rgb(1)
+    _, scaled = _run([BlackLevel(64), WhiteBalance(1.4, 1.4, 1.4)], rgb, dtype)
+    _, looked_up = _run([BlackLevel(64), WhiteBalance(1.4, 1.4, 1.4), ToneCurve(lambda x: x)], rgb, dtype)
+    if dtype == np.uint8:
+        assert np.abs(scaled.astype(np.int16) - looked_up).max() <= 1
+    else:
+        np.testing.assert_allclose(scaled, looked_up, atol=1e-5)
+
+
+def test_passes_are_fused():
+    assert [p.name for p in IspChain(CHAINS["full"]).passes] == ["transform(black_level+white_balance+ccm)", "lut(gamma)"]
+    # Uniform linear operations fold into the final pass
+    assert [p.name for p in IspChain(CHAINS["black_level_gain"]).passes] == ["scale(black_level+white_balance)"]
+    assert [p.name for p in IspChain([]).passes] == ["scale(normalize)"]
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+def test_resize_before_tone_runs_on_linear_data(dtype):
+    ops = [WhiteBalance(1.2, 1.0, 0.9), Resize(scale=0.5), Gamma(2.2)]
+    chain = _check(ops, dtype, float_tolerance=5e-3)
+    assert [p.name for p in chain.passes] == ["transform(white_balance)", "resize", "lut(gamma)"]
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+def test_resize_after_tone_runs_last(dtype):
+    ops = [BlackLevel(64), Gamma(2.2), Resize(size=(16, 12))]
+    chain = _check(ops, dtype, float_tolerance=5e-3)
+    assert [p.name for p in chain.passes] == ["lut(black_level+gamma)", "resize"]
+    assert chain.output_shape(SHAPE) == (12, 16, 3)
+
+
+def test_invalid_chains():
+    with pytest.raises(ValueError):
+        IspChain([Gamma(2.2), BlackLevel(64)])
+    with pytest.raises(ValueError):
+        IspChain([Resize(scale=0.5), Resize(scale=0.5)])
+    with pytest.raises(ValueError):
+        Resize()
+
+
+def test_parse_chain():
+    chain = parse_chain("black_level:64,white_balance:1.9:1.0:1.6,ccm,gamma:2.2,resize:16x12")
+    assert [op.name for op in chain.ops] == ["black_level", "white_balance", "ccm", "gamma", "resize"]
+    assert chain.resize.size == (16, 12)
+    assert parse_chain("resize:0.5").resize.scale == 0.5
+    for text in ("resize", "black_level", "sharpen:1"):
+        with pytest.raises(ValueError):
+            parse_chain(text)
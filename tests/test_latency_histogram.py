@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from base.latency_histogram import LatencyHistogram, SUB_BUCKET_COUNT, _bucket_index, _bucket_value
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.get_count() == 0
+    assert histogram.percentile(50) is None
+    assert histogram.summary()["p99_ms"] is None
+
+
+def test_small_values_are_exact():
+    for value_ns in range(SUB_BUCKET_COUNT):
+        assert _bucket_value(_bucket_index(value_ns)) == value_ns
+
+
+@pytest.mark.parametrize("value_ns", [200, 1_000, 123_456, 20_000_000, 7_000_000_000])
+def test_bucket_relative_error(value_ns):
+    assert abs(_bucket_value(_bucket_index(value_ns)) - value_ns) / value_ns < 2.0 / SUB_BUCKET_COUNT
+
+
+def test_percentiles_match_numpy():
+    samples = np.random.default_rng(0).lognormal(-6, 1, 20_000)
+    histogram = LatencyHistogram()
+    for sample in samples:
+        histogram.record(sample)
+    for percent, value in zip((50, 95, 99), histogram.percentiles([50, 95, 99])):
+        expected = np.percentile(samples, percent)
+        assert value == pytest.approx(expected, rel=0.02)
+
+
+def test_extremes_and_mean_are_exact():
+    histogram = LatencyHistogram()
+    for seconds in (0.001, 0.002, 0.009):
+        histogram.record(seconds)
+    summary = histogram.summary()
+    assert summary["count"] == 3
+    assert summary["max_ms"] == pytest.approx(9.0)
+    assert summary["mean_ms"] == pytest.approx(4.0)
+    assert histogram.percentile(100) == pytest.approx(0.009, rel=0.02)
+    assert histogram.percentile(0) == pytest.approx(0.001, rel=0.02)
+
+
+def test_large_values_are_clamped_into_top_bucket():
+    histogram = LatencyHistogram()
+    histogram.record(10_000.0)
+    assert histogram.get_count() == 1
+    assert histogram.summary()["max_ms"] == pytest.approx(10_000_000.0)
+
+
+def test_merge_copy_and_reset():
+    first, second = LatencyHistogram(), LatencyHistogram()
+    first.record(0.001)
+    second.record(0.003)
+    merged = LatencyHistogram.merged([first, second])
+    assert merged.get_count() == 2
+    assert merged.summary()["max_ms"] == pytest.approx(3.0)
+
+    snapshot = first.copy()
+    first.record(0.005)
+    assert snapshot.get_count() == 1
+
+    first.reset()
+    assert first.get_count() == 0
+    assert first.percentile(50) is None
@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+from base import metrics as metrics_module
+from base.metrics import MetricsRegistry, RateCounter, Histogram
+
+
+class FakeTime:
+    # Mid-bucket, so 0.1 s steps never land on a bucket boundary
+    def __init__(self, now=1000.05):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(metrics_module, "time", clock)
+    return clock
+
+
+def _on_threads(count, function):
+    threads = [threading.Thread(target=function) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_rate_counts_full_buckets_of_the_window(clock):
+    counter = RateCounter(window=1.0, buckets=10)
+    counter.record(5)
+    # The bucket in progress is not counted yet
+    assert counter.get_rate() == 0
+    clock.now += 0.1
+    assert counter.get_rate() == pytest.approx(5.0)
+    counter.record(3)
+    clock.now += 0.1
+    assert counter.get_rate() == pytest.approx(8.0)
+
+
+def test_rate_window_rolls_over(clock):
+    counter = RateCounter(window=1.0, buckets=10)
+    counter.record(4)
+    clock.now += 1.0
+    assert counter.get_rate() == pytest.approx(4.0)
+    # The first bucket falls out of the window; its ring slot is reused for new events
+    clock.now += 0.1
+    assert counter.get_rate() == 0
+    counter.record(2)
+    clock.now += 0.1
+    assert counter.get_rate() == pytest.approx(2.0)
+    assert counter.get_total() == 6
+
+    counter.reset()
+    assert counter.get_total() == 0 and counter.get_rate() == 0
+
+
+def test_rate_merges_shards_of_finished_threads(clock):
+    counter = RateCounter(window=1.0, buckets=10)
+    counter.record(1)
+    _on_threads(4, lambda: counter.record(2))
+    assert counter.shard_count() == 1  # only the test thread is still alive
+    clock.now += 0.1
+    assert counter.get_rate() == pytest.approx(9.0)
+    assert counter.get_total() == 9
+
+
+def test_retired_rate_shard_keeps_newest_buckets(clock):
+    counter = RateCounter(window=1.0, buckets=10)
+    _on_threads(1, lambda: counter.record(7))
+    counter.get_total()  # retires the first thread's shard
+    # A full window later the same ring slot holds a newer bucket
+    clock.now += 1.0
+    _on_threads(1, lambda: counter.record(1))
+    clock.now += 0.1
+    assert counter.get_rate() == pytest.approx(1.0)
+    assert counter.get_total() == 8
+
+
+def test_shards_stay_bounded_across_thread_restarts():
+    counter = RateCounter()
+    histogram = Histogram()
+
+    def work():
+        counter.record()
+        histogram.record(0.001)
+
+    for _ in range(20):
+        _on_threads(3, work)
+    assert counter.shard_count() == 0
+    assert histogram.shard_count() == 0
+    assert counter.get_total() == 60
+    assert histogram.snapshot().get_count() == 60
+
+
+def test_histogram_merges_live_and_retired_shards():
+    histogram = Histogram()
+    histogram.record(0.010)
+    _on_threads(2, lambda: histogram.record(0.020))
+    snapshot = histogram.snapshot()
+    assert snapshot.get_count() == 3
+    assert snapshot.percentile(100) == pytest.approx(0.020, rel=0.01)
+    assert histogram.shard_count() == 1
+
+    histogram.reset()
+    assert histogram.snapshot().get_count() == 0
+
+
+def test_registry_snapshot_and_kind_conflicts():
+    registry = MetricsRegistry()
+    registry.rate("a.frames").record(3)
+    registry.gauge("a.level", lambda: 2)
+    registry.histogram("b.latency").record(0.005)
+    assert registry.rate("a.frames") is registry.get("a.frames")
+    assert registry.names("a.") == ["a.frames", "a.level"]
+    snapshot = registry.snapshot()
+    assert snapshot["a.frames"]["total"] == 3
+    assert snapshot["a.level"] == 2
+    with pytest.raises(ValueError):
+        registry.histogram("a.frames")
@@ -0,0 +1,151 @@
+import csv
+import json
+import urllib.request
+
+import pytest
+
+from base.metrics import MetricsRegistry
+from base.metrics_exporter import MetricsExporter, RotatingFile, format_prometheus, flatten, prometheus_name
+
+
+def _registry():
+    registry = MetricsRegistry()
+    registry.rate("app.frames").record(5)
+    registry.gauge("app.level", lambda: 2)
+    registry.gauge("app.enabled", lambda: True)
+    registry.gauge("app.name", lambda: "full")
+    registry.gauge("app.unbounded", lambda: float("inf"))
+    latency = registry.histogram("app.latency")
+    for seconds in (0.010, 0.020, 0.030):
+        latency.record(seconds)
+    registry.histogram("app.idle")
+    return registry
+
+
+def _samples(text):
+    """{series: value} of the non-comment lines"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            samples[series] = float(value)
+    return samples
+
+
+def test_prometheus_names():
+    assert prometheus_name("processor.stage.demosaic") == "imgproc_processor_stage_demosaic"
+    assert prometheus_name("stream-1.frames") == "imgproc_stream_1_frames"
+
+
+def test_format_prometheus():
+    text = format_prometheus(_registry().snapshot("app."))
+    samples = _samples(text)
+    assert "# TYPE imgproc_app_frames_total counter" in text
+    assert samples["imgproc_app_frames_total"] == 5
+    assert "imgproc_app_frames_per_second" in samples
+    assert samples["imgproc_app_level"] == 2
+    assert samples["imgproc_app_enabled"] == 1
+    # Values that are not finite numbers are left out
+    assert "imgproc_app_name" not in samples and "imgproc_app_unbounded" not in samples
+
+    assert "# TYPE imgproc_app_latency_seconds summary" in text
+    assert samples['imgproc_app_latency_seconds{quantile="0.5"}'] == pytest.approx(0.020, rel=0.02)
+    assert samples["imgproc_app_latency_seconds_count"] == 3
+    assert samples["imgproc_app_latency_seconds_sum"] == pytest.approx(0.060, rel=0.02)
+    assert samples["imgproc_app_latency_seconds_max"] == pytest.approx(0.030, rel=0.02)
+    # An empty histogram has no quantiles
+    assert not any(series.startswith("imgproc_app_idle_seconds{") for series in samples)
+    assert samples["imgproc_app_idle_seconds_count"] == 0
+
+
+def test_flatten():
+    row = flatten({"a.frames": {"rate": 1.5, "total": 3}, "a.level": 2, "a.name": None})
+    assert row == {"a.frames.rate": 1.5, "a.frames.total": 3, "a.level": 2, "a.name": None}
+
+
+def test_rotating_file_numbering(tmp_path):
+    path = str(tmp_path / "logs" / "metrics.jsonl")
+    rotating = RotatingFile(path, max_bytes=4, backups=2)
+    for text in ("first\n", "second\n", "third\n", "fourth\n"):
+        rotating.write(text)
+    # path.1 is the newest backup; the oldest beyond the backup count is dropped
+    assert open(path).read() == "fourth\n"
+    assert open(path + ".1").read() == "third\n"
+    assert open(path + ".2").read() == "second\n"
+    assert not (tmp_path / "logs" / "metrics.jsonl.3").exists()
+
+
+def test_rotating_file_without_backups(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    rotating = RotatingFile(str(path), max_bytes=4, backups=0)
+    rotating.write("first\n")
+    rotating.write("second\n")
+    assert path.read_text() == "second\n"
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.jsonl"]
+
+
+def test_jsonl_snapshots_are_batched(tmp_path):
+    registry = _registry()
+    path = tmp_path / "metrics.jsonl"
+    exporter = MetricsExporter(registry, jsonl_path=str(path), prefix="app.")
+    exporter.collect()
+    exporter.collect()
+    assert not path.exists()
+    exporter.flush()
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 2
+    assert records[0]["metrics"]["app.frames"]["total"] == 5
+    assert registry.histogram("exporter.collect_time").snapshot().get_count() == 2
+
+
+def test_csv_rotates_when_columns_change(tmp_path):
+    registry = _registry()
+    path = tmp_path / "metrics.csv"
+    exporter = MetricsExporter(registry, csv_path=str(path), prefix="app.")
+    exporter.collect()
+    exporter.flush()
+    exporter.collect()
+    registry.gauge("app.extra").set(7)
+    exporter.collect()
+    exporter.flush()
+
+    old = (tmp_path / "metrics.csv.1").read_text().splitlines()
+    new = path.read_text().splitlines()
+    # Every file has one header matching its rows
+    assert len(old) == 3 and len(new) == 2
+    assert "app.extra" not in old[0] and "app.extra" in new[0].split(",")
+    assert new[0].split(",")[0] == "time"
+    assert len(new[1].split(",")) == len(new[0].split(","))
+    assert new[1].split(",")[new[0].split(",").index("app.extra")] == "7"
+
+
+def test_csv_quotes_values_with_commas(tmp_path):
+    registry = _registry()
+    registry.gauge("app.levels", lambda: "full, fixed_scale")
+    registry.gauge("app.reason", lambda: 'p95 "slow"\nand dropping')
+    path = tmp_path / "metrics.csv"
+    exporter = MetricsExporter(registry, csv_path=str(path), prefix="app.")
+    exporter.collect()
+    exporter.collect()
+    exporter.flush()
+
+    with open(path, newline="") as f:
+        header, *rows = list(csv.reader(f))
+    assert len(rows) == 2
+    assert all(len(row) == len(header) for row in rows)
+    assert rows[0][header.index("app.levels")] == "full, fixed_scale"
+    assert rows[1][header.index("app.reason")] == 'p95 "slow"\nand dropping'
+    assert rows[0][header.index("app.name")] == "full"
+
+
+def test_prometheus_endpoint_serves_the_latest_snapshot():
+    exporter = MetricsExporter(_registry(), interval=60, prometheus_port=0, prefix="app.")
+    exporter.start()
+    try:
+        exporter.collect()
+        port = exporter.server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode()
+        assert _samples(body)["imgproc_app_frames_total"] == 5
+    finally:
+        exporter.stop()
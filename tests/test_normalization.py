@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from base.normalization import FixedScaleNormalizer, build_normalization_lut
+
+
+def _every_uint16_value():
+    return np.repeat(np.arange(1 << 16, dtype=np.uint16), 3).reshape(256, 256, 3)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+@pytest.mark.parametrize("black_level", [0, 64])
+@pytest.mark.parametrize("bit_depth", [10, 12])
+def test_affine_path_matches_lut_over_full_range(bit_depth, black_level, dtype):
+    normalizer = FixedScaleNormalizer(bit_depth=bit_depth, black_level=black_level, dtype=dtype)
+    assert normalizer.is_affine
+    rgb = _every_uint16_value()
+    expected = np.take(normalizer.lut, rgb)
+
+    out = np.empty(rgb.shape, dtype=dtype)
+    normalizer.apply(rgb.copy(), out)
+    if np.dtype(dtype) == np.uint8:
+        assert np.array_equal(out, expected)
+    else:
+        np.testing.assert_allclose(out, expected, atol=1e-6)
+        assert out.max() == 1.0
+
+
+def test_lut_saturates_outside_black_and_white_levels():
+    lut = build_normalization_lut(bit_depth=12, black_level=64, gamma=2.2)
+    assert lut[0] == lut[64] == 0.0
+    assert lut[4095] == lut[65535] == 1.0
+    assert np.all(np.diff(lut[64:4096]) > 0)
+
+
+def test_gamma_uses_the_table():
+    normalizer = FixedScaleNormalizer(bit_depth=12, gamma=2.2, dtype=np.uint8)
+    rgb = _every_uint16_value()
+    out = np.empty(rgb.shape, dtype=np.uint8)
+    assert not normalizer.is_affine
+    assert np.array_equal(normalizer.apply(rgb, out), np.take(normalizer.lut, rgb))
+
+
+def test_rejects_black_level_outside_range():
+    with pytest.raises(ValueError):
+        build_normalization_lut(bit_depth=12, black_level=4095)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from base.plot_series import PlotSeries, SampleHistory
+
+
+def test_history_returns_only_new_samples():
+    history = SampleHistory(maxlen=5)
+    history.append(0.0, 1.0)
+    history.append(1.0, 2.0)
+    cursor, starts, ends = history.get_since(0)
+    assert (cursor, starts, ends) == (2, [0.0, 1.0], [1.0, 2.0])
+
+    assert history.get_since(cursor) == (2, [], [])
+    history.append(2.0, 3.0)
+    assert history.get_since(cursor) == (3, [2.0], [3.0])
+
+
+def test_history_cursor_survives_overflow_and_clear():
+    history = SampleHistory(maxlen=3)
+    for i in range(10):
+        history.append(i, i + 1)
+    # Samples that fell out of the window are gone; the newest ones come back in order
+    assert history.get_since(2) == (10, [7, 8, 9], [8, 9, 10])
+    history.clear()
+    assert history.get_since(10) == (10, [], [])
+    history.append(20, 21)
+    assert history.get_since(10) == (11, [20], [21])
+    assert history.get() == ([20], [21])
+
+
+def test_history_with_more_fields():
+    history = SampleHistory(fields=4)
+    assert history.get() == ([], [], [], [])
+    history.append(1, 2, 3, 4)
+    assert history.get_since(0) == (1, [1], [2], [3], [4])
+
+
+def test_series_moving_average():
+    series = PlotSeries(capacity=10, window=2, scale=1.0)
+    assert series.update([1.0, 2.0, 3.0], [2.0, 4.0, 6.0], reference_time=1.0)
+    times, averages = series.get_data()
+    np.testing.assert_allclose(times, [0.0, 1.0, 2.0])
+    np.testing.assert_allclose(averages, [2.0, 3.0, 5.0])
+
+    # Samples already seen are ignored
+    assert not series.update([3.0], [100.0])
+    assert series.update([4.0], [8.0], reference_time=1.0)
+    assert series.get_data()[1][-1] == pytest.approx(7.0)
+
+
+def test_series_keeps_capacity_window():
+    series = PlotSeries(capacity=4, window=1, scale=1.0)
+    for i in range(10):
+        series.update([float(i)], [float(i)])
+    times, averages = series.get_data()
+    np.testing.assert_allclose(times, [6.0, 7.0, 8.0, 9.0])
+    np.testing.assert_allclose(averages, [6.0, 7.0, 8.0, 9.0])
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from base.img_processor import ImageProcessor
+from base.frame_queue import BLOCKING
+from base.metrics import MetricsRegistry
+from base.normalization import NORM_LUT, NORM_MINMAX
+
+
+SHAPE = (48, 64)
+
+
+def _raw_frames(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 4096, SHAPE, dtype=np.uint16) for _ in range(count)]
+
+
+def _run(processor, frames, expected=None, timeout=30):
+    """Start the processor, feed frames and return copies of the delivered images once expected arrived"""
+    expected = len(frames) if expected is None else expected
+    outputs = []
+    done = threading.Event()
+
+    def on_frame(image):
+        outputs.append(image.copy())
+        if len(outputs) >= expected:
+            done.set()
+
+    processor.register_callback(on_frame)
+    processor.start()
+    try:
+        for frame in frames:
+            processor.set_raw_frame(frame)
+        assert done.wait(timeout=timeout)
+    finally:
+        processor.stop()
+    return outputs
+
+
+@pytest.mark.parametrize("normalization", [NORM_MINMAX, NORM_LUT])
+def test_worker_processes_match_single_thread_over_restarts(normalization):
+    single = ImageProcessor(queue_policy=BLOCKING, queue_size=4, normalization=normalization, metrics=MetricsRegistry())
+    pooled = ImageProcessor(queue_policy=BLOCKING, queue_size=4, normalization=normalization, num_processes=2, metrics=MetricsRegistry())
+    for cycle in range(2):
+        frames = _raw_frames(8, seed=cycle)
+        expected = _run(single, frames)
+        outputs = _run(pooled, frames)
+        # Delivered in input order, pixel for pixel as in single-thread mode
+        assert len(outputs) == len(expected)
+        for output, reference in zip(outputs, expected):
+            np.testing.assert_array_equal(output, reference)
+    assert not pooled._pools
+
+
+def test_dead_worker_is_reported_without_stalling_delivery():
+    processor = ImageProcessor(queue_policy=BLOCKING, queue_size=4, num_processes=2, metrics=MetricsRegistry())
+    frames = _raw_frames(6)
+    outputs = []
+    done = threading.Event()
+
+    def on_frame(image):
+        outputs.append(image.copy())
+        done.set()
+
+    processor.register_callback(on_frame)
+    processor.start()
+    try:
+        processor.set_raw_frame(frames[0])
+        assert done.wait(timeout=30)
+        # Frames 1, 3 and 5 go to worker 1
+        dead = processor.worker_pool._processes[1]
+        dead.kill()
+        dead.join(timeout=10)
+        for frame in frames[1:]:
+            processor.set_raw_frame(frame)
+
+        deadline = time.monotonic() + 30
+        while (len(outputs) < 3 or processor.worker_failures_metric.get_total() < 3) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        start_time = time.perf_counter()
+        processor.stop()
+        assert time.perf_counter() - start_time < 10
+    # The frames of the live worker are delivered; those of the dead one are counted as failures
+    assert len(outputs) == 3
+    assert processor.worker_failures_metric.get_total() == 3
@@ -0,0 +1,74 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from base.metrics import MetricsRegistry
+from base.profiler import Profiler, install_signal_trigger
+
+
+def _spin(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampling_window_reports_busy_threads():
+    profiler = Profiler(MetricsRegistry(), interval=0.001)
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop,), name="busy-worker")
+    worker.start()
+    done = threading.Event()
+    try:
+        assert profiler.start_sampling(0.05, on_done=lambda report: done.set())
+        # Only one window at a time
+        assert not profiler.start_sampling(0.05)
+        assert done.wait(timeout=10)
+    finally:
+        stop.set()
+        worker.join()
+    assert profiler.samples > 0
+    assert profiler.thread_counts["busy-worker"] > 0
+    assert "profiler" not in profiler.thread_counts
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="needs SIGUSR1")
+def test_signal_trigger_starts_sampling_off_the_main_thread():
+    profiler = Profiler(MetricsRegistry(), interval=0.001)
+    callers = []
+    start_sampling = profiler.start_sampling
+
+    def recording_start(duration, on_done=None):
+        callers.append(threading.current_thread())
+        # Called on the main thread the handler could deadlock on the profiler lock; do not start there
+        if threading.current_thread() is threading.main_thread():
+            return False
+        return start_sampling(duration, on_done)
+
+    profiler.start_sampling = recording_start
+    trigger = install_signal_trigger(profiler, duration=0.02)
+    try:
+        # The signal arrives while the main thread holds the lock, as in get_report or _sample
+        with profiler._lock:
+            os.kill(os.getpid(), signal.SIGUSR1)
+            time.sleep(0.05)
+        deadline = time.monotonic() + 10
+        while not callers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert callers and callers[0] is not threading.main_thread()
+        profiler.stop_sampling()
+    finally:
+        trigger.uninstall()
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="needs SIGUSR1")
+def test_signal_trigger_uninstall_restores_the_handler():
+    previous = signal.getsignal(signal.SIGUSR1)
+    for _ in range(2):
+        trigger = install_signal_trigger(Profiler(MetricsRegistry()))
+        assert signal.getsignal(signal.SIGUSR1) is not previous
+        trigger.uninstall()
+        assert signal.getsignal(signal.SIGUSR1) is previous
+        assert not trigger.thread.is_alive()
+    assert not any(thread.name == "profiler-trigger" for thread in threading.enumerate())
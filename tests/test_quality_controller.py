@@ -0,0 +1,100 @@
+import pytest
+
+from base.img_processor import ImageProcessor
+from base.isp_chain import parse_chain
+from base.metrics import MetricsRegistry
+from base.normalization import NORM_LUT, NORM_MINMAX
+from base.quality_controller import QualityController, FAST_BACKEND, LEVEL_FULL, LEVEL_FIXED_SCALE, LEVEL_FAST_DEMOSAIC, LEVEL_BINNED
+
+
+TARGET = 0.020
+SLOW = (0.030, 0.0)  # p95 above the target
+GOOD = (0.005, 0.0)  # well within the headroom
+MARGINAL = (0.015, 0.0)  # below the target but above the headroom
+DROPPING = (0.005, 0.5)
+
+
+@pytest.fixture
+def controller():
+    processor = ImageProcessor(backend="opencv_vng", metrics=MetricsRegistry())
+    controller = QualityController(processor, target_latency=TARGET, upgrade_samples=3, settle_samples=1,
+                                   metrics=MetricsRegistry())
+    yield controller
+    processor.stop()
+
+
+def _drive(controller, *readings):
+    """Feed synthetic (latency, drop rate) readings through update()"""
+    samples = iter(readings)
+    controller._sample = lambda: next(samples)
+    for _ in readings:
+        controller.update()
+    return controller.get_level_name()
+
+
+def test_ladder_keeps_reductions_of_higher_levels(controller):
+    names = [name for name, _ in controller.levels]
+    assert names[:4] == [LEVEL_FULL, LEVEL_FIXED_SCALE, LEVEL_FAST_DEMOSAIC, LEVEL_BINNED]
+    assert controller.levels[0][1]["normalization"] == NORM_MINMAX
+    assert controller.levels[2][1] == dict(controller.levels[1][1], backend=FAST_BACKEND)
+
+
+def test_steps_down_after_settling(controller):
+    processor = controller.processor
+    assert _drive(controller, SLOW) == LEVEL_FIXED_SCALE
+    assert processor.get_normalization() == NORM_LUT
+    # The sample after a change only settles
+    assert _drive(controller, SLOW) == LEVEL_FIXED_SCALE
+    assert _drive(controller, SLOW) == LEVEL_FAST_DEMOSAIC
+    assert processor.get_backend_name() == FAST_BACKEND
+    # Drops alone count as overload
+    assert _drive(controller, GOOD, DROPPING) == LEVEL_BINNED
+    assert processor.is_preview()
+
+
+def test_steps_up_after_consecutive_good_samples(controller):
+    assert _drive(controller, SLOW, SLOW, SLOW) == LEVEL_FAST_DEMOSAIC
+    # Settle, then two good samples are not enough
+    assert _drive(controller, GOOD, GOOD, GOOD) == LEVEL_FAST_DEMOSAIC
+    # A marginal sample restarts the count
+    assert _drive(controller, MARGINAL, GOOD, GOOD) == LEVEL_FAST_DEMOSAIC
+    assert _drive(controller, GOOD) == LEVEL_FIXED_SCALE
+    assert controller.processor.get_backend_name() == "opencv_vng"
+    assert [name for _, name, _ in controller.get_history()] == [LEVEL_FIXED_SCALE, LEVEL_FAST_DEMOSAIC, LEVEL_FIXED_SCALE]
+
+
+def test_failed_upgrade_doubles_the_next_wait(controller):
+    assert _drive(controller, SLOW, SLOW, SLOW) == LEVEL_FAST_DEMOSAIC
+    assert _drive(controller, GOOD, GOOD, GOOD, GOOD) == LEVEL_FIXED_SCALE
+    # The upgrade does not hold: back down, and the next upgrade needs twice the good samples
+    assert _drive(controller, GOOD, SLOW) == LEVEL_FAST_DEMOSAIC
+    assert _drive(controller, GOOD, *[GOOD] * 5) == LEVEL_FAST_DEMOSAIC
+    assert _drive(controller, GOOD) == LEVEL_FIXED_SCALE
+
+
+def test_disabling_restores_full_quality(controller):
+    processor = controller.processor
+    assert _drive(controller, SLOW, SLOW, SLOW) == LEVEL_FAST_DEMOSAIC
+    controller.set_enabled(False)
+    assert controller.get_level_name() == LEVEL_FULL
+    assert processor.get_normalization() == NORM_MINMAX
+    assert processor.get_backend_name() == "opencv_vng"
+    # A sample taken while disabled changes nothing
+    assert _drive(controller, SLOW) == LEVEL_FULL
+    assert processor.get_normalization() == NORM_MINMAX
+
+
+def test_isp_chain_leaves_out_the_fixed_scale_level():
+    processor = ImageProcessor(backend="opencv_vng", isp_chain=parse_chain("black_level:64,gamma:2.2"), metrics=MetricsRegistry())
+    controller = QualityController(processor, target_latency=TARGET, settle_samples=1, metrics=MetricsRegistry())
+    try:
+        names = [name for name, _ in controller.levels]
+        assert LEVEL_FIXED_SCALE not in names
+        assert names[:3] == [LEVEL_FULL, LEVEL_FAST_DEMOSAIC, LEVEL_BINNED]
+        # The first step down is one that changes the processing
+        assert _drive(controller, SLOW) == LEVEL_FAST_DEMOSAIC
+        assert processor.get_normalization() == NORM_MINMAX
+        with pytest.raises(ValueError):
+            processor.set_normalization(NORM_LUT)
+    finally:
+        processor.stop()
@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+import pytest
+
+from base.frame_pool import FrameBuffer
+from base.metrics import MetricsRegistry
+from base.raw_recording import RawRecorder, RawRecording, ReplaySource, REPLAY_FAST
+
+
+SHAPE = (6, 8)
+
+
+def _frames(count):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 4096, SHAPE, dtype=np.uint16) for _ in range(count)]
+
+
+def _record(path, frames, capacity=None, patterns=None):
+    recorder = RawRecorder(str(path), SHAPE, capacity or len(frames), pattern="GB")
+    results = []
+    for i, frame in enumerate(frames):
+        buffer = FrameBuffer(frame)
+        if patterns:
+            buffer.metadata["pattern"] = patterns[i]
+        results.append(recorder.record(buffer, timestamp=100.0 + i * 0.01))
+    recorder.close()
+    return results
+
+
+def test_round_trip(tmp_path):
+    frames = _frames(3)
+    _record(tmp_path / "rec.raw", frames, patterns=["RG", "GR", "BG"])
+
+    recording = RawRecording(str(tmp_path / "rec.raw"))
+    try:
+        assert len(recording) == 3
+        assert recording.shape == SHAPE
+        assert recording.dtype == np.uint16
+        assert recording.pattern == "GB"
+        for i, frame in enumerate(frames):
+            buffer = recording.frame(i)
+            np.testing.assert_array_equal(buffer.array, frame)
+            assert not buffer.array.flags.writeable
+            buffer.release()
+        assert [recording.pattern_of(i) for i in range(3)] == ["RG", "GR", "BG"]
+        np.testing.assert_allclose(recording.timestamps(), [100.0, 100.01, 100.02])
+    finally:
+        recording.close()
+
+
+def test_untagged_frames_use_recording_pattern(tmp_path):
+    _record(tmp_path / "rec.raw", _frames(1))
+    recording = RawRecording(str(tmp_path / "rec.raw"))
+    try:
+        assert recording.pattern_of(0) == "GB"
+    finally:
+        recording.close()
+
+
+def test_recording_stops_at_capacity(tmp_path):
+    recorder = RawRecorder(str(tmp_path / "rec.raw"), SHAPE, 2)
+    passed_on = []
+    recorder.register_callback(passed_on.append)
+    results = [recorder.record(frame) for frame in _frames(3)]
+    assert results == [True, True, False]
+    assert recorder.is_full()
+    assert recorder.frames_not_recorded == 1
+    # Frames are passed downstream whether they were recorded or not
+    assert len(passed_on) == 3
+    recorder.close()
+
+    recording = RawRecording(str(tmp_path / "rec.raw"))
+    try:
+        assert len(recording) == 2
+    finally:
+        recording.close()
+
+
+def test_partial_recording_is_readable(tmp_path):
+    frames = _frames(2)
+    _record(tmp_path / "rec.raw", frames, capacity=10)
+    recording = RawRecording(str(tmp_path / "rec.raw"))
+    try:
+        assert len(recording) == 2
+        assert recording.capacity == 10
+        buffer = recording.frame(1)
+        np.testing.assert_array_equal(buffer.array, frames[1])
+        buffer.release()
+    finally:
+        recording.close()
+
+
+def test_held_frames_outlive_close(tmp_path):
+    frames = _frames(2)
+    _record(tmp_path / "rec.raw", frames)
+    recording = RawRecording(str(tmp_path / "rec.raw"))
+    held = recording.frame(1)
+    assert held.metadata["pattern"] == "GB"
+    recording.close()
+
+    # The mapping stays open for the held frame and is closed at its last release
+    assert not recording._mmap.closed
+    held.retain()
+    held.release()
+    assert int(held.array.sum()) == int(frames[1].sum())
+    held.release()
+    assert held.array is None
+    assert recording._mmap.closed
+    with pytest.raises(ValueError):
+        recording.frame(0)
+
+
+def test_rejects_foreign_files(tmp_path):
+    path = tmp_path / "other.raw"
+    path.write_bytes(b"\0" * 8192)
+    with pytest.raises(ValueError):
+        RawRecording(str(path))
+
+
+def test_fast_replay_serves_every_frame_in_order(tmp_path):
+    frames = _frames(4)
+    _record(tmp_path / "rec.raw", frames, patterns=["RG", "GR", "GB", "BG"])
+
+    source = ReplaySource(str(tmp_path / "rec.raw"), mode=REPLAY_FAST, loop=False, metrics=MetricsRegistry())
+    received = []
+    done = threading.Event()
+
+    def frame_done(frame):
+        received.append((frame.array.copy(), frame.metadata["pattern"]))
+        if len(received) == len(frames):
+            done.set()
+
+    source.register_callback(frame_done)
+    source.start()
+    try:
+        assert done.wait(timeout=10)
+    finally:
+        source.stop()
+        source.close()
+    for (array, pattern), frame, expected_pattern in zip(received, frames, ["RG", "GR", "GB", "BG"]):
+        np.testing.assert_array_equal(array, frame)
+        assert pattern == expected_pattern
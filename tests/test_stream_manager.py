@@ -0,0 +1,233 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from base.demosaic import get_backend
+from base.frame_pool import FrameBuffer
+from base.frame_queue import BLOCKING, BOUNDED_FIFO, LATEST_ONLY
+from base.metrics import MetricsRegistry
+from base.stream_manager import StreamManager
+
+
+SHAPE = (16, 24)
+
+
+class ManualSource:
+    """Frame source driven by the test: push() hands a frame to the manager on the calling thread"""
+
+    def __init__(self):
+        self.callback = None
+        self.running = False
+        self.pushed = 0
+
+    def register_callback(self, callback):
+        self.callback = callback
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def get_fps(self):
+        return 0.0
+
+    def reset_statistics(self):
+        pass
+
+    def push(self, count=1):
+        for _ in range(count):
+            # The frame's value is its number, so outputs can be matched to inputs
+            frame = FrameBuffer(np.full(SHAPE, self.pushed, dtype=np.uint16))
+            frame.metadata["number"] = self.pushed
+            self.pushed += 1
+            self.callback(frame)
+
+
+class SlowBackend:
+    """Wraps a backend and records how many frames are demosaiced at the same time"""
+
+    def __init__(self, delay=0.02):
+        self.backend = get_backend("opencv_bilinear")
+        self.half_resolution = False
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def output_shape(self, raw_shape):
+        return self.backend.output_shape(raw_shape)
+
+    def demosaic(self, raw, dst, pattern, bit_depth=12):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        self.backend.demosaic(raw, dst, pattern, bit_depth)
+        with self.lock:
+            self.active -= 1
+
+
+def _collect(manager, name, expected):
+    """Callback that records the raw value of every output of a stream; returns (values, done event)"""
+    values = []
+    done = threading.Event()
+
+    def frame_done(output):
+        # A uniform raw frame demosaics to a constant image; min/max normalization would flatten it to 0
+        values.append(output.metadata["value"])
+        if len(values) == expected:
+            done.set()
+
+    manager.register_frame_callback(name, frame_done)
+    return values, done
+
+
+def _manager(**options):
+    options.setdefault("metrics", MetricsRegistry())
+    return StreamManager(normalization="lut", **options)
+
+
+def _stream_workers():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("stream-worker")]
+
+
+@pytest.fixture
+def tag_values(monkeypatch):
+    """Tag every output with the raw value it was made from"""
+    process = StreamManager._process
+
+    def tagged(self, stream, frame, rgb_buffers):
+        output = process(self, stream, frame, rgb_buffers)
+        if output is not None:
+            output.metadata["value"] = int(frame.array[0, 0])
+        return output
+
+    monkeypatch.setattr(StreamManager, "_process", tagged)
+
+
+def test_round_robin_serves_an_idle_stream_next_to_a_busy_one():
+    manager = _manager(num_workers=1, max_in_flight=8, queue_policy=BOUNDED_FIFO, queue_size=8)
+    busy, idle = ManualSource(), ManualSource()
+    manager.add_stream("busy", busy)
+    manager.add_stream("idle", idle)
+    busy.push(6)
+    idle.push(1)
+
+    # Pick frames without workers: the idle stream's single frame is served in the first round
+    manager.running = True
+    picked = [manager._next_frame()[0].name for _ in range(3)]
+    assert picked == ["busy", "idle", "busy"]
+    # Sequence numbers are per stream
+    stream, sequence, frame = manager._next_frame()
+    assert (stream.name, sequence, frame.metadata["number"]) == ("busy", 2, 2)
+
+
+def test_in_flight_limit_per_stream():
+    manager = _manager(num_workers=4, max_in_flight=2, queue_policy=BOUNDED_FIFO, queue_size=8)
+    source = ManualSource()
+    manager.add_stream("a", source)
+    source.push(4)
+    manager.running = True
+    assert [manager._next_frame()[1] for _ in range(2)] == [0, 1]
+    # The third frame waits until one of the two in flight is finished
+    waiter = threading.Thread(target=manager._next_frame)
+    waiter.start()
+    waiter.join(timeout=0.1)
+    assert waiter.is_alive()
+    with manager._cond:
+        manager.streams[0].in_flight -= 1
+        manager._cond.notify_all()
+    waiter.join(timeout=5)
+    assert not waiter.is_alive()
+
+
+def test_latest_only_drops_are_counted_per_stream():
+    metrics = MetricsRegistry()
+    manager = _manager(num_workers=1, queue_policy=LATEST_ONLY, metrics=metrics)
+    flooded, quiet = ManualSource(), ManualSource()
+    manager.add_stream("flooded", flooded)
+    manager.add_stream("quiet", quiet)
+    # Not started: frames pile up in the queues
+    flooded.push(5)
+    quiet.push(1)
+    summary = manager.summary()["per_stream"]
+    assert summary["flooded"]["dropped"] == 4
+    assert summary["quiet"]["dropped"] == 0
+    assert metrics.get("stream.flooded.dropped").get() == 4
+
+
+def test_single_stream_uses_several_workers_in_order(tag_values):
+    backend = SlowBackend()
+    manager = _manager(num_workers=4, queue_policy=BLOCKING, queue_size=4)
+    manager.backend = backend
+    source = ManualSource()
+    manager.add_stream("a", source)
+    values, done = _collect(manager, "a", 16)
+    manager.start()
+    try:
+        source.push(16)
+        assert done.wait(timeout=10)
+    finally:
+        manager.stop()
+    assert values == list(range(16))
+    # Not capped at one frame per stream
+    assert backend.peak > 1
+
+
+def test_per_stream_metrics(tag_values):
+    metrics = MetricsRegistry()
+    manager = _manager(num_workers=2, queue_policy=BLOCKING, queue_size=4, metrics=metrics)
+    sources = {"a": ManualSource(), "b": ManualSource()}
+    collected = {}
+    for name, source in sources.items():
+        manager.add_stream(name, source)
+        collected[name] = _collect(manager, name, 3 if name == "a" else 5)
+    manager.start()
+    try:
+        sources["a"].push(3)
+        sources["b"].push(5)
+        assert all(done.wait(timeout=10) for _, done in collected.values())
+    finally:
+        manager.stop()
+
+    summary = manager.summary()
+    assert summary["frames"] == 8
+    assert summary["per_stream"]["a"]["frames"] == 3
+    assert summary["per_stream"]["b"]["frames"] == 5
+    assert summary["per_stream"]["b"]["latency"]["count"] == 5
+    assert summary["per_stream"]["b"]["processing_time"]["count"] == 5
+    assert metrics.get("stream.a.frames").get_total() == 3
+    assert "stream.a.latency" in metrics.names("stream.a.")
+
+    manager.reset_statistics()
+    assert manager.summary()["per_stream"]["a"]["frames"] == 0
+
+
+def test_start_stop_cycles_leave_no_threads(tag_values):
+    manager = _manager(num_workers=3, queue_policy=BLOCKING, queue_size=2)
+    source = ManualSource()
+    manager.add_stream("a", source)
+    for cycle in range(2):
+        values, done = _collect(manager, "a", 4)
+        manager.start()
+        assert len(_stream_workers()) == 3
+        try:
+            source.push(4)
+            assert done.wait(timeout=10)
+        finally:
+            manager.stop()
+        assert values == list(range(4 * cycle, 4 * cycle + 4))
+        assert not _stream_workers()
+        assert not manager.streams[0].finished
+
+
+def test_add_stream_validation():
+    manager = _manager(num_workers=1)
+    manager.add_stream("a", ManualSource())
+    with pytest.raises(ValueError):
+        manager.add_stream("a", ManualSource())
+    with pytest.raises(KeyError):
+        manager.register_frame_callback("b", lambda output: None)
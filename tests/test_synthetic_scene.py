@@ -0,0 +1,61 @@
+import threading
+
+import numpy as np
+import pytest
+
+from base.synthetic_scene import build_frame_bank
+from base.img_generator import ImageGenerator
+from base.demosaic import BAYER_PATTERNS
+from base.metrics import MetricsRegistry
+
+
+RESOLUTION = (32, 24)
+
+
+def test_frames_cycle_through_the_patterns():
+    bank, patterns = build_frame_bank(6, RESOLUTION, patterns=("RG", "BG"))
+    assert bank.shape == (6, 24, 32) and bank.dtype == np.uint16
+    assert patterns == ["RG", "BG", "RG", "BG", "RG", "BG"]
+    assert bank.max() <= 4095
+
+
+@pytest.mark.parametrize("pattern", BAYER_PATTERNS)
+def test_pattern_tags_match_the_rendered_layout(pattern):
+    # Without noise, frame i of a mixed bank equals frame i of a bank rendered in its tagged layout only
+    bank, patterns = build_frame_bank(len(BAYER_PATTERNS), RESOLUTION, noise_sigma=0.0)
+    single, _ = build_frame_bank(len(BAYER_PATTERNS), RESOLUTION, patterns=(pattern,), noise_sigma=0.0)
+    index = patterns.index(pattern)
+    np.testing.assert_array_equal(bank[index], single[index])
+    assert any(not np.array_equal(bank[i], single[i]) for i in range(len(patterns)) if patterns[i] != pattern)
+
+
+def test_bank_is_read_only():
+    bank, _ = build_frame_bank(2, RESOLUTION)
+    assert not bank.flags.writeable
+    with pytest.raises(ValueError):
+        bank[0, 0, 0] = 0
+    with pytest.raises(ValueError):
+        bank[1][...] = 0
+
+
+def test_generator_hands_out_tagged_views_of_the_bank():
+    generator = ImageGenerator(framerate=500, resolution=RESOLUTION, bank_size=4, metrics=MetricsRegistry())
+    frames = []
+    done = threading.Event()
+
+    def on_frame(frame):
+        frames.append((frame.array, frame.metadata["pattern"]))
+        if len(frames) == 6:
+            done.set()
+
+    generator.register_callback(on_frame)
+    generator.start()
+    try:
+        assert done.wait(timeout=10)
+    finally:
+        generator.stop()
+    for i, (array, pattern) in enumerate(frames[:6]):
+        # Zero-copy and not writable by consumers
+        assert np.shares_memory(array, generator.frame_bank[i % 4])
+        assert not array.flags.writeable
+        assert pattern == generator.frame_patterns[i % 4]
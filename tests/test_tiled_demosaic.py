@@ -0,0 +1,225 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from base.demosaic import get_backend, available_backends, BAYER_PATTERNS
+from base.normalization import FixedScaleNormalizer, normalize_minmax
+from base.tiled_demosaic import TiledDemosaicEngine
+from base.img_processor import ImageProcessor
+from base.frame_queue import BLOCKING
+from base.metrics import MetricsRegistry
+
+
+def _raw_frame(height, width, seed=0):
+    return np.random.default_rng(seed).integers(0, 4096, (height, width), dtype=np.uint16)
+
+
+def _full_frame(raw, backend, pattern, dtype, normalizer=None):
+    rgb = np.empty((*raw.shape, 3), dtype=np.uint16)
+    backend.demosaic(raw, rgb, pattern)
+    out = np.empty(rgb.shape, dtype=dtype)
+    if normalizer is not None:
+        return normalizer.apply(rgb, out)
+    return normalize_minmax(rgb, out)
+
+
+@pytest.fixture
+def engine_factory():
+    engines = []
+
+    def create(num_threads=3, band_height=16):
+        engine = TiledDemosaicEngine(num_threads, band_height)
+        engines.append(engine)
+        return engine
+
+    yield create
+    for engine in engines:
+        engine.shutdown()
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+@pytest.mark.parametrize("pattern", BAYER_PATTERNS)
+def test_minmax_matches_full_frame(engine_factory, pattern, dtype):
+    raw = _raw_frame(100, 70)
+    backend = get_backend("opencv_bilinear")
+    out = np.empty((100, 70, 3), dtype=dtype)
+    engine_factory().process(raw, out, backend, pattern)
+    np.testing.assert_array_equal(out, _full_frame(raw, backend, pattern, dtype))
+
+
+@pytest.mark.parametrize("height, width, band_height", [(102, 46, 10), (37, 29, 4), (64, 50, 6)])
+def test_uint8_minmax_rounds_like_full_frame(engine_factory, height, width, band_height):
+    # Band sizes that are not multiples of the SIMD width; halfway values must round as in cv2.normalize
+    raw = _raw_frame(height, width, seed=height)
+    backend = get_backend("opencv_bilinear")
+    out = np.empty((height, width, 3), dtype=np.uint8)
+    engine_factory(band_height=band_height).process(raw, out, backend)
+    np.testing.assert_array_equal(out, _full_frame(raw, backend, "RG", np.uint8))
+
+
+@pytest.mark.parametrize("width", [22, 33, 46, 63, 65, 127])
+@pytest.mark.parametrize("height, band_height", [(37, 2), (41, 4), (50, 6), (75, 10), (99, 16)])
+def test_float32_minmax_bulk_and_tail_match_full_frame(engine_factory, width, height, band_height):
+    # Band element counts that leave a tail after the SIMD-aligned bulk (SIMD_ALIGN_ELEMENTS)
+    raw = _raw_frame(height, width, seed=width * height)
+    backend = get_backend("opencv_bilinear")
+    out = np.empty((height, width, 3), dtype=np.float32)
+    engine_factory(band_height=band_height).process(raw, out, backend)
+    np.testing.assert_array_equal(out, _full_frame(raw, backend, "RG", np.float32))
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+@pytest.mark.parametrize("black_level, gamma", [(0, 1.0), (64, 1.0), (0, 2.2)])
+def test_fixed_scale_matches_full_frame(engine_factory, dtype, black_level, gamma):
+    raw = _raw_frame(90, 64, seed=1)
+    backend = get_backend("opencv_bilinear")
+    out = np.empty((90, 64, 3), dtype=dtype)
+    engine_factory().process(raw, out, backend, normalizer=FixedScaleNormalizer(12, black_level, gamma, dtype))
+    expected = _full_frame(raw, backend, "RG", dtype, FixedScaleNormalizer(12, black_level, gamma, dtype))
+    np.testing.assert_array_equal(out, expected)
+
+
+@pytest.mark.parametrize("height, band_height", [(64, 16), (65, 16), (17, 16), (30, 2), (8, 256)])
+def test_band_layout_covers_frame(engine_factory, height, band_height):
+    engine = engine_factory(band_height=band_height)
+    engine._prepare((height, 32), 2)
+    owned = [row for y0, y1, _, _ in engine._bands for row in range(y0, y1)]
+    assert owned == list(range(height))
+    # Every band starts on the same CFA phase
+    assert all(y0 % 2 == 0 and top % 2 == 0 for y0, _, top, _ in engine._bands)
+
+
+def test_odd_band_height_is_rounded_up():
+    engine = TiledDemosaicEngine(1, 7)
+    try:
+        assert engine.band_height == 8
+    finally:
+        engine.shutdown()
+
+
+def test_half_resolution_backend_is_rejected(engine_factory):
+    raw = _raw_frame(32, 32)
+    with pytest.raises(ValueError):
+        engine_factory().process(raw, np.empty((16, 16, 3), np.float32), get_backend("superpixel"))
+
+
+FULL_RESOLUTION_BACKENDS = [name for name in available_backends() if not get_backend(name).half_resolution]
+
+
+@pytest.mark.parametrize("backend_name", FULL_RESOLUTION_BACKENDS)
+@pytest.mark.parametrize("height, band_height", [(102, 10), (74, 7), (74, 10), (31, 2), (33, 4), (101, 16), (57, 256)])
+def test_every_backend_matches_full_frame_on_odd_heights(engine_factory, backend_name, height, band_height):
+    raw = _raw_frame(height, 46, seed=height)
+    backend = get_backend(backend_name)
+    for dtype in (np.float32, np.uint8):
+        out = np.empty((height, 46, 3), dtype=dtype)
+        engine_factory(band_height=band_height).process(raw, out, backend)
+        np.testing.assert_array_equal(out, _full_frame(raw, backend, "RG", dtype))
+
+        normalizer = FixedScaleNormalizer(12, 0, 1.0, dtype)
+        engine_factory(band_height=band_height).process(raw, out, backend, normalizer=normalizer)
+        np.testing.assert_array_equal(out, _full_frame(raw, backend, "RG", dtype, FixedScaleNormalizer(12, 0, 1.0, dtype)))
+
+
+def _demosaic_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("demosaic")]
+
+
+def test_processor_stop_shuts_down_the_band_threads():
+    processor = ImageProcessor(queue_policy=BLOCKING, num_threads=3, band_height=16, metrics=MetricsRegistry())
+    for _ in range(2):
+        done = threading.Event()
+        processor.register_frame_callback(lambda output: done.set())
+        processor.start()
+        try:
+            processor.set_raw_frame(_raw_frame(64, 48))
+            assert done.wait(timeout=10)
+            assert _demosaic_threads()
+        finally:
+            processor.stop()
+        # No band threads outlive stop(); the next start creates new ones
+        assert not _demosaic_threads()
+
+
+def _process_all(processor, frames, timeout=30):
+    """Run frames through a started-and-stopped processor; returns copies of the delivered images"""
+    outputs = []
+    done = threading.Event()
+
+    def on_frame(image):
+        outputs.append(image.copy())
+        if len(outputs) == len(frames):
+            done.set()
+
+    processor.register_callback(on_frame)
+    processor.start()
+    try:
+        for frame in frames:
+            processor.set_raw_frame(frame)
+        assert done.wait(timeout=timeout)
+    finally:
+        processor.stop()
+    return outputs
+
+
+def test_pipelined_matches_single_mode_in_order():
+    frames = [_raw_frame(48, 64, seed=i) for i in range(12)]
+    expected = _process_all(ImageProcessor(queue_policy=BLOCKING, metrics=MetricsRegistry()), frames)
+    pipelined = ImageProcessor(queue_policy=BLOCKING, pipelined=True, metrics=MetricsRegistry())
+    for _ in range(2):
+        outputs = _process_all(pipelined, frames)
+        assert len(outputs) == len(frames)
+        for output, reference in zip(outputs, expected):
+            np.testing.assert_array_equal(output, reference)
+
+
+def test_pipelined_full_stage_queues_block_instead_of_dropping():
+    frames = [_raw_frame(48, 64, seed=i) for i in range(12)]
+    expected = _process_all(ImageProcessor(queue_policy=BLOCKING, metrics=MetricsRegistry()), frames)
+    processor = ImageProcessor(queue_policy=BLOCKING, put_timeout=30, pipelined=True, stage_queue_size=2, metrics=MetricsRegistry())
+    gate = threading.Event()
+    outputs = []
+
+    def on_frame(image):
+        # A stalled consumer: the deliver stage blocks here
+        gate.wait()
+        outputs.append(image.copy())
+
+    processor.register_callback(on_frame)
+    processor.start()
+    fed = []
+
+    def feed():
+        for frame in frames:
+            processor.set_raw_frame(frame)
+            fed.append(frame)
+
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    try:
+        deadline = time.monotonic() + 10
+        while (len(processor._deliver_queue) < 2 or len(processor._normalize_queue) < 2) and time.monotonic() < deadline:
+            time.sleep(0.005)
+        time.sleep(0.05)
+        # Every stage queue is full and the source waits for room; nothing is dropped
+        assert len(processor._normalize_queue) == 2 and len(processor._deliver_queue) == 2
+        assert len(fed) < len(frames)
+        assert feeder.is_alive()
+        assert processor.get_frames_dropped() == 0
+
+        gate.set()
+        feeder.join(timeout=10)
+        deadline = time.monotonic() + 10
+        while len(outputs) < len(frames) and time.monotonic() < deadline:
+            time.sleep(0.005)
+    finally:
+        gate.set()
+        processor.stop()
+        feeder.join()
+    assert processor.get_frames_dropped() == 0
+    assert processor.get_trace_drops() == {}
+    assert len(outputs) == len(frames)
+    for output, reference in zip(outputs, expected):
+        np.testing.assert_array_equal(output, reference)